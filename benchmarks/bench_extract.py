@@ -0,0 +1,147 @@
+"""
+提取基准：用录制的消息（benchmarks/corpus/messages.jsonl）测识别 + 解析的吞吐和延迟，不需要 Discord。
+
+用法（在仓库根目录）：
+    python -m benchmarks.bench_extract
+    python -m benchmarks.bench_extract --rounds 2000 --corpus my_messages.jsonl --config wechat_qr_server/config.json
+    python -m benchmarks.bench_extract --legacy
+
+每条消息走一遍 on_message 里的路径：ParsedMessage.from_message -> extract_entries（kakao + wechat）。
+--legacy 改为依次调用 extract_kakao_pay_entries / extract_wechat_qr_entries（旧服务端的调用方式，用来对比）。
+输出：
+- 总吞吐（条/秒，按语料顺序混合）
+- 每个用例（录制文件里的 "case"：spider / xbot / eximbay / kakao / nomatch）的 p50 / p95 / p99 单条延迟（微秒）
+  以及命中的解析器，用来确认消息确实被对应的解析器处理
+录制新消息：wechat_qr_board.recorded.record_message(message, case) 得到快照，save_recorded 写成 JSONL。
+"""
+from __future__ import annotations
+
+import argparse
+import math
+import os
+import time
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from wechat_qr_board.extract import (
+    ExtractConfig,
+    ParsedMessage,
+    extract_entries,
+    extract_kakao_pay_entries,
+    extract_wechat_qr_entries,
+)
+from wechat_qr_board.recorded import RecordedMessage, load_recorded
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CORPUS = os.path.join(HERE, "corpus", "messages.jsonl")
+DEFAULT_CONFIG = os.path.join(os.path.dirname(HERE), "wechat_qr_server", "config.example.json")
+KINDS = ("kakao", "wechat")  # 与服务端一致：Kakao 优先
+
+
+def _load_extract_config(path: str) -> ExtractConfig:
+    # 服务端配置是看板配置的超集，两边的 config.json 都能用
+    from wechat_qr_server.config import load_config
+
+    return load_config(path).extract
+
+
+def _percentile(sorted_vals: List[float], p: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    # nearest-rank
+    i = min(len(sorted_vals) - 1, max(0, math.ceil(p / 100.0 * len(sorted_vals)) - 1))
+    return sorted_vals[i]
+
+
+def _make_runner(cfg: ExtractConfig, legacy: bool) -> Callable[[RecordedMessage], str]:
+    """
+    返回“处理一条消息”的函数，结果是命中的解析器名（没命中为 "-"）。
+    """
+    if legacy:
+
+        def run(message: RecordedMessage) -> str:
+            if extract_kakao_pay_entries(
+                message,
+                seat_field_name_patterns=cfg.seat_field_name_patterns,
+                account_field_name_patterns=cfg.account_field_name_patterns,
+                countdown_seconds=cfg.countdown_seconds,
+            ):
+                return "kakao"
+            if extract_wechat_qr_entries(
+                message,
+                keywords=cfg.keywords,
+                seat_field_name_patterns=cfg.seat_field_name_patterns,
+                account_field_name_patterns=cfg.account_field_name_patterns,
+                countdown_seconds=cfg.countdown_seconds,
+            ):
+                return "wechat"
+            return "-"
+
+        return run
+
+    def run(message: RecordedMessage) -> str:
+        found = extract_entries(ParsedMessage.from_message(message), cfg, KINDS)
+        return found[0].name if found else "-"
+
+    return run
+
+
+def bench(
+    messages: List[RecordedMessage], cfg: ExtractConfig, rounds: int, legacy: bool = False
+) -> Tuple[float, Dict[str, List[float]], Dict[str, Counter]]:
+    """
+    跑 rounds 遍语料；返回 (总耗时秒, case -> 单条耗时列表, case -> 命中解析器计数)。
+    """
+    run = _make_runner(cfg, legacy)
+    for m in messages:  # 预热（编译正则、加载模块）
+        run(m)
+    lat: Dict[str, List[float]] = OrderedDict()
+    hits: Dict[str, Counter] = OrderedDict()
+    for m in messages:
+        lat.setdefault(m.case or "-", [])
+        hits.setdefault(m.case or "-", Counter())
+    clock = time.perf_counter
+    total = 0.0
+    for _ in range(rounds):
+        for m in messages:
+            t0 = clock()
+            name = run(m)
+            dt = clock() - t0
+            total += dt
+            case = m.case or "-"
+            lat[case].append(dt)
+            hits[case][name] += 1
+    return total, lat, hits
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description="Extraction throughput / latency on recorded messages")
+    ap.add_argument("--corpus", default=DEFAULT_CORPUS, help="recorded messages (JSONL)")
+    ap.add_argument("--config", default=DEFAULT_CONFIG, help="config.json (keywords / field patterns)")
+    ap.add_argument("--rounds", type=int, default=1000)
+    ap.add_argument("--legacy", action="store_true", help="call extract_kakao_pay_entries / extract_wechat_qr_entries")
+    args = ap.parse_args(argv)
+
+    messages = load_recorded(args.corpus)
+    if not messages:
+        raise SystemExit(f"no messages in {args.corpus}")
+    cfg = _load_extract_config(args.config)
+    rounds = max(1, args.rounds)
+
+    total, lat, hits = bench(messages, cfg, rounds, args.legacy)
+    n = len(messages) * rounds
+    print(f"messages={len(messages)} rounds={rounds} mode={'legacy' if args.legacy else 'registry'}")
+    print(f"throughput: {n / total:,.0f} msgs/s ({total * 1e6 / n:.1f} us/msg)")
+    print(f"{'case':>8} {'n':>8} {'p50 us':>8} {'p95 us':>8} {'p99 us':>8}  parser")
+    for case, vals in lat.items():
+        vals.sort()
+        parsers = ",".join(f"{k}x{v}" for k, v in hits[case].most_common())
+        print(
+            f"{case:>8} {len(vals):>8} "
+            f"{_percentile(vals, 50) * 1e6:8.1f} {_percentile(vals, 95) * 1e6:8.1f} {_percentile(vals, 99) * 1e6:8.1f}"
+            f"  {parsers}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+内存基准：N 个二维码条目常驻内存时，每个条目平均占多少字节。
+
+用法（在仓库根目录）：
+    python -m benchmarks.bench_memory
+    python -m benchmarks.bench_memory --items 100000 --seats 1000
+
+分两项统计（tracemalloc，gc 之后的净增量）：
+- models：只有 SeatState + QrItem 本身
+- store：完整 Store（含去重索引、过期堆、有序索引、JSON 缓存等），数据目录用临时目录
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Iterator, Tuple
+
+from wechat_qr_board.models import QrItem, SeatState
+from wechat_qr_board.store import Store
+
+
+def _meta(i: int) -> Dict[str, Any]:
+    # 与 extract.py 里 xbot 分支的 meta 结构一致；日期 / 价格等取值有限，大量重复
+    return {
+        "source": "xbot",
+        "seat_detail": f"VIP {i % 40 + 1}구역 {i % 20 + 1}열",
+        "price": ["154,000", "132,000", "99,000"][i % 3],
+        "date": ["2026.10.17 19:00", "2026.10.18 18:00"][i % 2],
+        "quantity": "1",
+        "order_number": f"T{1000000000 + i}",
+    }
+
+
+def _rows(n_items: int, n_seats: int) -> Iterator[Tuple[str, str, str, float, float, Dict[str, Any]]]:
+    """
+    逐条生成（像解析器那样每条都是新对象），常驻内存的部分才会计入测量。
+    """
+    now = time.time()
+    for i in range(n_items):
+        seat = i % n_seats
+        yield (
+            f"seat-{seat:05d}",
+            f"https://cdn.discordapp.com/attachments/1180000000000000000/{1190000000000000000 + i}/qr.png",
+            f"https://discord.com/channels/1100000000000000000/1110000000000000000/{1200000000000000000 + i}",
+            now,
+            now + 86400.0,
+            _meta(i),
+        )
+
+
+def _measure(build: Callable[[], Any]) -> Tuple[int, Any]:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    obj = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, obj
+
+
+def bench_models(n_items: int, n_seats: int) -> int:
+    def build():
+        seats: Dict[str, SeatState] = {}
+        for seat_key, qr_url, link, captured_at, expires_at, meta in _rows(n_items, n_seats):
+            seat = seats.get(seat_key)
+            if seat is None:
+                seat = seats[seat_key] = SeatState(seat_key=seat_key, seat_label=seat_key)
+            seat.pending.append(QrItem(qr_url, link, captured_at, expires_at, meta=meta))
+        return seats
+
+    size, _ = _measure(build)
+    return size
+
+
+def bench_store(n_items: int, n_seats: int) -> int:
+    with tempfile.TemporaryDirectory() as tmp:
+
+        def build():
+            store = Store(tmp, flush_interval=3600.0, compact_every=10**9)
+            for seat_key, qr_url, link, captured_at, expires_at, meta in _rows(n_items, n_seats):
+                store.add_items(seat_key, seat_key, "", [(qr_url, link, captured_at, expires_at, meta)])
+            # 先把缓冲的 journal 变更写掉，只统计常驻状态
+            store.save_state()
+            store.list_seats_for_ui_json()
+            return store
+
+        size, store = _measure(build)
+        store.close(flush=False)
+    return size
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="QrItem / SeatState / Store memory per item")
+    ap.add_argument("--items", type=int, default=100000)
+    ap.add_argument("--seats", type=int, default=1000)
+    args = ap.parse_args()
+
+    results = [("models", bench_models(args.items, args.seats)), ("store", bench_store(args.items, args.seats))]
+    print(f"items={args.items} seats={args.seats}")
+    for name, size in results:
+        per_item = size / max(1, args.items)
+        print(f"{name:>7}: {size / 1e6:8.1f} MB total, {per_item:7.1f} B/item, ~{1e9 / per_item:,.0f} items/GB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import csv
+import os
+import time
+
+from wechat_qr_board.models import SCAN_STATUS_SCANNED
+from wechat_qr_board.store import SCAN_LOG_HEADER, Store
+
+# 旧版本 Store._append_csv 写出的格式：utf-8-sig、三列表头
+BASELINE_HEADER = ["时间", "位置", "discord消息链接"]
+BASELINE_ROWS = [
+    ["2026-01-19 13:31:38", "20260213-001 지정석-A1", "https://discord.com/channels/1/2/3"],
+    ["2026-01-19 13:32:05", "20260130 sku B2", "https://discord.com/channels/1/2/4"],
+]
+
+
+def _write_baseline(path):
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        w = csv.writer(f)
+        w.writerow(BASELINE_HEADER)
+        w.writerows(BASELINE_ROWS)
+
+
+def _read(path):
+    with open(path, "r", newline="", encoding="utf-8-sig") as f:
+        return list(csv.reader(f))
+
+
+def test_restore_migrates_baseline_scan_log(tmp_path):
+    csv_path = tmp_path / "scan_log.csv"
+    _write_baseline(csv_path)
+    original = csv_path.read_bytes()
+
+    store = Store(data_dir=str(tmp_path), flush_interval=0)
+    try:
+        # 旧文件原样留档
+        assert (tmp_path / "scan_log.v1.csv").read_bytes() == original
+        rows = _read(csv_path)
+        assert rows[0] == SCAN_LOG_HEADER
+        assert rows[1:] == [r + [SCAN_STATUS_SCANNED, ""] for r in BASELINE_ROWS]
+
+        now = time.time()
+        store.add_items("s1", "20260213 seat 1", "acct", [("https://x/1.png", "link-1", now, now + 600, {"source": "xbot"})])
+        store.scan_next("s1")
+        store.close()
+
+        rows = _read(csv_path)
+        assert all(len(r) == len(SCAN_LOG_HEADER) for r in rows)
+        assert rows[-1][1:] == ["20260213 seat 1", "link-1", SCAN_STATUS_SCANNED, "xbot"]
+        assert [r[2] for r in Store(data_dir=str(tmp_path)).iter_scan_log()] == [
+            BASELINE_ROWS[0][2],
+            BASELINE_ROWS[1][2],
+            "link-1",
+        ]
+    finally:
+        store.close()
+
+
+def test_current_scan_log_is_left_alone(tmp_path):
+    csv_path = tmp_path / "scan_log.csv"
+    Store(data_dir=str(tmp_path)).close()
+    before = csv_path.read_bytes()
+    Store(data_dir=str(tmp_path)).close()
+    assert csv_path.read_bytes() == before
+    assert not os.path.exists(tmp_path / "scan_log.v1.csv")
+
+
+def test_unknown_header_is_rotated(tmp_path):
+    csv_path = tmp_path / "scan_log.csv"
+    (tmp_path / "scan_log.v1.csv").write_text("taken\n", encoding="utf-8")
+    with open(csv_path, "w", newline="", encoding="utf-8-sig") as f:
+        csv.writer(f).writerows([["a", "b"], ["1", "2"]])
+
+    Store(data_dir=str(tmp_path)).close()
+
+    assert _read(csv_path) == [SCAN_LOG_HEADER]
+    assert _read(tmp_path / "scan_log.v1-2.csv") == [["a", "b"], ["1", "2"]]
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import hashlib
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+class DedupeIndex:
+    """
+    二维码去重索引（代替只增不减的 "seat||url||link" 字符串集合）：
+    - 只存 8 字节指纹（blake2b 截断成 int）+ 保留截止时间，不再重复保存 URL 字符串
+    - 时间窗口：条目保留到 expires_at + window，过了就可以忘掉
+      （二维码已失效，即使同一消息再次出现也只会立刻被过期清理）
+    - 容量上限：超过 capacity 时淘汰最早加入的指纹
+    按加入顺序存放，清理只看队首，均摊 O(1)。
+    另记每个 (seat_key, qr_url) 的终态（scanned / expired），保留时间和容量与指纹相同，
+    供批量确认扫码判断重试（见 Store.scan_batch）；内存里的已扫 / 过期列表只留最近几个，不能用来判断。
+    调用方负责加锁（Store._lock）。
+    """
+
+    def __init__(self, *, window: float = 3600.0, capacity: int = 200000):
+        self.window = max(0.0, float(window))
+        self.capacity = max(1, int(capacity))
+        self._keep: "OrderedDict[int, float]" = OrderedDict()
+        self._terminal: "OrderedDict[int, Tuple[str, float]]" = OrderedDict()
+        self.evicted_expired = 0
+        self.evicted_capacity = 0
+
+    @staticmethod
+    def fingerprint(seat_key: str, qr_url: str, message_link: str) -> int:
+        raw = f"{seat_key}\0{qr_url}\0{message_link}".encode("utf-8")
+        return int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), "big")
+
+    def add(self, seat_key: str, qr_url: str, message_link: str, expires_at: float, now: Optional[float] = None) -> bool:
+        """
+        记录一个条目；返回 True 表示之前没见过（应当加入队列）。
+        """
+        now = time.time() if now is None else now
+        fp = self.fingerprint(seat_key, qr_url, message_link)
+        if fp in self._keep:
+            return False
+        self._purge(now)
+        self._keep[fp] = max(float(expires_at), now) + self.window
+        return True
+
+    def mark_terminal(self, seat_key: str, qr_url: str, status: str, expires_at: float, now: Optional[float] = None) -> None:
+        """
+        记录条目的终态（scanned / expired），按 (seat_key, qr_url) 查询（确认扫码时只带 qr_url）。
+        """
+        now = time.time() if now is None else now
+        fp = self.fingerprint(seat_key, qr_url, "")
+        term = self._terminal
+        term.pop(fp, None)
+        while term:
+            until = next(iter(term.values()))[1]
+            if until >= now and len(term) < self.capacity:
+                break
+            term.popitem(last=False)
+        term[fp] = (status, max(float(expires_at), now) + self.window)
+
+    def terminal_status(self, seat_key: str, qr_url: str, now: Optional[float] = None) -> Optional[str]:
+        hit = self._terminal.get(self.fingerprint(seat_key, qr_url, ""))
+        if hit is None:
+            return None
+        now = time.time() if now is None else now
+        return hit[0] if hit[1] >= now else None
+
+    def _purge(self, now: float) -> None:
+        keep = self._keep
+        while keep:
+            fp, until = next(iter(keep.items()))
+            if until >= now:
+                break
+            keep.popitem(last=False)
+            self.evicted_expired += 1
+        while len(keep) >= self.capacity:
+            keep.popitem(last=False)
+            self.evicted_capacity += 1
+
+    def __len__(self) -> int:
+        return len(self._keep)
+
+    def stats(self) -> Dict[str, Any]:
+        n = len(self._keep)
+        t = len(self._terminal)
+        # 估算：dict 本身 + 每项一个 int 指纹和一个 float（终态再加一个 tuple）
+        approx = (
+            sys.getsizeof(self._keep)
+            + n * (sys.getsizeof(1 << 63) + sys.getsizeof(0.0))
+            + sys.getsizeof(self._terminal)
+            + t * (sys.getsizeof(1 << 63) + sys.getsizeof(0.0) + sys.getsizeof((0, 0)))
+        )
+        return {
+            "entries": n,
+            "terminal_entries": t,
+            "capacity": self.capacity,
+            "window_seconds": self.window,
+            "approx_bytes": int(approx),
+            "evicted_expired": int(self.evicted_expired),
+            "evicted_capacity": int(self.evicted_capacity),
+        }
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from typing import Callable, Dict, Optional, Set
+
+from aiohttp import web
+
+
+class EventHub:
+    """
+    推送通道的订阅表：topic -> 订阅者（asyncio.Event）。
+
+    - publish 可以从任意线程调用（Store 的变更可能来自后台线程），
+      统一 call_soon_threadsafe 回到事件循环再 set
+    - 订阅者收到的只是“有变化”的信号，内容由 SSE handler 自己去取（增量），
+      一次突发的多次变更会自然合并成一次推送
+    """
+
+    def __init__(self) -> None:
+        self._subs: Dict[str, Set[asyncio.Event]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+    def subscribe(self, topic: str) -> asyncio.Event:
+        self._loop = asyncio.get_running_loop()
+        ev = asyncio.Event()
+        with self._lock:
+            self._subs.setdefault(topic, set()).add(ev)
+        return ev
+
+    def unsubscribe(self, topic: str, ev: asyncio.Event) -> None:
+        with self._lock:
+            subs = self._subs.get(topic)
+            if subs is not None:
+                subs.discard(ev)
+                if not subs:
+                    self._subs.pop(topic, None)
+
+    def publish(self, topic: str) -> None:
+        with self._lock:
+            subs = list(self._subs.get(topic) or ())
+        loop = self._loop
+        if not subs or loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            for ev in subs:
+                ev.set()
+        else:
+            for ev in subs:
+                loop.call_soon_threadsafe(ev.set)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(s) for s in self._subs.values())
+
+
+async def sse_stream(
+    request: web.Request,
+    hub: EventHub,
+    topic: str,
+    next_payload: Callable[[], Optional[bytes]],
+    *,
+    keepalive: float = 15.0,
+    min_interval: float = 0.0,
+    alive: Optional[Callable[[], bool]] = None,
+) -> web.StreamResponse:
+    """
+    Server-Sent Events：连上后先推一次 next_payload()，之后每次 topic 有变化再推一次。
+    - next_payload 返回 None 表示这次无需推送
+    - keepalive 秒没有变化就发一行注释，防止反代断开空闲连接
+    - min_interval > 0 时两次推送至少间隔该秒数（合并高频变更）
+    - alive() 返回 False 时结束（例如分组已删除）
+    """
+    ev = hub.subscribe(topic)
+    resp = web.StreamResponse(
+        headers={
+            "Content-Type": "text/event-stream",
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        }
+    )
+    await resp.prepare(request)
+    loop = asyncio.get_running_loop()
+    try:
+        while alive is None or alive():
+            payload = next_payload()
+            if payload is not None:
+                await resp.write(b"data: " + payload + b"\n\n")
+            sent_at = loop.time()
+            while True:
+                try:
+                    await asyncio.wait_for(ev.wait(), keepalive)
+                    break
+                except asyncio.TimeoutError:
+                    await resp.write(b": ping\n\n")
+            ev.clear()
+            if min_interval > 0:
+                wait = min_interval - (loop.time() - sent_at)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                    ev.clear()
+    except ConnectionResetError:
+        pass
+    finally:
+        hub.unsubscribe(topic, ev)
+    return resp
+
+
+def store_state_stream(store) -> Callable[[], Optional[bytes]]:
+    """
+    单个 Store 的推送内容：第一次全量，之后按版本号只推增量（与 /api/state?since= 同格式）。
+    """
+    last = {"version": None}
+
+    def next_payload() -> Optional[bytes]:
+        version = store.version
+        if last["version"] is None:
+            body = store.list_seats_for_ui_json()
+        elif version == last["version"]:
+            return None
+        else:
+            body = store.list_changes_since_json(last["version"], store.instance_id)
+        # 先取版本再生成内容：内容可能比 version 新，下次增量会重复推几个座位，但不会漏
+        last["version"] = version
+        return body
+
+    return next_payload
+
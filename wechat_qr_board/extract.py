@@ -1,16 +1,36 @@
 from __future__ import annotations
 
+import functools
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
 import re
 import time
-from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from .matcher import KeywordMatcher, as_matcher
 
 
 _URL_RE = re.compile(r"https?://[^\s<>()]+", re.IGNORECASE)
 _MD_URL_RE = re.compile(r"\((https?://[^\s)]+)\)")
+# 其余正则也在模块加载时编译一次，热路径上不再查 re 的缓存
+_URL_TAIL_PUNCT_RE = re.compile(r"[)\].,，。;；]+$")
+_ISO_DATE_RE = re.compile(r"(\d{4})-(\d{2})-(\d{2})")
+_EPOCH_RE = re.compile(r"\d{10,16}")
+_ACCOUNT_TEXT_RE = re.compile(r"(account|账号)\s*[:：]\s*([^\n\r]+)", re.IGNORECASE)
+_ACCOUNT_TAIL_RE = re.compile(r"[。\.\s;；]+$")
+_EMAIL_PASSWORD_RE = re.compile(r"^([^:\s/]+@[^:\s/]+)\s*[:/]\s*.+$")
+_SPACES_RE = re.compile(r"\s+")
+_DISCORD_TS_RE = re.compile(r"<t:(\d+):[A-Za-z]>")
+_XBOT_SHOW_TIME_RE = re.compile(r"(\d{8})\s+(\d{2}:\d{2})")
+_XBOT_PRICE_RE = re.compile(r"\bprice\b\s*([0-9]+(?:\.[0-9]+)?)", re.IGNORECASE)
+_XBOT_SKU_RE = re.compile(r"\bsku\b\s+(.*?)\s+\bprice\b", re.IGNORECASE)
 EXIMBAY_QR_KEYWORD = "secureapi.ext.eximbay.com/servlet/QRCodeGenerator"
 XBOT_QR_PREFIX = "https://api.xbotaio.com/api/v1/short-url/"
 SPIDER_FOOTER_KEYWORD = "spider browser"
+KAKAO_QR_HOST = "kakaopayqr.s3.amazonaws.com/"
+
+# 提取结果：(seat_key, seat_label, account_info, [(qr_url, message_link, captured_at, expires_at, meta), ...])
+ExtractResult = Tuple[str, str, str, List[Tuple[str, str, float, float, Dict[str, str]]]]
 
 
 def sanitize_url(url: str) -> str:
@@ -25,7 +45,7 @@ def sanitize_url(url: str) -> str:
     if m:
         url = m.group(1).strip()
     url = url.strip(" \t\r\n\"'<>")
-    url = re.sub(r"[)\].,，。;；]+$", "", url)
+    url = _URL_TAIL_PUNCT_RE.sub("", url)
     return url
 
 
@@ -56,27 +76,194 @@ def _collect_text_from_embed_dict(e: Dict) -> List[str]:
     return out
 
 
-def message_text_haystack(message) -> str:
+class ParsedMessage:
+    """
+    一条 Discord 消息的解析视图：每条消息在 on_message 里只建一次，所有提取函数共用。
+    - embeds：每个 embed 的 to_dict()（只调用一次；失败的跳过）
+    - fields：每个 embed 的字段列表 [(name, name_lower, value)]（已 strip）
+    - haystack：content + embed 文本的小写拼接（用于关键词匹配）
+    - image_urls：embed 图片 / 文本里的 URL + 附件 URL（去重保序）
+    后三者按需计算并缓存。
+    兼容 discord.py 1.x/2.x 的 message 对象（见 from_message）。
     """
-    兼容 discord.py 1.x/2.x 的 message 对象。
-    """
-    parts: List[str] = []
-    content = getattr(message, "content", None)
-    if isinstance(content, str) and content:
-        parts.append(content)
-    embeds = getattr(message, "embeds", None) or []
-    for em in embeds:
-        try:
-            parts.extend(_collect_text_from_embed_dict(em.to_dict()))
-        except Exception:
-            continue
-    return "\n".join(parts).lower()
 
+    __slots__ = (
+        "content",
+        "embeds",
+        "attachment_urls",
+        "guild_id",
+        "channel_id",
+        "message_id",
+        "_fields",
+        "_haystack",
+        "_media_text",
+        "_image_urls",
+    )
+
+    def __init__(
+        self,
+        *,
+        content: str = "",
+        embeds: Optional[List[Dict]] = None,
+        attachment_urls: Optional[List[str]] = None,
+        guild_id: Optional[int] = None,
+        channel_id: Optional[int] = None,
+        message_id: Optional[int] = None,
+    ):
+        self.content = content if isinstance(content, str) else ""
+        self.embeds: List[Dict] = [e for e in (embeds or []) if isinstance(e, dict)]
+        self.attachment_urls: List[str] = [u for u in (attachment_urls or []) if isinstance(u, str) and u]
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.message_id = message_id
+        self._fields: Optional[List[List[Tuple[str, str, str]]]] = None
+        self._haystack: Optional[str] = None
+        self._media_text: Optional[str] = None
+        self._image_urls: Optional[List[str]] = None
+
+    @classmethod
+    def from_message(cls, message) -> "ParsedMessage":
+        embeds: List[Dict] = []
+        for em in getattr(message, "embeds", None) or []:
+            try:
+                embeds.append(em.to_dict())
+            except Exception:
+                continue
+        atts: List[str] = []
+        for a in getattr(message, "attachments", None) or []:
+            u = getattr(a, "url", None)
+            if isinstance(u, str) and u:
+                atts.append(u)
+        guild = getattr(message, "guild", None)
+        channel = getattr(message, "channel", None)
+        return cls(
+            content=getattr(message, "content", None) or "",
+            embeds=embeds,
+            attachment_urls=atts,
+            guild_id=getattr(guild, "id", None) if guild else None,
+            channel_id=getattr(channel, "id", None) if channel else None,
+            message_id=getattr(message, "id", None),
+        )
+
+    @classmethod
+    def from_snapshot(cls, snap: Dict) -> "ParsedMessage":
+        """
+        从消息快照（见 to_snapshot）恢复；录制的消息 / 跨进程传递都用这个格式。
+        """
+
+        def _id(v) -> Optional[int]:
+            return int(v) if v not in (None, "") else None
+
+        return cls(
+            content=snap.get("content") or "",
+            embeds=list(snap.get("embeds") or []),
+            attachment_urls=list(snap.get("attachments") or []),
+            guild_id=_id(snap.get("guild_id")),
+            channel_id=_id(snap.get("channel_id")),
+            message_id=_id(snap.get("message_id")),
+        )
+
+    def to_snapshot(self) -> Dict:
+        """
+        消息快照（可直接 json.dumps）：
+        {"content": str, "embeds": [embed.to_dict(), ...], "attachments": [url, ...],
+         "guild_id": int|None, "channel_id": int|None, "message_id": int|None}
+        """
+        return {
+            "content": self.content,
+            "embeds": self.embeds,
+            "attachments": self.attachment_urls,
+            "guild_id": self.guild_id,
+            "channel_id": self.channel_id,
+            "message_id": self.message_id,
+        }
+
+    @property
+    def fields(self) -> List[List[Tuple[str, str, str]]]:
+        if self._fields is None:
+            out: List[List[Tuple[str, str, str]]] = []
+            for e in self.embeds:
+                fs: List[Tuple[str, str, str]] = []
+                for f in (e.get("fields") or []):
+                    if not isinstance(f, dict):
+                        continue
+                    name = str(f.get("name") or "").strip()
+                    fs.append((name, name.lower(), str(f.get("value") or "").strip()))
+                out.append(fs)
+            self._fields = out
+        return self._fields
+
+    def field_map(self, index: int) -> Dict[str, str]:
+        """
+        第 index 个 embed 的 fields 按 name -> value 映射（同名取第一个非空的）。
+        """
+        out: Dict[str, str] = {}
+        for name, _, val in self.fields[index]:
+            if name and val and name not in out:
+                out[name] = val
+        return out
+
+    @property
+    def haystack(self) -> str:
+        if self._haystack is None:
+            parts: List[str] = []
+            if self.content:
+                parts.append(self.content)
+            for e in self.embeds:
+                parts.extend(_collect_text_from_embed_dict(e))
+            self._haystack = "\n".join(parts).lower()
+        return self._haystack
+
+    @property
+    def media_text(self) -> str:
+        """
+        embed 图片 / 缩略图 URL + 附件 URL 的小写拼接（不在 haystack 里），给来源识别做子串判断。
+        """
+        if self._media_text is None:
+            parts: List[str] = []
+            for e in self.embeds:
+                for k in ("image", "thumbnail"):
+                    u = (e.get(k) or {}).get("url")
+                    if isinstance(u, str) and u:
+                        parts.append(u)
+            parts.extend(self.attachment_urls)
+            self._media_text = "\n".join(parts).lower()
+        return self._media_text
+
+    @property
+    def image_urls(self) -> List[str]:
+        if self._image_urls is None:
+            urls: List[str] = []
+            for e in self.embeds:
+                urls.extend(extract_embed_image_urls(e))
+            urls.extend(sanitize_url(u) for u in self.attachment_urls)
+            # 去重保持顺序
+            self._image_urls = list(dict.fromkeys(urls))
+        return self._image_urls
+
+    @property
+    def message_link(self) -> str:
+        if self.guild_id and self.channel_id and self.message_id:
+            return f"https://discord.com/channels/{self.guild_id}/{self.channel_id}/{self.message_id}"
+        # fallback
+        return ""
 
-def match_all_keywords(haystack_lower: str, keywords: Sequence[str]) -> bool:
-    if not keywords:
-        return True
-    return all((kw or "").lower() in haystack_lower for kw in keywords)
+
+def parse_message(message) -> ParsedMessage:
+    """
+    提取函数的入口：传入 discord message 或已经建好的 ParsedMessage（直接复用）。
+    """
+    if isinstance(message, ParsedMessage):
+        return message
+    return ParsedMessage.from_message(message)
+
+
+def message_text_haystack(message) -> str:
+    return parse_message(message).haystack
+
+
+def match_all_keywords(haystack_lower: str, keywords: Union[KeywordMatcher, Sequence[str]]) -> bool:
+    return as_matcher(keywords).match_all(haystack_lower)
 
 
 def extract_embed_image_urls(embed_dict: Dict) -> List[str]:
@@ -122,23 +309,10 @@ def _extract_spider_fields(message) -> Dict[str, str]:
     """
     Spider 的 embed.fields 按 name -> value 映射（取第一个 Spider embed）。
     """
-    embeds = getattr(message, "embeds", None) or []
-    for em in embeds:
-        try:
-            d = em.to_dict()
-        except Exception:
-            continue
-        if not _has_spider_footer(d):
-            continue
-        out: Dict[str, str] = {}
-        for f in (d.get("fields") or []):
-            if not isinstance(f, dict):
-                continue
-            name = str(f.get("name") or "").strip()
-            val = str(f.get("value") or "").strip()
-            if name and val and name not in out:
-                out[name] = val
-        return out
+    pm = parse_message(message)
+    for i, d in enumerate(pm.embeds):
+        if _has_spider_footer(d):
+            return pm.field_map(i)
     return {}
 
 
@@ -148,20 +322,13 @@ def _extract_spider_qr_url_from_embeds(message) -> Optional[str]:
     - name: Checkout Link(Wechat)
     - value: [Click](https://secureapi.ext.eximbay.com/servlet/QRCodeGenerator?...qrtxt=weixin://...)
     """
-    embeds = getattr(message, "embeds", None) or []
-    for em in embeds:
-        try:
-            d = em.to_dict()
-        except Exception:
-            continue
+    pm = parse_message(message)
+    for i, d in enumerate(pm.embeds):
         if not _has_spider_footer(d):
             continue
-        for f in (d.get("fields") or []):
-            if not isinstance(f, dict):
-                continue
-            name = str(f.get("name") or "").strip().lower()
+        for _, name, value in pm.fields[i]:
             if "checkout" in name and "wechat" in name:
-                val = sanitize_url(str(f.get("value") or ""))
+                val = sanitize_url(value)
                 if val and (EXIMBAY_QR_KEYWORD.lower() in val.lower()) and ("qrtxt=weixin://" in val.lower()):
                     return val
     return None
@@ -190,7 +357,7 @@ def _parse_spider_event_time(text: str) -> Dict[str, str]:
         out["show_time"] = dt_utc.strftime("%Y-%m-%d %H:%M")
     except Exception:
         # 兜底：仅提取日期
-        m = re.search(r"(\d{4})-(\d{2})-(\d{2})", t)
+        m = _ISO_DATE_RE.search(t)
         if m:
             out["date_key"] = f"{m.group(1)}{m.group(2)}{m.group(3)}"
     return out
@@ -200,7 +367,7 @@ def _parse_spider_timestamp_ms(text: str) -> Optional[float]:
     t = (text or "").strip()
     if not t:
         return None
-    if not re.fullmatch(r"\d{10,16}", t):
+    if not _EPOCH_RE.fullmatch(t):
         return None
     try:
         n = int(t)
@@ -213,12 +380,7 @@ def _parse_spider_timestamp_ms(text: str) -> Optional[float]:
 
 
 def _extract_xbot_qr_url_from_embeds(message) -> Optional[str]:
-    embeds = getattr(message, "embeds", None) or []
-    for em in embeds:
-        try:
-            d = em.to_dict()
-        except Exception:
-            continue
+    for d in parse_message(message).embeds:
         if not _has_xbot_footer(d):
             continue
         img = (d.get("image") or {}).get("url")
@@ -232,52 +394,15 @@ def _extract_xbot_fields(message) -> Dict[str, str]:
     """
     将 embed.fields 按 name -> value 映射（取第一个 Xbot embed）。
     """
-    embeds = getattr(message, "embeds", None) or []
-    for em in embeds:
-        try:
-            d = em.to_dict()
-        except Exception:
-            continue
-        if not _has_xbot_footer(d):
-            continue
-        out: Dict[str, str] = {}
-        for f in (d.get("fields") or []):
-            if not isinstance(f, dict):
-                continue
-            name = str(f.get("name") or "").strip()
-            val = str(f.get("value") or "").strip()
-            if name and val and name not in out:
-                out[name] = val
-        return out
+    pm = parse_message(message)
+    for i, d in enumerate(pm.embeds):
+        if _has_xbot_footer(d):
+            return pm.field_map(i)
     return {}
 
 
 def extract_all_image_urls(message) -> List[str]:
-    urls: List[str] = []
-    embeds = getattr(message, "embeds", None) or []
-    for em in embeds:
-        try:
-            urls.extend(extract_embed_image_urls(em.to_dict()))
-        except Exception:
-            continue
-    atts = getattr(message, "attachments", None) or []
-    for a in atts:
-        u = getattr(a, "url", None)
-        if isinstance(u, str) and u:
-            urls.append(sanitize_url(u))
-    # 去重保持顺序
-    seen = set()
-    out: List[str] = []
-    for u in urls:
-        if u in seen:
-            continue
-        seen.add(u)
-        out.append(u)
-    return out
-
-
-def _normalize_field(s: str) -> str:
-    return (s or "").strip().lower()
+    return list(parse_message(message).image_urls)
 
 
 def _pick_tsplash_seat_line(value: str) -> Optional[str]:
@@ -331,74 +456,58 @@ def _pick_tsplash_seat_line(value: str) -> Optional[str]:
     return seat_line or first
 
 
-def extract_seat_label_from_embeds(message, seat_field_name_patterns: Sequence[str]) -> Optional[str]:
-    patterns = [_normalize_field(p) for p in seat_field_name_patterns if p]
-    embeds = getattr(message, "embeds", None) or []
+def extract_seat_label_from_embeds(
+    message, seat_field_name_patterns: Union[KeywordMatcher, Sequence[str]]
+) -> Optional[str]:
+    patterns = as_matcher(seat_field_name_patterns, strip=True)
+    pm = parse_message(message)
     # 1) fields 匹配 name
-    for em in embeds:
-        try:
-            d = em.to_dict()
-        except Exception:
-            continue
-        for f in (d.get("fields") or []):
-            if not isinstance(f, dict):
-                continue
-            name = _normalize_field(str(f.get("name") or ""))
-            if any(p in name for p in patterns):
-                val = str(f.get("value") or "").strip()
+    for fs in pm.fields:
+        for _, name, val in fs:
+            if patterns.search(name):
                 if val:
                     picked = _pick_tsplash_seat_line(val)
                     if picked:
                         return picked
     # 2) description 兜底：找包含 seat/位置 的行
-    for em in embeds:
-        try:
-            d = em.to_dict()
-        except Exception:
-            continue
+    for d in pm.embeds:
         desc = str(d.get("description") or "")
         for ln in desc.splitlines():
             lnl = ln.lower()
-            if any(p in lnl for p in patterns):
+            if patterns.search(lnl):
                 return ln.strip()
     return None
 
 
-def extract_account_info_from_embeds(message, account_field_name_patterns: Sequence[str]) -> str:
-    patterns = [_normalize_field(p) for p in account_field_name_patterns if p]
-    embeds = getattr(message, "embeds", None) or []
+def extract_account_info_from_embeds(
+    message, account_field_name_patterns: Union[KeywordMatcher, Sequence[str]]
+) -> str:
+    patterns = as_matcher(account_field_name_patterns, strip=True)
+    pm = parse_message(message)
     hits: List[str] = []
-    for em in embeds:
-        try:
-            d = em.to_dict()
-        except Exception:
-            continue
-        for f in (d.get("fields") or []):
-            if not isinstance(f, dict):
-                continue
-            name = _normalize_field(str(f.get("name") or ""))
-            if any(p in name for p in patterns):
-                val = str(f.get("value") or "").strip()
+    for fs in pm.fields:
+        for _, name, val in fs:
+            if patterns.search(name):
                 if val:
                     hits.append(val.replace("||", "").strip())
     # 若没匹配到字段名，尝试从文本里抓常见 "account:xxx" 形式
     if not hits:
-        hay = message_text_haystack(message)
-        m = re.search(r"(account|账号)\s*[:：]\s*([^\n\r]+)", hay, re.IGNORECASE)
+        hay = pm.haystack
+        m = _ACCOUNT_TEXT_RE.search(hay)
         if m:
             hits.append(m.group(2).strip())
     # 清理：去掉尾部常见标点（T-Splash 常见末尾有 '.'），并对密码做脱敏（只保留账号）
     cleaned: List[str] = []
     for x in hits:
         x = x.replace("||", "").strip()
-        x = re.sub(r"[。\.\s;；]+$", "", x)
+        x = _ACCOUNT_TAIL_RE.sub("", x)
         if not x:
             continue
         # 常见格式：
         # - email:password
         # - email/password
         # - email password
-        m = re.match(r"^([^:\s/]+@[^:\s/]+)\s*[:/]\s*.+$", x)
+        m = _EMAIL_PASSWORD_RE.match(x)
         if m:
             cleaned.append(f"{m.group(1)}:****")
         else:
@@ -413,15 +522,7 @@ def extract_account_info_from_embeds(message, account_field_name_patterns: Seque
 
 
 def make_message_link(message) -> str:
-    guild = getattr(message, "guild", None)
-    guild_id = getattr(guild, "id", None) if guild else None
-    channel = getattr(message, "channel", None)
-    channel_id = getattr(channel, "id", None) if channel else None
-    message_id = getattr(message, "id", None)
-    if guild_id and channel_id and message_id:
-        return f"https://discord.com/channels/{guild_id}/{channel_id}/{message_id}"
-    # fallback
-    return ""
+    return parse_message(message).message_link
 
 
 def choose_seat_key(seat_label: str) -> str:
@@ -430,7 +531,7 @@ def choose_seat_key(seat_label: str) -> str:
     if not seat_label:
         return "unknown"
     # 删除过多空白，避免 key 变化
-    seat_label = re.sub(r"\s+", " ", seat_label)
+    seat_label = _SPACES_RE.sub(" ", seat_label)
     return seat_label
 
 
@@ -490,7 +591,7 @@ def _parse_discord_timestamp(text: str) -> Optional[float]:
     """
     解析 <t:1768810703:F> 这种格式，取第一个 timestamp。
     """
-    m = re.search(r"<t:(\d+):[A-Za-z]>", text or "")
+    m = _DISCORD_TS_RE.search(text or "")
     if not m:
         return None
     try:
@@ -507,7 +608,7 @@ def _parse_xbot_show_time(round_text: str) -> Dict[str, str]:
     - show_time: YYYY-MM-DD HH:mm
     """
     out = {"date_key": "", "show_time": ""}
-    m = re.search(r"(\d{8})\s+(\d{2}:\d{2})", round_text or "")
+    m = _XBOT_SHOW_TIME_RE.search(round_text or "")
     if not m:
         return out
     ymd = m.group(1)
@@ -530,154 +631,327 @@ def _parse_xbot_seat_price(seat_no_text: str) -> Dict[str, str]:
     """
     t = _strip_codeblock(seat_no_text)
     out = {"seat_detail": t, "price": ""}
-    m_price = re.search(r"\bprice\b\s*([0-9]+(?:\.[0-9]+)?)", t, re.IGNORECASE)
+    m_price = _XBOT_PRICE_RE.search(t)
     if m_price:
         out["price"] = m_price.group(1)
     # 尝试提取 sku 段作为更清晰的“座位/票种信息”
-    m_sku = re.search(r"\bsku\b\s+(.*?)\s+\bprice\b", t, re.IGNORECASE)
+    m_sku = _XBOT_SKU_RE.search(t)
     if m_sku:
         out["seat_detail"] = m_sku.group(1).strip()
     return out
 
 
-def extract_wechat_qr_entries(
-    message,
-    *,
-    keywords: Sequence[str],
-    seat_field_name_patterns: Sequence[str],
-    account_field_name_patterns: Sequence[str],
-    countdown_seconds: int,
-) -> Optional[Tuple[str, str, str, List[Tuple[str, str, float, float, Dict[str, str]]]]]:
+def _empty_matcher() -> KeywordMatcher:
+    return KeywordMatcher(())
+
+
+@dataclass
+class ExtractConfig:
     """
-    返回：
-    - seat_key
-    - seat_label
-    - account_info
-    - items: [(qr_url, message_link, captured_at, expires_at, meta), ...]
+    提取用的配置，由配置加载（config.load_config）构造一次：
+    关键词 / 字段名模式在构造时编译成 KeywordMatcher（传列表也行，会自动编译；
+    字段名模式去首尾空白，关键词不去，与原来逐个比较时一致）。
     """
-    # ===== Spider 分支（不与 T-Splash 混淆；二维码在字段里）=====
-    spider_qr = _extract_spider_qr_url_from_embeds(message)
-    if spider_qr:
-        fields = _extract_spider_fields(message)
-        seat_detail = (fields.get("Seat") or "").strip()
-        price = (fields.get("Price") or "").strip()
-        event_time = (fields.get("Event Time") or "").strip()
-        task_id = (fields.get("Task Id") or "").strip()
-        product_id = (fields.get("Product Id") or "").strip()
-        product = (fields.get("Product") or "").strip()
-        product_url = sanitize_url(fields.get("Product Url") or "")
-        captured_at = _parse_spider_timestamp_ms(fields.get("Timestamp") or "") or time.time()
-
-        time_info = _parse_spider_event_time(event_time)
-        date_key = time_info.get("date_key") or ""
-        seat_label = f"{date_key} {seat_detail}".strip() if date_key else (seat_detail or "Unknown")
-        # seat_key 用 task_id（或 timestamp）做唯一性
-        uniq = task_id or str(int(captured_at))
-        seat_key = f"{uniq} {seat_label}".strip() if uniq else choose_seat_key(seat_label)
-
-        account_info = extract_account_info_from_embeds(message, account_field_name_patterns)
-        link = make_message_link(message)
-        expires_at = float(captured_at) + float(countdown_seconds)
-
-        meta = {
-            "source": "spider",
-            "seat_detail": seat_detail,
-            "price": price,
-            "date": time_info.get("show_time") or "",
-            "task_id": task_id,
-            "product_id": product_id,
-            "product": product,
-            "product_url": product_url,
-        }
-        items = [(spider_qr, link, float(captured_at), float(expires_at), meta)]
-        return seat_key, seat_label, account_info, items
 
-    # ===== Xbot 分支（不与 T-Splash 混淆）=====
-    # 注意：Xbot 支付可能是 alipay 等，不一定包含 wechat/payment exported 等关键词，
-    # 所以 Xbot 必须先判定，不能被 keywords 过滤挡掉。
-    xbot_qr = _extract_xbot_qr_url_from_embeds(message)
-    if xbot_qr:
-        fields = _extract_xbot_fields(message)
-        seat_no = fields.get("Seat No", "")
-        qty = fields.get("Quantity", "")
-        round_txt = fields.get("Round", "")
-        order_no = fields.get("Order Number", "")
-        expire_txt = fields.get("Order Expire", "")
-
-        time_info = _parse_xbot_show_time(round_txt)
-        seat_price = _parse_xbot_seat_price(seat_no)
-
-        date_key = time_info.get("date_key") or ""
-        seat_detail = seat_price.get("seat_detail") or ""
-        # 左侧展示：日期在上，座位/票种在下
-        seat_label = f"{date_key} {seat_detail}".strip() if date_key else (seat_detail or "Unknown")
-        # seat_key 用订单号做唯一性（避免不同订单同座位被合并）
-        seat_key = f"{order_no} {seat_label}".strip() if order_no else choose_seat_key(seat_label)
-
-        account_info = extract_account_info_from_embeds(message, account_field_name_patterns)
-        link = make_message_link(message)
-        now = time.time()
-        expires_at = _parse_discord_timestamp(expire_txt) or (now + float(countdown_seconds))
-
-        meta = {
-            "source": "xbot",
-            "seat_detail": seat_detail,
-            "price": seat_price.get("price") or "",
-            "date": time_info.get("show_time") or "",
-            "quantity": str(qty or "").strip(),
-            "order_number": str(order_no or "").strip(),
-        }
-        items = [(xbot_qr, link, now, float(expires_at), meta)]
-        return seat_key, seat_label, account_info, items
+    keywords: KeywordMatcher = field(default_factory=_empty_matcher)
+    seat_field_name_patterns: KeywordMatcher = field(default_factory=_empty_matcher)
+    account_field_name_patterns: KeywordMatcher = field(default_factory=_empty_matcher)
+    countdown_seconds: int = 415
+    # Kakao（T-Splash）消息需要同时命中的关键词
+    kakao_keywords: KeywordMatcher = field(default_factory=lambda: KeywordMatcher(("payment exported", "kakao")))
+
+    def __post_init__(self) -> None:
+        self.keywords = as_matcher(self.keywords)
+        self.seat_field_name_patterns = as_matcher(self.seat_field_name_patterns, strip=True)
+        self.account_field_name_patterns = as_matcher(self.account_field_name_patterns, strip=True)
+        self.kakao_keywords = as_matcher(self.kakao_keywords)
+
+
+@dataclass(frozen=True)
+class SourceParser:
+    """
+    一种来源（机器人格式）的解析器：
+    - kind：分发到哪类分组（wechat / kakao）
+    - matches：廉价的特征判断（footer 文本、图片 URL 前缀、URL 子串……），不做完整解析
+    - parse：完整解析；特征命中但内容不全时返回 None（接着交给下一个特征命中的解析器）
+    """
 
-    # ===== 兜底：T-Splash/Eximbay 分支 =====
-    hay = message_text_haystack(message)
-    if not match_all_keywords(hay, keywords):
+    name: str
+    kind: str
+    matches: Callable[[ParsedMessage], bool]
+    parse: Callable[[ParsedMessage, ExtractConfig], Optional[ExtractResult]]
+
+
+def _spider_signature(pm: ParsedMessage) -> bool:
+    # Spider footer + “Checkout ... Wechat” 字段
+    for i, d in enumerate(pm.embeds):
+        if _has_spider_footer(d) and any("checkout" in n and "wechat" in n for _, n, _ in pm.fields[i]):
+            return True
+    return False
+
+
+def _xbot_signature(pm: ParsedMessage) -> bool:
+    # Xbot footer + 短链二维码图片
+    return _extract_xbot_qr_url_from_embeds(pm) is not None
+
+
+def _kakao_signature(pm: ParsedMessage) -> bool:
+    return KAKAO_QR_HOST in pm.media_text or KAKAO_QR_HOST in pm.haystack
+
+
+def _eximbay_signature(pm: ParsedMessage) -> bool:
+    kw = EXIMBAY_QR_KEYWORD.lower()
+    return kw in pm.haystack or kw in pm.media_text
+
+
+def _parse_spider(pm: ParsedMessage, cfg: ExtractConfig) -> Optional[ExtractResult]:
+    # Spider：不与 T-Splash 混淆；二维码在字段里
+    spider_qr = _extract_spider_qr_url_from_embeds(pm)
+    if not spider_qr:
+        return None
+    fields = _extract_spider_fields(pm)
+    seat_detail = (fields.get("Seat") or "").strip()
+    price = (fields.get("Price") or "").strip()
+    event_time = (fields.get("Event Time") or "").strip()
+    task_id = (fields.get("Task Id") or "").strip()
+    product_id = (fields.get("Product Id") or "").strip()
+    product = (fields.get("Product") or "").strip()
+    product_url = sanitize_url(fields.get("Product Url") or "")
+    captured_at = _parse_spider_timestamp_ms(fields.get("Timestamp") or "") or time.time()
+
+    time_info = _parse_spider_event_time(event_time)
+    date_key = time_info.get("date_key") or ""
+    seat_label = f"{date_key} {seat_detail}".strip() if date_key else (seat_detail or "Unknown")
+    # seat_key 用 task_id（或 timestamp）做唯一性
+    uniq = task_id or str(int(captured_at))
+    seat_key = f"{uniq} {seat_label}".strip() if uniq else choose_seat_key(seat_label)
+
+    account_info = extract_account_info_from_embeds(pm, cfg.account_field_name_patterns)
+    link = make_message_link(pm)
+    expires_at = float(captured_at) + float(cfg.countdown_seconds)
+
+    meta = {
+        "source": "spider",
+        "seat_detail": seat_detail,
+        "price": price,
+        "date": time_info.get("show_time") or "",
+        "task_id": task_id,
+        "product_id": product_id,
+        "product": product,
+        "product_url": product_url,
+    }
+    items = [(spider_qr, link, float(captured_at), float(expires_at), meta)]
+    return seat_key, seat_label, account_info, items
+
+
+def _parse_xbot(pm: ParsedMessage, cfg: ExtractConfig) -> Optional[ExtractResult]:
+    # 注意：Xbot 支付可能是 alipay 等，不一定包含 wechat/payment exported 等关键词，
+    # 所以 Xbot 不做 keywords 过滤。
+    xbot_qr = _extract_xbot_qr_url_from_embeds(pm)
+    if not xbot_qr:
         return None
-    seat_label = extract_seat_label_from_embeds(message, seat_field_name_patterns) or "Unknown"
-    account_info = extract_account_info_from_embeds(message, account_field_name_patterns)
-    link = make_message_link(message)
+    fields = _extract_xbot_fields(pm)
+    seat_no = fields.get("Seat No", "")
+    qty = fields.get("Quantity", "")
+    round_txt = fields.get("Round", "")
+    order_no = fields.get("Order Number", "")
+    expire_txt = fields.get("Order Expire", "")
+
+    time_info = _parse_xbot_show_time(round_txt)
+    seat_price = _parse_xbot_seat_price(seat_no)
+
+    date_key = time_info.get("date_key") or ""
+    seat_detail = seat_price.get("seat_detail") or ""
+    # 左侧展示：日期在上，座位/票种在下
+    seat_label = f"{date_key} {seat_detail}".strip() if date_key else (seat_detail or "Unknown")
+    # seat_key 用订单号做唯一性（避免不同订单同座位被合并）
+    seat_key = f"{order_no} {seat_label}".strip() if order_no else choose_seat_key(seat_label)
+
+    account_info = extract_account_info_from_embeds(pm, cfg.account_field_name_patterns)
+    link = make_message_link(pm)
+    now = time.time()
+    expires_at = _parse_discord_timestamp(expire_txt) or (now + float(cfg.countdown_seconds))
+
+    meta = {
+        "source": "xbot",
+        "seat_detail": seat_detail,
+        "price": seat_price.get("price") or "",
+        "date": time_info.get("show_time") or "",
+        "quantity": str(qty or "").strip(),
+        "order_number": str(order_no or "").strip(),
+    }
+    items = [(xbot_qr, link, now, float(expires_at), meta)]
+    return seat_key, seat_label, account_info, items
+
 
-    urls = extract_all_image_urls(message)
-    qr_urls = filter_qr_urls(urls)
+def _parse_image_qr(
+    pm: ParsedMessage,
+    cfg: ExtractConfig,
+    keywords: KeywordMatcher,
+    url_filter: Callable[[Iterable[str]], List[str]],
+    source: str,
+) -> Optional[ExtractResult]:
+    # T-Splash/Eximbay 与 Kakao 共用：关键词过滤 + 座位字段 + 按规则筛选消息里的图片 URL
+    if not keywords.match_all(pm.haystack):
+        return None
+    qr_urls = url_filter(pm.image_urls)
     if not qr_urls:
         return None
+    seat_label = extract_seat_label_from_embeds(pm, cfg.seat_field_name_patterns) or "Unknown"
+    account_info = extract_account_info_from_embeds(pm, cfg.account_field_name_patterns)
+    link = make_message_link(pm)
 
     now = time.time()
-    items = [(u, link, now, now + float(countdown_seconds), {"source": "eximbay"}) for u in qr_urls]
+    items = [(u, link, now, now + float(cfg.countdown_seconds), {"source": source}) for u in qr_urls]
     seat_key = choose_seat_key(seat_label)
     return seat_key, seat_label, account_info, items
 
 
+def _parse_eximbay(pm: ParsedMessage, cfg: ExtractConfig) -> Optional[ExtractResult]:
+    return _parse_image_qr(pm, cfg, cfg.keywords, filter_qr_urls, "eximbay")
+
+
+def _parse_kakao_tsplash(pm: ParsedMessage, cfg: ExtractConfig) -> Optional[ExtractResult]:
+    # 不做 Eximbay/weixin 限制，直接取消息里的 Kakao Pay 二维码图片
+    return _parse_image_qr(pm, cfg, cfg.kakao_keywords, filter_kakao_qr_urls, "kakao_tsplash")
+
+
+# 按顺序做特征判断，第一个命中且解析出结果的解析器负责这条消息。
+# Spider 的二维码本身就是 Eximbay 链接，所以必须排在 eximbay 之前。
+PARSERS: List[SourceParser] = [
+    SourceParser("spider", "wechat", _spider_signature, _parse_spider),
+    SourceParser("xbot", "wechat", _xbot_signature, _parse_xbot),
+    SourceParser("kakao_tsplash", "kakao", _kakao_signature, _parse_kakao_tsplash),
+    SourceParser("eximbay", "wechat", _eximbay_signature, _parse_eximbay),
+]
+
+
+def register_parser(parser: SourceParser, *, before: Optional[str] = None) -> None:
+    """
+    注册新的来源解析器（同名的替换掉）；before 指定插在哪个解析器之前，默认追加到末尾。
+    """
+    PARSERS[:] = [p for p in PARSERS if p.name != parser.name]
+    idx = next((i for i, p in enumerate(PARSERS) if p.name == before), len(PARSERS)) if before else len(PARSERS)
+    PARSERS.insert(idx, parser)
+
+
+def _parsers_for(kinds: Optional[Sequence[str]]) -> List[SourceParser]:
+    # 只看 kinds 里的类型，并按 kinds 的顺序排优先级（同类型内按注册顺序）：
+    # 服务端传 ("kakao", "wechat")，与旧版一样先认 Kakao
+    if kinds is None:
+        return list(PARSERS)
+    rank = {k: i for i, k in enumerate(kinds)}
+    return sorted((p for p in PARSERS if p.kind in rank), key=lambda p: rank[p.kind])
+
+
+def classify_message(message, kinds: Optional[Sequence[str]] = None) -> Optional[SourceParser]:
+    """
+    单次识别：返回第一个特征命中的解析器（只看 kinds 里的类型，顺序见 _parsers_for），都不命中返回 None。
+    """
+    pm = parse_message(message)
+    for p in _parsers_for(kinds):
+        if p.matches(pm):
+            return p
+    return None
+
+
+def extract_entries(
+    message, cfg: ExtractConfig, kinds: Optional[Sequence[str]] = None
+) -> Optional[Tuple[SourceParser, ExtractResult]]:
+    """
+    识别来源并交给对应的解析器，返回 (解析器, 提取结果)；识别不到或内容都不全返回 None。
+    特征命中的解析器解析不出结果时，继续试下一个特征命中的（与旧版逐个分支往下走一致）。
+    调用方按 parser.kind 决定分发到微信组还是 Kakao 组。
+    """
+    pm = parse_message(message)
+    for parser in _parsers_for(kinds):
+        if not parser.matches(pm):
+            continue
+        result = parser.parse(pm, cfg)
+        if result:
+            return parser, result
+    return None
+
+
+def _pattern_key(patterns: Union[KeywordMatcher, Sequence[str], None]):
+    # 缓存键：已编译的 matcher 按对象本身，列表转成 tuple
+    return patterns if isinstance(patterns, KeywordMatcher) else tuple(patterns or ())
+
+
+@functools.lru_cache(maxsize=64)
+def _legacy_config(keywords, seat_patterns, account_patterns, countdown_seconds: int, kakao_keywords) -> ExtractConfig:
+    return ExtractConfig(
+        keywords=keywords,
+        seat_field_name_patterns=seat_patterns,
+        account_field_name_patterns=account_patterns,
+        countdown_seconds=countdown_seconds,
+        kakao_keywords=kakao_keywords,
+    )
+
+
+def _config_for_legacy(
+    cfg: Optional[ExtractConfig],
+    keywords,
+    seat_field_name_patterns,
+    account_field_name_patterns,
+    countdown_seconds: int,
+    kakao_keywords,
+) -> ExtractConfig:
+    """
+    旧接口的配置：传了 cfg 直接用；否则按参数缓存编译好的 ExtractConfig，同样的参数不再每次重新编译。
+    """
+    if cfg is not None:
+        return cfg
+    return _legacy_config(
+        _pattern_key(keywords),
+        _pattern_key(seat_field_name_patterns),
+        _pattern_key(account_field_name_patterns),
+        int(countdown_seconds),
+        _pattern_key(kakao_keywords),
+    )
+
+
+def extract_wechat_qr_entries(
+    message,
+    *,
+    keywords: Sequence[str] = (),
+    seat_field_name_patterns: Sequence[str] = (),
+    account_field_name_patterns: Sequence[str] = (),
+    countdown_seconds: int = 415,
+    cfg: Optional[ExtractConfig] = None,
+) -> Optional[ExtractResult]:
+    """
+    只识别微信类来源（spider / xbot / eximbay）。
+    返回：
+    - seat_key
+    - seat_label
+    - account_info
+    - items: [(qr_url, message_link, captured_at, expires_at, meta), ...]
+    message 可以是 discord message，也可以是同一条消息已建好的 ParsedMessage（多个提取函数共用时只解析一次）。
+    传了 cfg（预编译的 ExtractConfig）时忽略其余参数。
+    """
+    cfg = _config_for_legacy(
+        cfg, keywords, seat_field_name_patterns, account_field_name_patterns, countdown_seconds, ("payment exported", "kakao")
+    )
+    found = extract_entries(message, cfg, ("wechat",))
+    return found[1] if found else None
+
+
 def extract_kakao_pay_entries(
     message,
     *,
     keywords: Sequence[str] = ("payment exported", "kakao"),
-    seat_field_name_patterns: Sequence[str],
-    account_field_name_patterns: Sequence[str],
-    countdown_seconds: int,
-) -> Optional[Tuple[str, str, str, List[Tuple[str, str, float, float, Dict[str, str]]]]]:
+    seat_field_name_patterns: Sequence[str] = (),
+    account_field_name_patterns: Sequence[str] = (),
+    countdown_seconds: int = 415,
+    cfg: Optional[ExtractConfig] = None,
+) -> Optional[ExtractResult]:
     """
     Kakao Pay 专用（服务端固定分组用）：
     - 仅当 message 文本/embeds 命中所有 keywords（默认：payment exported + kakao）才返回
     - 不做 Eximbay/weixin 限制，直接提取消息里的图片 URL 作为二维码候选
+    传了 cfg（预编译的 ExtractConfig，用其中的 kakao_keywords）时忽略其余参数。
     """
-    hay = message_text_haystack(message)
-    if not match_all_keywords(hay, keywords):
-        return None
-
-    seat_label = extract_seat_label_from_embeds(message, seat_field_name_patterns) or "Unknown"
-    account_info = extract_account_info_from_embeds(message, account_field_name_patterns)
-    link = make_message_link(message)
-
-    urls = extract_all_image_urls(message)
-    qr_urls = filter_kakao_qr_urls(urls)
-    if not qr_urls:
-        return None
-
-    now = time.time()
-    items = [(u, link, now, now + float(countdown_seconds), {"source": "kakao_tsplash"}) for u in qr_urls]
-    seat_key = choose_seat_key(seat_label)
-    return seat_key, seat_label, account_info, items
-
-
+    cfg = _config_for_legacy(cfg, (), seat_field_name_patterns, account_field_name_patterns, countdown_seconds, keywords)
+    found = extract_entries(message, cfg, ("kakao",))
+    return found[1] if found else None
@@ -0,0 +1,287 @@
+from __future__ import annotations
+
+import asyncio
+import inspect
+import multiprocessing
+import pickle
+import signal
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Sequence, Tuple, Union
+
+from . import extract as _extract
+from .extract import ExtractConfig, ExtractResult, ParsedMessage, SourceParser, extract_entries
+
+# 队列满时的处理方式
+# - drop_oldest：丢掉最早排队的消息，收下新的（二维码有时效，新消息更有价值）
+# - drop_newest：丢掉新来的消息
+# - block：on_message 等待队列有空位（会反压 Discord 事件处理，不建议）
+OVERFLOW_POLICIES = ("drop_oldest", "drop_newest", "block")
+
+BatchHandler = Callable[[List[Any]], Union[None, Awaitable[None]]]
+
+
+class IngestQueue:
+    """
+    Discord 消息与 Store 之间的有界入队队列（事件循环内使用，不是线程安全的）：
+    - on_message 只调用 put()：入队后立即返回，不在网关回调里做解析 / 写入
+    - 消费协程一次取出最多 batch_size 条交给 handler（解析 + 按分组归并 + 每个分组提交一次），
+      批与批之间让出事件循环，突发大量消息时网关心跳照常处理
+    - 队列最多 max_size 条，满了按 overflow 处理（见 OVERFLOW_POLICIES）
+    - stats()：当前深度 / 最大深度 / 入队 / 丢弃 / 处理 / 失败 / 批次数等
+    """
+
+    def __init__(
+        self,
+        handler: BatchHandler,
+        *,
+        max_size: int = 5000,
+        batch_size: int = 100,
+        overflow: str = "drop_oldest",
+        name: str = "ingest",
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"bad overflow policy: {overflow}")
+        self.handler = handler
+        self.max_size = max(1, int(max_size))
+        self.batch_size = max(1, int(batch_size))
+        self.overflow = overflow
+        self.name = name
+        self._q: Deque[Any] = deque()
+        self._ready = asyncio.Event()
+        self._space = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+        self.enqueued = 0
+        self.dropped = 0
+        self.processed = 0
+        self.failed = 0
+        self.batches = 0
+        self.max_depth = 0
+        self.last_batch_size = 0
+        self.last_batch_ms = 0.0
+
+    def __len__(self) -> int:
+        return len(self._q)
+
+    def start(self) -> "asyncio.Task":
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        return self._task
+
+    async def put(self, item: Any) -> bool:
+        """
+        入队；返回 False 表示这条消息被丢弃（drop_newest 或队列已关闭）。
+        只有 overflow=block 且队列满时才会等待。
+        """
+        if self._closed:
+            self._drop(1)
+            return False
+        while len(self._q) >= self.max_size:
+            if self.overflow == "drop_newest":
+                self._drop(1)
+                return False
+            if self.overflow == "drop_oldest":
+                self._q.popleft()
+                self._drop(1)
+                continue
+            self._space.clear()
+            await self._space.wait()
+            if self._closed:
+                self._drop(1)
+                return False
+        self._q.append(item)
+        self.enqueued += 1
+        if len(self._q) > self.max_depth:
+            self.max_depth = len(self._q)
+        self._ready.set()
+        return True
+
+    def _drop(self, n: int) -> None:
+        # 第一次丢弃和之后每 1000 条打印一次，避免刷屏
+        before = self.dropped
+        self.dropped += n
+        if before == 0 or before // 1000 != self.dropped // 1000:
+            print(
+                f"[WARN] {self.name} queue dropped {self.dropped} messages "
+                f"(max_size={self.max_size}, overflow={self.overflow})"
+            )
+
+    async def _run(self) -> None:
+        while True:
+            if not self._q:
+                if self._closed:
+                    return
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            n = min(self.batch_size, len(self._q))
+            batch = [self._q.popleft() for _ in range(n)]
+            self._space.set()
+            await self._handle(batch)
+            # 批与批之间让出事件循环（网关心跳 / Web 请求）
+            await asyncio.sleep(0)
+
+    async def _handle(self, batch: List[Any]) -> None:
+        t0 = time.perf_counter()
+        try:
+            r = self.handler(batch)
+            if inspect.isawaitable(r):
+                await r
+        except Exception as e:
+            self.failed += len(batch)
+            print(f"[ERR] {self.name} batch failed ({len(batch)} messages): {e}")
+        else:
+            self.processed += len(batch)
+        self.batches += 1
+        self.last_batch_size = len(batch)
+        self.last_batch_ms = (time.perf_counter() - t0) * 1000.0
+
+    async def close(self, drain: bool = True) -> None:
+        """
+        停止接收新消息；drain=True 时等已排队的消息处理完，否则直接丢弃。
+        """
+        self._closed = True
+        self._space.set()
+        if not drain and self._q:
+            self._drop(len(self._q))
+            self._q.clear()
+        self._ready.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        elif self._q:
+            batch = list(self._q)
+            self._q.clear()
+            await self._handle(batch)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "depth": len(self._q),
+            "max_depth": int(self.max_depth),
+            "max_size": self.max_size,
+            "batch_size": self.batch_size,
+            "overflow": self.overflow,
+            "enqueued": int(self.enqueued),
+            "dropped": int(self.dropped),
+            "processed": int(self.processed),
+            "failed": int(self.failed),
+            "batches": int(self.batches),
+            "last_batch_size": int(self.last_batch_size),
+            "last_batch_ms": round(self.last_batch_ms, 3),
+        }
+
+
+# 每个子进程各自持有的提取配置（进程池 initializer 里设置一次，之后每批只传消息快照）
+_worker_cfg: Optional[ExtractConfig] = None
+_worker_kinds: Tuple[str, ...] = ()
+
+
+def _init_worker(cfg: ExtractConfig, kinds: Tuple[str, ...], parsers: List[SourceParser]) -> None:
+    global _worker_cfg, _worker_kinds
+    # Ctrl+C 由主进程处理，子进程不打印 KeyboardInterrupt
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _worker_cfg = cfg
+    _worker_kinds = kinds
+    # spawn 出来的子进程重新 import extract，只有内置解析器；换成主进程注册表的副本（含 register_parser 注册的）
+    _extract.PARSERS[:] = parsers
+
+
+def _extract_one(pm: ParsedMessage, cfg: ExtractConfig, kinds: Sequence[str]) -> Optional[Tuple[str, ExtractResult]]:
+    try:
+        found = extract_entries(pm, cfg, kinds)
+    except Exception as e:
+        print(f"[ERR] extract failed: {e}")
+        return None
+    if not found:
+        return None
+    parser, result = found
+    return parser.kind, result
+
+
+def _extract_chunk(snaps: List[Dict]) -> List[Optional[Tuple[str, ExtractResult]]]:
+    # 在子进程里运行：快照 -> ParsedMessage -> 识别 + 解析；结果与输入一一对应
+    cfg = _worker_cfg or ExtractConfig()
+    return [_extract_one(ParsedMessage.from_snapshot(s), cfg, _worker_kinds) for s in snaps]
+
+
+class ExtractWorkers:
+    """
+    一批消息的识别 + 解析，结果是 [(kind, (seat_key, seat_label, account_info, items)), ...]，顺序与消息顺序一致
+    （同一频道的消息自然也保持先后）。
+    - workers <= 0：在事件循环线程里逐条解析（默认）
+    - workers > 0：事件循环里只把消息转成快照（ParsedMessage.to_snapshot，embed.to_dict 只能在这里做），
+      按顺序切成连续的几块交给 ProcessPoolExecutor 并行解析，正则密集的解析不再和 Web 请求抢 GIL；
+      等待结果期间事件循环照常处理其他事件。进程池异常时退回本进程解析。
+    子进程用 spawn 启动（主进程里有 Store 后台线程，fork 不安全），解析器注册表（extract.PARSERS）
+    通过 initializer 传过去：register_parser 注册的解析器必须能被 pickle（模块级函数，不能是 lambda / 闭包），
+    否则打印警告并改为在本进程解析。进程池建好之后注册表有变化时会重建进程池。
+    """
+
+    # 每块至少这么多条消息，避免小批量时进程间通信开销比解析还大
+    MIN_CHUNK = 8
+
+    def __init__(self, cfg: ExtractConfig, kinds: Sequence[str], workers: int = 0):
+        self.cfg = cfg
+        self.kinds = tuple(kinds)
+        self.workers = max(0, int(workers))
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._parsers: List[SourceParser] = []
+        if self.workers:
+            self._start_pool()
+
+    def _start_pool(self) -> None:
+        parsers = list(_extract.PARSERS)
+        try:
+            pickle.dumps(parsers)
+        except Exception as e:
+            print(f"[WARN] parser registry cannot be sent to extract workers, parsing in-process: {e}")
+            self.workers = 0
+            return
+        self._parsers = parsers
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.cfg, self.kinds, parsers),
+        )
+
+    def _extract_inline(self, pms: List[ParsedMessage]) -> List[Tuple[str, ExtractResult]]:
+        out = []
+        for pm in pms:
+            found = _extract_one(pm, self.cfg, self.kinds)
+            if found:
+                out.append(found)
+        return out
+
+    async def extract_batch(self, messages: List[Any]) -> List[Tuple[str, ExtractResult]]:
+        pms: List[ParsedMessage] = []
+        for message in messages:
+            try:
+                pms.append(ParsedMessage.from_message(message))
+            except Exception as e:
+                print(f"[ERR] parse message failed: {e}")
+        if self._pool is not None and _extract.PARSERS != self._parsers:
+            print("[WARN] parser registry changed, restarting extract workers")
+            self.close()
+            self._start_pool()
+        if self._pool is None or not pms:
+            return self._extract_inline(pms)
+
+        size = max(self.MIN_CHUNK, -(-len(pms) // self.workers))
+        chunks = [[pm.to_snapshot() for pm in pms[i : i + size]] for i in range(0, len(pms), size)]
+        loop = asyncio.get_running_loop()
+        try:
+            results = await asyncio.gather(*(loop.run_in_executor(self._pool, _extract_chunk, c) for c in chunks))
+        except BrokenProcessPool as e:
+            print(f"[ERR] extract workers failed, parsing in-process from now on: {e}")
+            self.close()
+            return self._extract_inline(pms)
+        return [found for chunk in results for found in chunk if found]
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+
+class IoExecutor:
+    """
+    阻塞磁盘操作（建目录 / 删目录 / 打开 Store / 读导出文件……）的线程池，避免卡住事件循环。
+
+    - 线程数有上限（max_workers）
+    - 同一个 key（通常是 group_id）的任务严格按提交顺序串行执行：
+      例如“删除分组目录”一定在该分组之前提交的写入之后；不同 key 之间并行
+    - key=None 表示无顺序要求（只读操作）
+    - submit() 返回 concurrent.futures.Future，可以不等待（后台删除）；
+      协程里用 await run(...) 拿结果
+    """
+
+    def __init__(self, max_workers: int = 4, name: str = "io"):
+        self.max_workers = max(1, int(max_workers))
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        # key -> 等待执行的任务；key 在表里 = 该 key 已有任务在跑（后续任务排队）
+        self._chains: Dict[str, Deque[Tuple[Future, Callable[..., Any], Tuple[Any, ...]]]] = {}
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+
+    def submit(self, key: Optional[str], fn: Callable[..., Any], *args: Any) -> Future:
+        fut: Future = Future()
+        with self._lock:
+            self.submitted += 1
+            if key is not None:
+                chain = self._chains.get(key)
+                if chain is not None:
+                    chain.append((fut, fn, args))
+                    return fut
+                self._chains[key] = deque()
+        self._pool.submit(self._run_chain, key, fut, fn, args)
+        return fut
+
+    async def run(self, key: Optional[str], fn: Callable[..., Any], *args: Any) -> Any:
+        return await asyncio.wrap_future(self.submit(key, fn, *args))
+
+    def _run_chain(self, key: Optional[str], fut: Future, fn: Callable[..., Any], args: Tuple[Any, ...]) -> None:
+        # 同一 key 的后续任务在当前工作线程里接着跑，保证顺序，也不必再次提交到线程池
+        while True:
+            self._run_one(key, fut, fn, args)
+            if key is None:
+                return
+            with self._lock:
+                chain = self._chains[key]
+                if not chain:
+                    del self._chains[key]
+                    return
+                fut, fn, args = chain.popleft()
+
+    def _run_one(self, key: Optional[str], fut: Future, fn: Callable[..., Any], args: Tuple[Any, ...]) -> None:
+        if not fut.set_running_or_notify_cancel():
+            with self._lock:
+                self.completed += 1  # 已取消，按完成计
+            return
+        try:
+            result = fn(*args)
+        except BaseException as e:
+            with self._lock:
+                self.failed += 1
+            print(f"[ERR] io task failed (key={key}): {e}")
+            fut.set_exception(e)
+        else:
+            with self._lock:
+                self.completed += 1
+            fut.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "submitted": int(self.submitted),
+                "completed": int(self.completed),
+                "failed": int(self.failed),
+                "pending": int(self.submitted - self.completed - self.failed),
+                "busy_keys": len(self._chains),
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        进程退出时调用：wait=True 会等已提交的任务（包括排队中的同 key 任务）全部完成。
+        """
+        self._pool.shutdown(wait=wait)
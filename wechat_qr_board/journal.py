@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import json
+import os
+import time
+from collections import deque
+from typing import Any, Dict, IO, Iterator, List, Optional, Tuple
+
+
+class Journal:
+    """
+    分组目录下的持久化文件：
+    - state.json：快照（带 seq，表示快照已包含到哪一条变更）
+    - journal.jsonl：快照之后的变更，每行一条 {"seq", "op", ...}
+    - history.jsonl：已扫条目的归档（内存里每个座位只保留最近几个），只追加
+
+    恢复 = 读快照 + 重放 seq 大于快照 seq 的 journal 行。
+    写入由 Store 串行调用（Store._write_lock），本类本身不加锁。
+    """
+
+    # compact 需要 Store 传入完整的座位快照
+    needs_snapshot = True
+
+    def __init__(self, data_dir: str):
+        self.data_dir = data_dir
+        self.state_path = os.path.join(self.data_dir, "state.json")
+        self.journal_path = os.path.join(self.data_dir, "journal.jsonl")
+        self.history_path = os.path.join(self.data_dir, "history.jsonl")
+        self._fh: Optional[IO[str]] = None
+        self.entries = 0  # journal 中的行数（上次压缩之后）
+        self.snapshot_seq = 0
+        self.snapshot_at = 0.0
+
+    def load(self) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        返回：(快照 payload 或 None, 需要重放的变更列表)
+        """
+        snapshot: Optional[Dict[str, Any]] = None
+        if os.path.exists(self.state_path):
+            try:
+                with open(self.state_path, "r", encoding="utf-8") as f:
+                    snapshot = json.load(f)
+            except Exception as e:
+                print(f"[WARN] state.json 读取失败，忽略快照：{e}")
+                snapshot = None
+        snap_seq = int((snapshot or {}).get("seq") or 0)
+        self.snapshot_seq = snap_seq
+        self.snapshot_at = float((snapshot or {}).get("updated_at") or 0.0)
+
+        ops: List[Dict[str, Any]] = []
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        op = json.loads(line)
+                    except Exception:
+                        # 崩溃时最后一行可能只写了一半
+                        continue
+                    self.entries += 1
+                    if isinstance(op, dict) and int(op.get("seq") or 0) > snap_seq:
+                        ops.append(op)
+        return snapshot, ops
+
+    def load_seen_keys(self, since: float) -> List[Tuple[str, str, str, float, str]]:
+        """
+        快照里的条目由 Store 自己重建；这里补上已归档（history.jsonl）且仍在去重窗口内（expires_at >= since）的已扫条目。
+        """
+        out: List[Tuple[str, str, str, float, str]] = []
+        if not os.path.exists(self.history_path):
+            return out
+        with open(self.history_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                    expires_at = float(rec.get("expires_at") or 0.0)
+                except Exception:
+                    continue
+                if expires_at >= since:
+                    seat_key = str(rec.get("seat_key") or "")
+                    link = str(rec.get("message_link") or "")
+                    out.append((seat_key, str(rec.get("qr_url") or ""), link, expires_at, "scanned"))
+        return out
+
+    def _open(self) -> IO[str]:
+        if self._fh is None:
+            self._fh = open(self.journal_path, "a", encoding="utf-8")
+        return self._fh
+
+    def append(self, ops: List[Dict[str, Any]]) -> None:
+        if not ops:
+            return
+        fh = self._open()
+        fh.write("".join(json.dumps(op, ensure_ascii=False, separators=(",", ":")) + "\n" for op in ops))
+        fh.flush()
+        self.entries += len(ops)
+
+    def archive(self, records: List[Dict[str, Any]]) -> None:
+        """
+        追加已扫条目归档（{"seat_key", "seat_label", ...qr_item_to_record}）。
+        Store 保证在写对应 journal 之前调用，所以重放 journal 时无需再次归档。
+        """
+        if not records:
+            return
+        with open(self.history_path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(r, ensure_ascii=False, separators=(",", ":")) + "\n" for r in records))
+
+    def iter_history(self, seat_key: str, limit: int) -> Iterator[Dict[str, Any]]:
+        """
+        读回某座位最近 limit 条归档记录（旧 → 新）。按需顺序扫描整个文件，只保留末尾 limit 条。
+        """
+        if limit <= 0 or not os.path.exists(self.history_path):
+            return iter(())
+        # 先用子串粗筛，避免每行都 json 解析
+        needle = json.dumps(seat_key, ensure_ascii=False)
+        tail: deque = deque(maxlen=limit)
+        with open(self.history_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if needle not in line:
+                    continue
+                try:
+                    rec = json.loads(line)
+                except Exception:
+                    continue
+                if isinstance(rec, dict) and rec.get("seat_key") == seat_key:
+                    tail.append(rec)
+        return iter(tail)
+
+    def compact(self, seats: Dict[str, Dict[str, Any]], seq: int) -> None:
+        """
+        写快照并清空 journal。调用方需保证 journal 里只有 seq <= 该 seq 的变更；
+        若在替换快照后、清空 journal 前崩溃，重放时会按 seq 跳过，不会重复应用。
+        """
+        payload = {"updated_at": time.time(), "seq": int(seq), "seats": seats}
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, self.state_path)
+        fh = self._open()
+        fh.seek(0)
+        fh.truncate()
+        self.entries = 0
+        self.snapshot_seq = int(seq)
+        self.snapshot_at = payload["updated_at"]
+
+    def close(self) -> None:
+        if self._fh is not None:
+            try:
+                self._fh.close()
+            finally:
+                self._fh = None
@@ -10,7 +10,7 @@ import discord
 from aiohttp import web
 
 from .config import default_config_path, load_config
-from .extract import choose_seat_key, extract_wechat_qr_entries
+from .ingest import ExtractWorkers, IngestQueue
 from .store import Store
 from .web import create_app
 
@@ -74,9 +74,33 @@ async def main_async() -> None:
         raise RuntimeError("discord.source_channel_ids 为空：请在 config.json 里填写要监听的频道ID列表")
 
     data_dir = os.path.join(here, "data")
-    store = Store(data_dir=data_dir)
+    store = Store(
+        data_dir=data_dir,
+        flush_interval=cfg.storage.flush_interval_seconds,
+        flush_max_pending=cfg.storage.flush_max_pending,
+        compact_every=cfg.storage.compact_every,
+        backend=cfg.storage.backend,
+        dedupe_window=cfg.storage.dedupe_window_seconds,
+        dedupe_capacity=cfg.storage.dedupe_capacity,
+    )
     store.preload_seats(cfg.seats or [])
 
+    extractor = ExtractWorkers(cfg.extract, ("wechat",), cfg.ingest.parse_workers)
+
+    async def ingest_batch(messages) -> None:
+        # 一批消息解析完（可能在子进程里），按原顺序一次性提交（只拿一次锁、只通知 / 唤醒写盘一次）
+        found = await extractor.extract_batch(messages)
+        if found:
+            store.add_batch([entry for _, entry in found])
+
+    ingest = IngestQueue(
+        ingest_batch,
+        max_size=cfg.ingest.max_queue,
+        batch_size=cfg.ingest.batch_size,
+        overflow=cfg.ingest.overflow,
+    )
+    ingest.start()
+
     intents = _build_intents()
     client = discord.Client(intents=intents)
 
@@ -88,33 +112,25 @@ async def main_async() -> None:
 
     @client.event
     async def on_message(message):
-        try:
-            ch = getattr(message, "channel", None)
-            ch_id = getattr(ch, "id", None)
-            if ch_id not in cfg.discord.source_channel_ids:
-                return
-
-            result = extract_wechat_qr_entries(
-                message,
-                keywords=cfg.keywords,
-                seat_field_name_patterns=cfg.seat_field_name_patterns,
-                account_field_name_patterns=cfg.account_field_name_patterns,
-                countdown_seconds=cfg.countdown_seconds,
-            )
-            if not result:
-                return
-            seat_key, seat_label, account_info, items = result
-            store.add_items(seat_key=seat_key, seat_label=seat_label, account_info=account_info, items=items)
-        except Exception as e:
-            print(f"[ERR] on_message failed: {e}")
-
-    app = create_app(store)
+        ch = getattr(message, "channel", None)
+        ch_id = getattr(ch, "id", None)
+        if ch_id not in cfg.discord.source_channel_ids:
+            return
+        # 网关回调里只入队，解析和写入由 ingest 消费协程按批完成
+        await ingest.put(message)
+
+    app = create_app(store, ingest=ingest)
     runner = await _start_web(app, cfg.web.host, cfg.web.port)
 
     try:
         await _call_discord_start(client, cfg.discord.token, cfg.discord.use_user_token)
     finally:
+        # 先处理完已排队的消息再关 Web / Store
+        await ingest.close()
+        extractor.close()
         await runner.cleanup()
+        # 强制最后一次落盘（write-behind 可能还有未写入的变更）
+        store.close()
 
 
 def main() -> None:
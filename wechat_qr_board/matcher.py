@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import re
+from typing import Dict, FrozenSet, Iterable, Optional, Sequence, Tuple, Union
+
+
+class KeywordMatcher:
+    """
+    预编译的多模式子串匹配（不区分大小写），由配置加载时构造一次：
+    所有模式合成一个交替正则（长的在前），每条消息只扫描一遍，不再逐个模式 `p in text`。
+    - search(text)：任一模式出现
+    - match_all(text)：所有模式都出现（没有模式时为 True，与旧的 match_all_keywords 一致）
+    传入的 text 需已小写（haystack / 字段名都是小写的）。
+
+    模式的处理与逐个 `in` 比较时完全一致：
+    - 只转小写；strip=True 时再去掉首尾空白（字段名模式，旧的 _normalize_field），否则空格算在模式里（关键词）
+    - None / 空串忽略；处理后为空的模式（例如 strip 后的纯空白）匹配任何文本
+    """
+
+    __slots__ = ("patterns", "match_empty", "_re", "_all_re", "_implied")
+
+    def __init__(self, patterns: Iterable[str], *, strip: bool = False):
+        norm = ((p.strip() if strip else p).lower() for p in patterns if p)
+        pats = tuple(dict.fromkeys(norm))
+        # 空模式是任何文本的子串：search 恒为 True，match_all 里恒满足
+        self.match_empty = "" in pats
+        self.patterns: Tuple[str, ...] = tuple(p for p in pats if p)
+        self._re: Optional["re.Pattern[str]"] = None
+        self._all_re: Optional["re.Pattern[str]"] = None
+        self._implied: Dict[str, FrozenSet[str]] = {}
+        if not self.patterns:
+            return
+        alt = "|".join(re.escape(p) for p in sorted(self.patterns, key=len, reverse=True))
+        self._re = re.compile(alt)
+        # match_all 用零宽前瞻在每个位置取最长的命中；短模式是长模式子串时由 _implied 补上
+        self._all_re = re.compile(f"(?=({alt}))")
+        self._implied = {p: frozenset(q for q in self.patterns if q in p) for p in self.patterns}
+
+    def __bool__(self) -> bool:
+        return bool(self.patterns) or self.match_empty
+
+    def __repr__(self) -> str:
+        return f"KeywordMatcher({list(self.patterns) + ([''] if self.match_empty else [])!r})"
+
+    def search(self, text: str) -> bool:
+        if self.match_empty:
+            return True
+        return self._re is not None and self._re.search(text) is not None
+
+    def match_all(self, text: str) -> bool:
+        if self._all_re is None:
+            return True
+        need = len(self.patterns)
+        found: set = set()
+        for m in self._all_re.finditer(text):
+            found |= self._implied[m.group(1)]
+            if len(found) == need:
+                return True
+        return False
+
+
+def as_matcher(patterns: Union[KeywordMatcher, Sequence[str], None], *, strip: bool = False) -> KeywordMatcher:
+    """
+    兼容旧调用：传入的是模式列表时现场编译（热路径请传配置里预编译好的 KeywordMatcher）。
+    strip 见 KeywordMatcher；已编译的 KeywordMatcher 原样返回。
+    """
+    if isinstance(patterns, KeywordMatcher):
+        return patterns
+    return KeywordMatcher(patterns or (), strip=strip)
@@ -1,26 +1,122 @@
 from __future__ import annotations
 
+import json
+import sys
+from collections import deque
 from dataclasses import dataclass, field
-from typing import Any, Dict, List, Optional
+from typing import Any, Deque, Dict, Iterator, List, Mapping, Optional, Tuple
 
 
-@dataclass
+# 每个座位在内存里保留的已扫 / 过期条目数；更早的已扫条目写入历史归档，过期条目见扫码记录
+SCANNED_KEEP = 20
+EXPIRED_KEEP = 20
+
+# 扫码记录（CSV / scan_log 表）的“状态”列
+SCAN_STATUS_SCANNED = "已扫码"
+SCAN_STATUS_EXPIRED = "已过期"
+
+
+# Python 3.10+ 才支持 dataclass(slots=True)；更老的版本退回普通 dataclass（功能一样，只是占用大些）
+_SLOTS: Dict[str, Any] = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+
+def intern_str(v: Any) -> Any:
+    """
+    重复出现的短字符串（座位名、来源、日期、价格……）统一成同一个对象。
+    """
+    return sys.intern(v) if type(v) is str else v
+
+
+class Meta:
+    """
+    条目 meta 的紧凑形式：同一组 key 的元组全局共享，每个条目只存一个值元组。
+    对外提供 dict 风格的只读访问；落盘 / 接口输出用 to_dict()。
+    """
+
+    __slots__ = ("keys", "values")
+
+    # key 集合 -> 共享的 key 元组（来源固定几种，条目再多也只有几份）
+    _shapes: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+
+    def __init__(self, keys: Tuple[str, ...], values: Tuple[Any, ...]):
+        self.keys = keys
+        self.values = values
+
+    @classmethod
+    def from_dict(cls, d: Optional[Dict[str, Any]]) -> "Meta":
+        if not d:
+            return EMPTY_META
+        keys = tuple(intern_str(str(k)) for k in d)
+        keys = cls._shapes.setdefault(keys, keys)
+        return cls(keys, tuple(intern_str(v) for v in d.values()))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(zip(self.keys, self.values))
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self.values[self.keys.index(key)]
+        except ValueError:
+            return default
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, Meta):
+            return self.keys == other.keys and self.values == other.values
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"Meta({self.to_dict()!r})"
+
+
+EMPTY_META = Meta((), ())
+
+
+@dataclass(**_SLOTS)
 class QrItem:
     qr_url: str
     message_link: str
     captured_at: float  # epoch seconds
     expires_at: float  # epoch seconds
     scanned_at: Optional[float] = None
-    meta: Dict[str, Any] = field(default_factory=dict)
+    # 传入 dict 即可，构造时转成紧凑的 Meta
+    meta: Meta = field(default_factory=lambda: EMPTY_META)
 
+    def __post_init__(self) -> None:
+        self.message_link = intern_str(self.message_link)
+        if not isinstance(self.meta, Meta):
+            self.meta = Meta.from_dict(self.meta)
 
-@dataclass
+
+@dataclass(**_SLOTS)
 class SeatState:
     seat_key: str
     seat_label: str
     account_info: str = ""
-    pending: List[QrItem] = field(default_factory=list)
-    scanned: List[QrItem] = field(default_factory=list)
+    # 待扫队列：队首是当前二维码，扫码 / 过期都从队首出队
+    pending: Deque[QrItem] = field(default_factory=deque)
+    # 最近 SCANNED_KEEP 个已扫条目（环形），总数记在 scanned_count；溢出部分由 Store 归档
+    scanned: Deque[QrItem] = field(default_factory=deque)
+    scanned_count: int = 0
+    # 未扫就已过期的条目：只保留最近 EXPIRED_KEEP 个，总数记在 expired_count
+    expired: Deque[QrItem] = field(default_factory=lambda: deque(maxlen=EXPIRED_KEEP))
+    expired_count: int = 0
+    # seat_state_to_json 的缓存；座位任何变化都要调用 touch() 作废
+    _json: Optional[bytes] = field(default=None, init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self.seat_key = intern_str(self.seat_key)
+        self.seat_label = intern_str(self.seat_label)
+
+    def touch(self) -> None:
+        self._json = None
 
     def current(self) -> Optional[QrItem]:
         return self.pending[0] if self.pending else None
@@ -31,7 +127,7 @@ class SeatState:
     def status(self) -> str:
         if self.pending:
             return "pending"
-        if self.scanned:
+        if self.scanned_count:
             return "scanned"
         return "empty"
 
@@ -44,7 +140,8 @@ def seat_state_to_dict(seat: SeatState) -> Dict:
         "seat_label": seat.seat_label,
         "account_info": seat.account_info,
         "pending_count": len(seat.pending),
-        "scanned_count": len(seat.scanned),
+        "scanned_count": seat.scanned_count,
+        "expired_count": seat.expired_count,
         "status": seat.status(),
         "current": None
         if not cur
@@ -53,7 +150,7 @@ def seat_state_to_dict(seat: SeatState) -> Dict:
             "message_link": cur.message_link,
             "captured_at": cur.captured_at,
             "expires_at": cur.expires_at,
-            "meta": cur.meta or {},
+            "meta": cur.meta.to_dict(),
         },
         "last_scanned": None
         if not last
@@ -62,9 +159,139 @@ def seat_state_to_dict(seat: SeatState) -> Dict:
             "message_link": last.message_link,
             "captured_at": last.captured_at,
             "scanned_at": last.scanned_at,
-            "meta": last.meta or {},
+            "meta": last.meta.to_dict(),
         },
     }
 
 
+def seat_state_to_json(seat: SeatState) -> bytes:
+    """
+    seat_state_to_dict 的 JSON 编码（UTF-8 字节），按座位缓存：
+    座位不变时轮询直接复用，列表接口只需拼接各座位片段。
+    """
+    if seat._json is None:
+        seat._json = json.dumps(seat_state_to_dict(seat), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return seat._json
+
+
+# 座位列表分页接口可用的 status 筛选值：前三个同 SeatState.status()，expired = 有过期条目的座位
+SEAT_FILTER_STATUSES = ("pending", "scanned", "empty", "expired")
+
+
+def seat_source(seat: SeatState) -> str:
+    """
+    座位的来源（meta.source）：取当前条目，没有则取最近已扫 / 最近过期的条目。
+    """
+    item = seat.current() or seat.last_scanned() or (seat.expired[-1] if seat.expired else None)
+    return str(item.meta.get("source") or "") if item else ""
+
+
+@dataclass
+class SeatFilter:
+    """
+    座位列表分页的筛选条件（空 = 不限）：
+    - status：见 SEAT_FILTER_STATUSES
+    - source：座位来源（见 seat_source），不区分大小写
+    - date：日期 key，匹配 seat_label 开头（如 20260213）
+    - q：seat_label 或 account_info 中的子串，不区分大小写
+    """
+
+    status: str = ""
+    source: str = ""
+    date: str = ""
+    q: str = ""
+
+    @classmethod
+    def from_query(cls, query: Mapping[str, str]) -> "SeatFilter":
+        """
+        从 URL 参数构造：status / source / date / q。status 不认识时抛 ValueError。
+        """
+        status = str(query.get("status") or "").strip().lower()
+        if status and status not in SEAT_FILTER_STATUSES:
+            raise ValueError(f"bad status: {status}")
+        return cls(
+            status=status,
+            source=str(query.get("source") or "").strip().lower(),
+            date=str(query.get("date") or "").strip(),
+            q=str(query.get("q") or "").strip().lower(),
+        )
+
+    def match(self, seat: SeatState) -> bool:
+        if self.status == "expired":
+            if not seat.expired_count:
+                return False
+        elif self.status and seat.status() != self.status:
+            return False
+        if self.date and not seat.seat_label.startswith(self.date):
+            return False
+        if self.source and seat_source(seat).lower() != self.source:
+            return False
+        if self.q and self.q not in seat.seat_label.lower() and self.q not in seat.account_info.lower():
+            return False
+        return True
+
+
+def qr_item_to_record(item: QrItem) -> Dict:
+    """
+    完整落盘格式（快照 / journal 用），与 UI 用的 seat_state_to_dict 区分开。
+    """
+    return {
+        "qr_url": item.qr_url,
+        "message_link": item.message_link,
+        "captured_at": item.captured_at,
+        "expires_at": item.expires_at,
+        "scanned_at": item.scanned_at,
+        "meta": item.meta.to_dict(),
+    }
+
+
+def qr_item_from_record(d: Dict) -> QrItem:
+    return QrItem(
+        qr_url=str(d.get("qr_url") or ""),
+        message_link=str(d.get("message_link") or ""),
+        captured_at=float(d.get("captured_at") or 0.0),
+        expires_at=float(d.get("expires_at") or 0.0),
+        scanned_at=None if d.get("scanned_at") is None else float(d["scanned_at"]),
+        meta=d.get("meta") or {},
+    )
+
+
+def seat_state_to_record(seat: SeatState) -> Dict:
+    return {
+        "seat_key": seat.seat_key,
+        "seat_label": seat.seat_label,
+        "account_info": seat.account_info,
+        "pending": [qr_item_to_record(it) for it in seat.pending],
+        "scanned": [qr_item_to_record(it) for it in seat.scanned],
+        "scanned_count": seat.scanned_count,
+        "expired": [qr_item_to_record(it) for it in seat.expired],
+        "expired_count": seat.expired_count,
+    }
+
 
+def seat_state_from_record(d: Dict) -> SeatState:
+    """
+    兼容旧版 state.json（只有 UI 字段 current / last_scanned，没有完整列表）：
+    尽量恢复出当前二维码与最后一次扫描记录。
+    """
+    seat_key = str(d.get("seat_key") or "")
+    seat = SeatState(
+        seat_key=seat_key,
+        seat_label=str(d.get("seat_label") or seat_key),
+        account_info=str(d.get("account_info") or ""),
+    )
+    if "pending" in d or "scanned" in d:
+        seat.pending = deque(qr_item_from_record(x) for x in (d.get("pending") or []) if isinstance(x, dict))
+        seat.scanned = deque(qr_item_from_record(x) for x in (d.get("scanned") or []) if isinstance(x, dict))
+        seat.scanned_count = max(len(seat.scanned), int(d.get("scanned_count") or 0))
+        seat.expired.extend(qr_item_from_record(x) for x in (d.get("expired") or []) if isinstance(x, dict))
+        seat.expired_count = max(len(seat.expired), int(d.get("expired_count") or 0))
+        return seat
+    cur = d.get("current")
+    if isinstance(cur, dict) and cur.get("qr_url"):
+        seat.pending.append(qr_item_from_record(cur))
+    last = d.get("last_scanned")
+    if isinstance(last, dict) and last.get("qr_url"):
+        seat.scanned.append(qr_item_from_record(last))
+        seat.scanned_count = 1
+    return seat
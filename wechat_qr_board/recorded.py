@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from .extract import ParsedMessage
+
+
+@dataclass
+class _RecordedEmbed:
+    data: Dict[str, Any]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return self.data
+
+
+@dataclass
+class _RecordedAttachment:
+    url: str
+
+
+@dataclass
+class _RecordedId:
+    id: Optional[int]
+
+
+class RecordedMessage:
+    """
+    录制消息的假 discord message：只提供提取用到的属性
+    （content / embeds[].to_dict() / attachments[].url / guild.id / channel.id / id），
+    不需要 Discord 会话就能走 ParsedMessage.from_message 和各个提取函数。
+
+    快照格式同 ParsedMessage.to_snapshot；录制文件是 JSONL，每行一条快照，
+    可以多一个 "case" 字段（spider / xbot / eximbay / kakao / nomatch……）用于基准分组，提取时忽略。
+    """
+
+    __slots__ = ("content", "embeds", "attachments", "guild", "channel", "id", "case")
+
+    def __init__(self, snap: Dict[str, Any]):
+        pm = ParsedMessage.from_snapshot(snap)
+        self.content = pm.content
+        self.embeds = [_RecordedEmbed(e) for e in pm.embeds]
+        self.attachments = [_RecordedAttachment(u) for u in pm.attachment_urls]
+        self.guild = _RecordedId(pm.guild_id) if pm.guild_id is not None else None
+        self.channel = _RecordedId(pm.channel_id) if pm.channel_id is not None else None
+        self.id = pm.message_id
+        self.case = str(snap.get("case") or "")
+
+
+def record_message(message, case: str = "") -> Dict[str, Any]:
+    """
+    把一条真实的 discord message 转成快照（可写入录制文件）。
+    """
+    snap = ParsedMessage.from_message(message).to_snapshot()
+    if case:
+        snap["case"] = case
+    return snap
+
+
+def iter_recorded(path: str) -> Iterator[RecordedMessage]:
+    """
+    逐行读取录制文件；空行和 # 开头的行跳过，坏行打印警告后跳过。
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                snap = json.loads(line)
+            except ValueError as e:
+                print(f"[WARN] bad recorded message {path}:{lineno}: {e}")
+                continue
+            if isinstance(snap, dict):
+                yield RecordedMessage(snap)
+
+
+def load_recorded(path: str) -> List[RecordedMessage]:
+    return list(iter_recorded(path))
+
+
+def save_recorded(path: str, snaps: Iterable[Dict[str, Any]]) -> int:
+    """
+    写录制文件（覆盖），返回写入条数。
+    """
+    n = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for snap in snaps:
+            f.write(json.dumps(snap, ensure_ascii=False) + "\n")
+            n += 1
+    return n
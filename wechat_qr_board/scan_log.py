@@ -0,0 +1,270 @@
+from __future__ import annotations
+
+import csv
+import io
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import IO, Any, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence
+
+TIME_FMT = "%Y-%m-%d %H:%M:%S"
+
+
+class ScanLogWriter:
+    """
+    scan_log.csv 的常驻写入器（每个 Store 一个）：
+    - 文件句柄一直打开，行先写进缓冲区，不再每次点击都 exists / open / close
+    - 写入方（事件循环）只写缓冲，不做磁盘 I/O；由 Store 后台线程调用 maybe_flush：
+      累计 flush_rows 行，或最早一行未 fsync 超过 flush_interval 秒时 flush + fsync
+    - flush_interval <= 0：每次写入立即落到操作系统（与旧行为一致）
+    - close() 时 flush + fsync
+    - 已有文件的表头与 header 不同（旧版本的列）时，打开前先把旧文件改名为 <名字>.v1.csv 留档，
+      再按新表头重写一份：旧表头是新表头的前几列时，旧记录缺的列用 defaults 里对应位置的值补齐；
+      否则新文件只有表头
+    写入可能来自事件循环线程与 Store 后台线程，内部自带锁。
+    """
+
+    def __init__(
+        self,
+        path: str,
+        header: Sequence[str],
+        *,
+        flush_rows: int = 50,
+        flush_interval: float = 1.0,
+        defaults: Sequence[str] = (),
+    ):
+        self.path = path
+        self.header = list(header)
+        self.defaults = list(defaults) + [""] * (len(self.header) - len(defaults))
+        self.flush_rows = max(1, int(flush_rows))
+        self.flush_interval = float(flush_interval)
+        self._lock = threading.Lock()
+        self._fh: Optional[IO[str]] = None
+        self._writer = None
+        self._buffered = 0  # 已写入缓冲、尚未 flush 到操作系统的行数
+        self._unsynced = 0  # 已 flush、尚未 fsync 的行数（含缓冲中的）
+        self._first_unsynced_at = 0.0
+        self.rows_written = 0
+        self.fsync_count = 0
+
+    def _open_locked(self) -> None:
+        if self._fh is not None:
+            return
+        file_exists = os.path.exists(self.path) and os.path.getsize(self.path) > 0
+        if file_exists:
+            self._migrate_locked()
+        # 追加模式下 utf-8-sig 只在文件开头写 BOM
+        self._fh = open(self.path, "a", newline="", encoding="utf-8-sig")
+        self._writer = csv.writer(self._fh)
+        if not file_exists:
+            self._writer.writerow(self.header)
+            self._fh.flush()
+
+    def _migrate_locked(self) -> None:
+        with open(self.path, "r", newline="", encoding="utf-8-sig") as f:
+            old = next(csv.reader(f), [])
+        if old == self.header:
+            return
+        root, ext = os.path.splitext(self.path)
+        backup = f"{root}.v1{ext}"
+        n = 1
+        while os.path.exists(backup):
+            n += 1
+            backup = f"{root}.v1-{n}{ext}"
+        os.rename(self.path, backup)
+        width = len(self.header)
+        known = 0 < len(old) <= width and old == self.header[: len(old)]
+        tmp = self.path + ".tmp"
+        rows = 0
+        with open(tmp, "w", newline="", encoding="utf-8-sig") as out:
+            w = csv.writer(out)
+            w.writerow(self.header)
+            if known:
+                with open(backup, "r", newline="", encoding="utf-8-sig") as f:
+                    r = csv.reader(f)
+                    next(r, None)
+                    for row in r:
+                        if row:
+                            w.writerow((row + self.defaults[len(row) :])[:width])
+                            rows += 1
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp, self.path)
+        if known:
+            print(f"[OK] scan log {self.path}: migrated {rows} rows to the new columns (old file kept as {backup})")
+        else:
+            print(f"[WARN] scan log {self.path} has unknown columns {old}, moved to {backup} and started a new file")
+
+    def ensure_exists(self) -> None:
+        """
+        文件不存在时创建（只有表头），让“下载CSV”在没有扫码记录时也能下载。
+        """
+        with self._lock:
+            if self._fh is not None and os.path.exists(self.path):
+                return
+            self._close_locked()
+            self._open_locked()
+
+    def write_rows(self, rows: List[Sequence[str]]) -> bool:
+        """
+        写入缓冲；返回 True 表示已累计 flush_rows 行，调用方应唤醒后台线程尽快 flush。
+        """
+        if not rows:
+            return False
+        with self._lock:
+            self._open_locked()
+            self._writer.writerows(rows)
+            if not self._unsynced:
+                self._first_unsynced_at = time.time()
+            self._buffered += len(rows)
+            self._unsynced += len(rows)
+            self.rows_written += len(rows)
+            if self.flush_interval <= 0:
+                self._fh.flush()
+                self._buffered = 0
+            return self._buffered >= self.flush_rows
+
+    def flush(self, *, fsync: bool = False) -> None:
+        """
+        把缓冲写到操作系统；fsync=True 时再确保落盘。读文件（导出 CSV）前至少要 flush。
+        """
+        with self._lock:
+            self._flush_locked(fsync)
+
+    def _flush_locked(self, fsync: bool) -> None:
+        if self._fh is None:
+            return
+        if self._buffered:
+            self._fh.flush()
+            self._buffered = 0
+        if fsync and self._unsynced:
+            os.fsync(self._fh.fileno())
+            self._unsynced = 0
+            self.fsync_count += 1
+
+    def maybe_flush(self, now: Optional[float] = None) -> None:
+        """
+        后台线程定期调用：缓冲达到 flush_rows 行，或最早一行未 fsync 的记录超过 flush_interval 秒时 flush + fsync。
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            if not self._unsynced:
+                return
+            if self._buffered >= self.flush_rows or now - self._first_unsynced_at >= max(0.0, self.flush_interval):
+                self._flush_locked(True)
+
+    def _close_locked(self) -> None:
+        if self._fh is None:
+            return
+        try:
+            self._flush_locked(True)
+        finally:
+            self._fh.close()
+            self._fh = None
+            self._writer = None
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_locked()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "rows_written": int(self.rows_written),
+                "buffered_rows": int(self._buffered),
+                "unsynced_rows": int(self._unsynced),
+                "fsync_count": int(self.fsync_count),
+            }
+
+
+def _parse_time_bound(v: str, *, end: bool) -> str:
+    """
+    导出时间范围的边界 -> 与扫码记录相同格式的本地时间字符串（可直接按字符串比较）。
+    支持：epoch 秒、YYYY-MM-DD、YYYY-MM-DD HH:MM、YYYY-MM-DD HH:MM:SS（也接受 T 分隔）。
+    只给日期时，结束边界取次日 0 点（即包含当天）。
+    """
+    v = v.strip().replace("T", " ")
+    try:
+        return time.strftime(TIME_FMT, time.localtime(float(v)))
+    except ValueError:
+        pass
+    for fmt in (TIME_FMT, "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            t = time.strptime(v, fmt)
+        except ValueError:
+            continue
+        ts = time.mktime(t)
+        if fmt == "%Y-%m-%d" and end:
+            ts = time.mktime((t.tm_year, t.tm_mon, t.tm_mday + 1, 0, 0, 0, 0, 0, -1))
+        return time.strftime(TIME_FMT, time.localtime(ts))
+    raise ValueError(f"bad time: {v}")
+
+
+@dataclass
+class ScanLogFilter:
+    """
+    扫码记录导出的筛选条件（空 = 不限）：
+    - start / end：时间范围 [start, end)，格式同记录里的时间列
+    - seat：位置（seat_label）完全匹配
+    - source：来源（meta.source，如 xbot / spider），不区分大小写
+    """
+
+    start: str = ""
+    end: str = ""
+    seat: str = ""
+    source: str = ""
+
+    @classmethod
+    def from_query(cls, query: Mapping[str, str]) -> "ScanLogFilter":
+        """
+        从 URL 参数构造：from / to / seat / source。格式不对抛 ValueError。
+        """
+        start = str(query.get("from") or "").strip()
+        end = str(query.get("to") or "").strip()
+        return cls(
+            start=_parse_time_bound(start, end=False) if start else "",
+            end=_parse_time_bound(end, end=True) if end else "",
+            seat=str(query.get("seat") or "").strip(),
+            source=str(query.get("source") or "").strip().lower(),
+        )
+
+    def start_ts(self) -> Optional[float]:
+        return time.mktime(time.strptime(self.start, TIME_FMT)) if self.start else None
+
+    def end_ts(self) -> Optional[float]:
+        return time.mktime(time.strptime(self.end, TIME_FMT)) if self.end else None
+
+    def match(self, row: Sequence[str]) -> bool:
+        # row: (时间, 位置, 消息链接, 状态, 来源)
+        if self.start and row[0] < self.start:
+            return False
+        if self.end and row[0] >= self.end:
+            return False
+        if self.seat and row[1] != self.seat:
+            return False
+        if self.source and (row[4] if len(row) > 4 else "").lower() != self.source:
+            return False
+        return True
+
+
+def csv_chunks(header: Sequence[str], rows: Iterable[Sequence[str]], rows_per_chunk: int = 500) -> Iterator[bytes]:
+    """
+    按块产出 CSV 字节（utf-8-sig：第一块含 BOM + 表头），用于流式下载。
+    """
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(header)
+    n = 0
+    first = True
+    for row in rows:
+        w.writerow(row)
+        n += 1
+        if n >= rows_per_chunk:
+            yield buf.getvalue().encode("utf-8-sig" if first else "utf-8")
+            first = False
+            buf.seek(0)
+            buf.truncate()
+            n = 0
+    if first or buf.tell():
+        yield buf.getvalue().encode("utf-8-sig" if first else "utf-8")
@@ -0,0 +1,292 @@
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .models import EXPIRED_KEEP, SCANNED_KEEP, SCAN_STATUS_EXPIRED, SCAN_STATUS_SCANNED
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    k TEXT PRIMARY KEY,
+    v TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS seats (
+    seat_key TEXT PRIMARY KEY,
+    seat_label TEXT NOT NULL,
+    account_info TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    seat_key TEXT NOT NULL,
+    qr_url TEXT NOT NULL,
+    message_link TEXT NOT NULL,
+    captured_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    scanned_at REAL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    meta TEXT NOT NULL DEFAULT '{}'
+);
+CREATE UNIQUE INDEX IF NOT EXISTS items_identity ON items (seat_key, qr_url, message_link);
+CREATE INDEX IF NOT EXISTS items_seat_status ON items (seat_key, status, id);
+CREATE INDEX IF NOT EXISTS items_expires ON items (expires_at);
+CREATE TABLE IF NOT EXISTS scan_log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    scanned_at REAL NOT NULL,
+    seat_key TEXT NOT NULL,
+    seat_label TEXT NOT NULL,
+    message_link TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'scanned',
+    source TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS scan_log_time ON scan_log (scanned_at);
+"""
+
+
+class SqliteBackend:
+    """
+    SQLite（WAL）落盘：座位 / 二维码条目 / 扫码记录都在同一个文件里。
+
+    对 Store 暴露与 journal.Journal 相同的接口（load / append / compact / close）：
+    - append(ops)：一批变更在一个事务里提交（由 Store 的 write-behind 线程调用）
+    - compact：表本身就是最新状态，只需 checkpoint WAL
+    - load：按索引查询拼出与 JSON 快照相同结构的 payload，Store 恢复逻辑无需区分后端
+    扫码记录写在 scan 变更的同一事务里，代替 scan_log.csv。
+    """
+
+    # 表本身就是最新状态，compact 不需要座位快照（Store 不必在锁内构造）
+    needs_snapshot = False
+
+    def __init__(self, data_dir: str):
+        self.data_dir = data_dir
+        self.db_path = os.path.join(self.data_dir, "store.sqlite3")
+        self.state_path = self.db_path
+        self.entries = 0  # 无 journal，恒为 0：Store 不会因行数触发压缩
+        self.snapshot_seq = 0
+        self.snapshot_at = 0.0
+        self._conn = self._connect()
+        self._conn.executescript(_SCHEMA)
+        self._migrate()
+
+    def _migrate(self) -> None:
+        # 旧库的 scan_log 缺少 status（当时只记录扫码）/ source 列
+        cols = [r[1] for r in self._conn.execute("PRAGMA table_info(scan_log)")]
+        if "status" not in cols:
+            self._conn.execute("ALTER TABLE scan_log ADD COLUMN status TEXT NOT NULL DEFAULT 'scanned'")
+        if "source" not in cols:
+            self._conn.execute("ALTER TABLE scan_log ADD COLUMN source TEXT NOT NULL DEFAULT ''")
+        # 去重改用 items 表本身（唯一索引），单独的 seen_keys 表不再需要
+        self._conn.execute("DROP TABLE IF EXISTS seen_keys")
+
+    def _connect(self) -> sqlite3.Connection:
+        # 写连接只在 Store._write_lock 下使用（可能来自后台写盘线程）
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def load(self) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+        c = self._conn
+        row = c.execute("SELECT v FROM meta WHERE k = 'seq'").fetchone()
+        seq = int(row[0]) if row else 0
+        self.snapshot_seq = seq
+        seats: Dict[str, Dict[str, Any]] = {}
+        for seat_key, seat_label, account_info in c.execute("SELECT seat_key, seat_label, account_info FROM seats"):
+            seats[seat_key] = {
+                "seat_key": seat_key,
+                "seat_label": seat_label,
+                "account_info": account_info,
+                "pending": [],
+                "scanned": [],
+                "scanned_count": 0,
+                "expired": [],
+                "expired_count": 0,
+            }
+        if not seats:
+            return None, []
+        q = (
+            "SELECT qr_url, message_link, captured_at, expires_at, scanned_at, meta "
+            "FROM items WHERE seat_key = ? AND status = ? ORDER BY id"
+        )
+        # 已扫 / 过期条目只取最近 SCANNED_KEEP / EXPIRED_KEEP 个，总数单独统计
+        q_recent = (
+            "SELECT * FROM (SELECT id, qr_url, message_link, captured_at, expires_at, scanned_at, meta "
+            "FROM items WHERE seat_key = ? AND status = ? ORDER BY id DESC LIMIT ?) ORDER BY id"
+        )
+        keep = {"scanned": SCANNED_KEEP, "expired": EXPIRED_KEEP}
+        for seat_key, rec in seats.items():
+            for status in ("pending", "scanned", "expired"):
+                if status in keep:
+                    rec[f"{status}_count"] = c.execute(
+                        "SELECT COUNT(*) FROM items WHERE seat_key = ? AND status = ?", (seat_key, status)
+                    ).fetchone()[0]
+                    rows = (r[1:] for r in c.execute(q_recent, (seat_key, status, keep[status])))
+                else:
+                    rows = c.execute(q, (seat_key, status))
+                for qr_url, link, captured_at, expires_at, scanned_at, meta in rows:
+                    rec[status].append(
+                        {
+                            "qr_url": qr_url,
+                            "message_link": link,
+                            "captured_at": captured_at,
+                            "expires_at": expires_at,
+                            "scanned_at": scanned_at,
+                            "meta": json.loads(meta or "{}"),
+                        }
+                    )
+        return {"seq": seq, "seats": seats}, []
+
+    def load_seen_keys(self, since: float) -> List[Tuple[str, str, str, float, str]]:
+        """
+        去重窗口内（expires_at >= since）的条目及其状态，包括已不在内存里的历史条目。
+        """
+        q = "SELECT seat_key, qr_url, message_link, expires_at, status FROM items WHERE expires_at >= ?"
+        return [tuple(r) for r in self._conn.execute(q, (since,))]
+
+    def append(self, ops: List[Dict[str, Any]]) -> None:
+        if not ops:
+            return
+        c = self._conn
+        c.execute("BEGIN")
+        try:
+            for op in ops:
+                self._apply(c, op)
+            c.execute(
+                "INSERT INTO meta (k, v) VALUES ('seq', ?) ON CONFLICT(k) DO UPDATE SET v = excluded.v",
+                (str(int(ops[-1].get("seq") or 0)),),
+            )
+            c.execute("COMMIT")
+        except Exception:
+            c.execute("ROLLBACK")
+            raise
+        self.snapshot_seq = int(ops[-1].get("seq") or 0)
+        self.snapshot_at = time.time()
+
+    def _apply(self, c: sqlite3.Connection, op: Dict[str, Any]) -> None:
+        kind = op.get("op")
+        seat_key = str(op.get("seat_key") or "")
+        seat_label = str(op.get("seat_label") or seat_key)
+        if kind == "add":
+            it = op.get("item") or {}
+            c.execute("INSERT OR IGNORE INTO seats (seat_key, seat_label) VALUES (?, ?)", (seat_key, seat_label))
+            c.execute(
+                "INSERT OR IGNORE INTO items (seat_key, qr_url, message_link, captured_at, expires_at, meta) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    seat_key,
+                    str(it.get("qr_url") or ""),
+                    str(it.get("message_link") or ""),
+                    float(it.get("captured_at") or 0.0),
+                    float(it.get("expires_at") or 0.0),
+                    json.dumps(it.get("meta") or {}, ensure_ascii=False),
+                ),
+            )
+        elif kind == "scan":
+            scanned_at = float(op.get("scanned_at") or 0.0)
+            link = str(op.get("message_link") or "")
+            c.execute(
+                "UPDATE items SET status = 'scanned', scanned_at = ? "
+                "WHERE seat_key = ? AND qr_url = ? AND message_link = ?",
+                (scanned_at, seat_key, str(op.get("qr_url") or ""), link),
+            )
+            c.execute(
+                "INSERT INTO scan_log (scanned_at, seat_key, seat_label, message_link, source) VALUES (?, ?, ?, ?, ?)",
+                (scanned_at, seat_key, seat_label, link, str(op.get("source") or "")),
+            )
+        elif kind == "expire":
+            link = str(op.get("message_link") or "")
+            c.execute(
+                "UPDATE items SET status = 'expired' WHERE seat_key = ? AND qr_url = ? AND message_link = ?",
+                (seat_key, str(op.get("qr_url") or ""), link),
+            )
+            c.execute(
+                "INSERT INTO scan_log (scanned_at, seat_key, seat_label, message_link, status, source) "
+                "VALUES (?, ?, ?, ?, 'expired', ?)",
+                (float(op.get("expired_at") or 0.0), seat_key, seat_label, link, str(op.get("source") or "")),
+            )
+        elif kind == "account":
+            c.execute(
+                "INSERT INTO seats (seat_key, seat_label, account_info) VALUES (?, ?, ?) "
+                "ON CONFLICT(seat_key) DO UPDATE SET account_info = excluded.account_info",
+                (seat_key, seat_label, str(op.get("account_info") or "")),
+            )
+
+    def archive(self, records: List[Dict[str, Any]]) -> None:
+        # items 表本身保留全部已扫条目，内存溢出的部分无需另存
+        return
+
+    def iter_history(self, seat_key: str, limit: int) -> Iterator[Dict[str, Any]]:
+        """
+        某座位最近 limit 个已扫条目（旧 → 新），格式同 Journal.iter_history。
+        """
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        try:
+            rows = conn.execute(
+                "SELECT * FROM (SELECT i.id, i.qr_url, i.message_link, i.captured_at, i.expires_at, i.scanned_at, "
+                "i.meta, s.seat_label FROM items i JOIN seats s ON s.seat_key = i.seat_key "
+                "WHERE i.seat_key = ? AND i.status = 'scanned' ORDER BY i.id DESC LIMIT ?) ORDER BY id",
+                (seat_key, int(limit)),
+            ).fetchall()
+        finally:
+            conn.close()
+        for _, qr_url, link, captured_at, expires_at, scanned_at, meta, seat_label in rows:
+            yield {
+                "seat_key": seat_key,
+                "seat_label": seat_label,
+                "qr_url": qr_url,
+                "message_link": link,
+                "captured_at": captured_at,
+                "expires_at": expires_at,
+                "scanned_at": scanned_at,
+                "meta": json.loads(meta or "{}"),
+            }
+
+    def compact(self, seats: Dict[str, Dict[str, Any]], seq: int) -> None:
+        self._conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def iter_scan_log(
+        self,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        batch_size: int = 500,
+    ) -> Iterator[Tuple[str, str, str, str, str]]:
+        """
+        流式读取扫码记录（独立只读连接，WAL 下不阻塞写入）；since / until 按 scanned_at 过滤 [since, until)。
+        """
+        where: List[str] = []
+        args: List[float] = []
+        if since is not None:
+            where.append("scanned_at >= ?")
+            args.append(since)
+        if until is not None:
+            where.append("scanned_at < ?")
+            args.append(until)
+        sql = "SELECT scanned_at, seat_label, message_link, status, source FROM scan_log"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        try:
+            cur = conn.execute(sql + " ORDER BY id", args)
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                for scanned_at, seat_label, link, status, source in rows:
+                    yield (
+                        time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(scanned_at)),
+                        seat_label,
+                        link or "",
+                        SCAN_STATUS_EXPIRED if status == "expired" else SCAN_STATUS_SCANNED,
+                        source or "",
+                    )
+        finally:
+            conn.close()
+
+    def close(self) -> None:
+        try:
+            self._conn.close()
+        except Exception:
+            pass
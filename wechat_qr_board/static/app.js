@@ -2,6 +2,42 @@ let selectedSeatKey = null;
 let isAdvancing = false;
 let lastShownQrUrl = null;
 let toastTimer = null;
+// state 接口 ETag 缓存：未变化时服务器回 304，复用 lastState
+let stateEtag = null;
+let lastState = null;
+let serverOffset = 0; // server_time - 本地时间（秒），304 时用来推算 server_time
+// 本地模型：seat_key -> seat，通过 ?since=<version> 增量接口打补丁
+const seatModel = new Map();
+let stateVersion = 0;
+let stateInstance = "";
+// 左侧列表 DOM 复用：seat_key -> 节点；dirtyKeys 为上次渲染后变化的座位
+const seatEls = new Map();
+const dirtyKeys = new Set();
+// 推送通道（SSE）：连上后由服务器推增量，本地每秒只刷新倒计时；断线期间退回轮询
+let pushConnected = false;
+let eventSource = null;
+// 座位数达到 VIRTUAL_MIN_SEATS 后左侧列表改为虚拟滚动：固定行高，只保留可视区域（上下各多 VIRTUAL_OVERSCAN 行）的节点
+const VIRTUAL_MIN_SEATS = 200;
+const VIRTUAL_OVERSCAN = 6;
+const SEAT_ROW_HEIGHT = 90; // 行高 80px（见 style.css 的 .seat-list.virtual）+ 10px 间距
+let virtualMode = false;
+let scrollRaf = 0;
+let scrolledToKey = null; // 虚拟滚动下最近一次自动滚到可见的选中座位
+// 分页模式（座位数达到 VIRTUAL_MIN_SEATS，或页面地址带筛选参数）：不再拉全量状态 / 订阅推送，
+// 虚拟列表滚到已加载部分的末尾时再从 /api/seats 按 cursor 拉下一页；每秒拉一条看版本，变了才重拉已加载的范围。
+// 座位数降到 VIRTUAL_MIN_SEATS / 2 以下（且没有筛选）时回到全量模式
+const SEAT_PAGE_SIZE = 100;
+const SEAT_PAGE_MAX = 500; // 与服务端 limit 上限一致
+let pagedMode = false;
+let pageHead = null; // 已加载范围第一页的响应头：version / instance / 统计
+let pageCursor = null; // 已加载范围之后的下一页游标；null = 已到末尾
+let pageLoading = null;
+// 页面地址上的筛选参数（?status=&source=&date=&q=），原样传给 /api/seats
+const seatFilterParams = new URLSearchParams();
+new URLSearchParams(window.location.search).forEach((v, k) => {
+  if (v && ["status", "source", "date", "q"].includes(k)) seatFilterParams.set(k, v);
+});
+const seatFiltered = seatFilterParams.toString() !== "";
 
 function splitSeatLabel(label) {
   const s = (label || "").trim();
@@ -32,86 +68,187 @@ function fmtMMSS(totalSeconds) {
 }
 
 function pickNextSeatKey(state) {
-  const pending = state.seats.filter((s) => s.pending_count > 0);
-  return pending.length ? pending[0].seat_key : null;
+  // 列表已按 pending 优先排序，第一个就是
+  const first = state.seats[0];
+  return first && first.pending_count > 0 ? first.seat_key : null;
 }
 
-function render(state) {
-  const seatListEl = document.getElementById("seatList");
-  const statsEl = document.getElementById("stats");
+function buildSeatItem(seat) {
+  const item = document.createElement("div");
+  item.className = "seat-item " + seat.status;
+  item.onclick = () => {
+    selectedSeatKey = seat.seat_key;
+    if (lastState) render(lastState);
+  };
 
-  const total = state.seats.length;
-  const pending = state.seats.reduce((a, s) => a + s.pending_count, 0);
-  const scannedSeats = state.seats.filter((s) => s.status === "scanned").length;
-  statsEl.textContent = `待扫码 ${pending} | 已完成座位 ${scannedSeats}/${total}`;
-
-  if (!selectedSeatKey || !state.seats.find((s) => s.seat_key === selectedSeatKey)) {
-    selectedSeatKey = pickNextSeatKey(state) || (state.seats[0] ? state.seats[0].seat_key : null);
+  const name = document.createElement("div");
+  name.className = "seat-name";
+  const parts = splitSeatLabel(seat.seat_label);
+  const line1 = document.createElement("div");
+  line1.className = "seat-line seat-line-1";
+  line1.textContent = parts.top || "-";
+  name.appendChild(line1);
+  if (parts.bottom) {
+    const line2 = document.createElement("div");
+    line2.className = "seat-line seat-line-2";
+    line2.textContent = parts.bottom;
+    name.appendChild(line2);
   }
 
-  seatListEl.innerHTML = "";
-  state.seats.forEach((seat) => {
-    const item = document.createElement("div");
-    let isExpired = false;
-    item.className =
-      "seat-item " +
-      seat.status +
-      (seat.seat_key === selectedSeatKey ? " selected" : "");
-    item.onclick = () => {
-      selectedSeatKey = seat.seat_key;
-      render(state);
-    };
+  const status = document.createElement("div");
+  status.className = "seat-status";
+  const pill = document.createElement("span");
+  pill.className = "pill " + seat.status;
+  pill.textContent = seat.status === "pending" ? "未扫描" : seat.status === "scanned" ? "已扫描" : "空";
+  status.appendChild(pill);
+
+  const timer = document.createElement("div");
+  timer.className = "seat-timer";
+
+  const right = document.createElement("div");
+  right.style.textAlign = "right";
+  right.style.fontSize = "12px";
+  right.style.color = "rgba(231,238,252,0.7)";
+  right.textContent = seat.pending_count > 0 ? `待扫码 ${seat.pending_count}` : `已扫 ${seat.scanned_count}`;
+  if (seat.expired_count > 0) right.textContent += ` · 过期 ${seat.expired_count}`;
+
+  item.appendChild(name);
+  item.appendChild(status);
+  item.appendChild(timer);
+  item.appendChild(right);
+  item._timer = timer;
+  return item;
+}
 
-    const name = document.createElement("div");
-    name.className = "seat-name";
-    const parts = splitSeatLabel(seat.seat_label);
-    const line1 = document.createElement("div");
-    line1.className = "seat-line seat-line-1";
-    line1.textContent = parts.top || "-";
-    name.appendChild(line1);
-    if (parts.bottom) {
-      const line2 = document.createElement("div");
-      line2.className = "seat-line seat-line-2";
-      line2.textContent = parts.bottom;
-      name.appendChild(line2);
+// 倒计时每次渲染都要刷新；其余内容只在座位变化时重建
+function updateSeatTimer(item, seat, serverTime) {
+  const timer = item._timer;
+  let isExpired = false;
+  if (seat.pending_count > 0 && seat.current && seat.current.expires_at) {
+    const remaining = seat.current.expires_at - serverTime;
+    if (remaining <= 0) {
+      isExpired = true;
+      timer.textContent = "此购物车已过期";
+    } else {
+      timer.textContent = `倒计时 ${fmtMMSS(remaining)}`;
     }
+  } else {
+    timer.textContent = seat.status === "scanned" ? "已完成" : "等待中";
+  }
+  item.classList.toggle("expired", isExpired);
+}
 
-    const status = document.createElement("div");
-    status.className = "seat-status";
-    const pill = document.createElement("span");
-    pill.className = "pill " + seat.status;
-    pill.textContent = seat.status === "pending" ? "未扫描" : seat.status === "scanned" ? "已扫描" : "空";
-    status.appendChild(pill);
-
-    const timer = document.createElement("div");
-    timer.className = "seat-timer";
-    if (seat.pending_count > 0 && seat.current && seat.current.expires_at) {
-      const remaining = seat.current.expires_at - state.server_time;
-      if (remaining <= 0) {
-        isExpired = true;
-        timer.textContent = "此购物车已过期";
-      } else {
-        timer.textContent = `倒计时 ${fmtMMSS(remaining)}`;
+function setVirtualMode(seatListEl, on) {
+  if (virtualMode === on) return;
+  virtualMode = on;
+  scrolledToKey = null;
+  seatListEl.textContent = "";
+  seatEls.clear();
+  seatListEl.classList.toggle("virtual", on);
+  if (on) {
+    const inner = document.createElement("div");
+    inner.className = "seat-list-inner";
+    seatListEl.appendChild(inner);
+  }
+}
+
+// 虚拟滚动：内层容器撑出全部高度，只为可视区域的座位建节点（绝对定位），滚出去的节点直接丢弃
+function renderSeatListVirtual(state, seatListEl) {
+  const inner = seatListEl.firstChild;
+  const seats = state.seats;
+  // 分页模式下还没加载的部分也占位（有筛选时总数未知，只多留一屏），滚动条长度大致正确
+  const rows = state.more ? Math.max(seats.length + VIRTUAL_OVERSCAN, seatFiltered ? 0 : state.stats.total) : seats.length;
+  inner.style.height = `${rows * SEAT_ROW_HEIGHT}px`;
+
+  // 选中座位变了（点 Next 自动跳到下一个）且不在可视区域时，滚过去
+  if (selectedSeatKey && selectedSeatKey !== scrolledToKey) {
+    scrolledToKey = selectedSeatKey;
+    const idx = seats.findIndex((s) => s.seat_key === selectedSeatKey);
+    if (idx >= 0) {
+      const top = idx * SEAT_ROW_HEIGHT;
+      if (top < seatListEl.scrollTop || top + SEAT_ROW_HEIGHT > seatListEl.scrollTop + seatListEl.clientHeight) {
+        seatListEl.scrollTop = Math.max(0, top - SEAT_ROW_HEIGHT);
       }
-    } else {
-      timer.textContent = seat.status === "scanned" ? "已完成" : "等待中";
     }
+  }
+
+  const first = Math.max(0, Math.floor(seatListEl.scrollTop / SEAT_ROW_HEIGHT) - VIRTUAL_OVERSCAN);
+  const end = Math.ceil((seatListEl.scrollTop + seatListEl.clientHeight) / SEAT_ROW_HEIGHT) + VIRTUAL_OVERSCAN;
+  const last = Math.min(seats.length, end);
+  if (state.more && end >= seats.length) loadMoreSeats();
+  const present = new Set();
+  for (let i = first; i < last; i++) {
+    const seat = seats[i];
+    present.add(seat.seat_key);
+    let el = seatEls.get(seat.seat_key);
+    if (!el || dirtyKeys.has(seat.seat_key)) {
+      const fresh = buildSeatItem(seat);
+      if (el) el.replaceWith(fresh);
+      else inner.appendChild(fresh);
+      el = fresh;
+      seatEls.set(seat.seat_key, el);
+    }
+    const top = `${i * SEAT_ROW_HEIGHT}px`;
+    if (el.style.top !== top) el.style.top = top;
+    el.classList.toggle("selected", seat.seat_key === selectedSeatKey);
+    updateSeatTimer(el, seat, state.server_time);
+  }
+  seatEls.forEach((el, key) => {
+    if (!present.has(key)) {
+      el.remove();
+      seatEls.delete(key);
+    }
+  });
+  dirtyKeys.clear();
+}
 
-    const right = document.createElement("div");
-    right.style.textAlign = "right";
-    right.style.fontSize = "12px";
-    right.style.color = "rgba(231,238,252,0.7)";
-    right.textContent = seat.pending_count > 0 ? `待扫码 ${seat.pending_count}` : `已扫 ${seat.scanned_count}`;
-
-    item.appendChild(name);
-    item.appendChild(status);
-    item.appendChild(timer);
-    item.appendChild(right);
-    if (isExpired) item.classList.add("expired");
-    seatListEl.appendChild(item);
+function renderSeatList(state) {
+  const seatListEl = document.getElementById("seatList");
+  setVirtualMode(seatListEl, !!state.paged || state.seats.length >= VIRTUAL_MIN_SEATS);
+  if (virtualMode) {
+    renderSeatListVirtual(state, seatListEl);
+    return;
+  }
+  const present = new Set();
+  let prev = null;
+  state.seats.forEach((seat) => {
+    present.add(seat.seat_key);
+    let el = seatEls.get(seat.seat_key);
+    if (!el || dirtyKeys.has(seat.seat_key)) {
+      const fresh = buildSeatItem(seat);
+      if (el) el.replaceWith(fresh);
+      el = fresh;
+      seatEls.set(seat.seat_key, el);
+    }
+    el.classList.toggle("selected", seat.seat_key === selectedSeatKey);
+    updateSeatTimer(el, seat, state.server_time);
+    // 只在顺序不对时移动节点
+    const want = prev ? prev.nextSibling : seatListEl.firstChild;
+    if (want !== el) seatListEl.insertBefore(el, want);
+    prev = el;
+  });
+  seatEls.forEach((el, key) => {
+    if (!present.has(key)) {
+      el.remove();
+      seatEls.delete(key);
+    }
   });
+  dirtyKeys.clear();
+}
+
+function render(state) {
+  const statsEl = document.getElementById("stats");
+
+  const st = state.stats;
+  statsEl.textContent = `待扫码 ${st.pending} | 已完成座位 ${st.scannedSeats}/${st.total}`;
 
-  const cur = state.seats.find((s) => s.seat_key === selectedSeatKey) || null;
+  if (!selectedSeatKey || !seatModel.has(selectedSeatKey)) {
+    selectedSeatKey = pickNextSeatKey(state) || (state.seats[0] ? state.seats[0].seat_key : null);
+  }
+
+  renderSeatList(state);
+
+  const cur = seatModel.get(selectedSeatKey) || null;
   const curSeatEl = document.getElementById("curSeat");
   const curCapturedAtEl = document.getElementById("curCapturedAt");
   const curDateEl = document.getElementById("curDate");
@@ -223,18 +360,198 @@ function render(state) {
   }
 }
 
+// 与服务端一致：pending 优先，其次按 seat_label 排序
+function sortSeats(seats) {
+  return seats.sort((a, b) => {
+    const pa = a.pending_count > 0 ? 0 : 1;
+    const pb = b.pending_count > 0 ? 0 : 1;
+    if (pa !== pb) return pa - pb;
+    return a.seat_label < b.seat_label ? -1 : a.seat_label > b.seat_label ? 1 : 0;
+  });
+}
+
+function applyStatePatch(data) {
+  // full=true（instance 变了 / 版本对不上；旧版全量接口没有 full 字段）：丢掉本地全部座位，整体替换。
+  // 同一 instance 内座位只增不删，增量里只有新增 / 更新的座位
+  if (data.full !== false) {
+    seatModel.clear();
+  }
+  (data.seats || []).forEach((s) => {
+    seatModel.set(s.seat_key, s);
+    dirtyKeys.add(s.seat_key);
+  });
+  stateVersion = data.version || 0;
+  stateInstance = data.instance || "";
+  serverOffset = data.server_time - Date.now() / 1000;
+  const seats = sortSeats(Array.from(seatModel.values()));
+  // 统计只在状态变化时算一次，每秒的倒计时刷新直接复用
+  const stats = { total: seats.length, pending: 0, scannedSeats: 0 };
+  seats.forEach((s) => {
+    stats.pending += s.pending_count;
+    if (s.status === "scanned") stats.scannedSeats += 1;
+  });
+  lastState = { server_time: data.server_time, seats, stats };
+  return lastState;
+}
+
 async function fetchState() {
-  const resp = await fetch("/api/state");
+  const headers = {};
+  if (stateEtag && lastState) headers["If-None-Match"] = stateEtag;
+  const qs = lastState ? `?since=${stateVersion}&instance=${encodeURIComponent(stateInstance)}` : "";
+  const resp = await fetch("/api/state" + qs, { headers, cache: "no-store" });
+  if (resp.status === 304 && lastState) {
+    // 内容没变，只推进 server_time 让倒计时继续走
+    lastState.server_time = Date.now() / 1000 + serverOffset;
+    return lastState;
+  }
   if (!resp.ok) throw new Error("state failed");
+  const data = await resp.json();
+  stateEtag = resp.headers.get("ETag");
+  return applyStatePatch(data);
+}
+
+function seatsUrl(limit, cursor) {
+  const qs = new URLSearchParams(seatFilterParams);
+  qs.set("limit", String(limit));
+  if (cursor) qs.set("cursor", cursor);
+  return "/api/seats" + "?" + qs.toString();
+}
+
+async function fetchSeatPage(limit, cursor) {
+  const resp = await fetch(seatsUrl(limit, cursor), { cache: "no-store" });
+  if (!resp.ok) throw new Error("seats failed");
   return await resp.json();
 }
 
+// 分页模式的 lastState：seats 只有已加载的部分（服务端顺序），统计来自响应头
+function applySeatPages(head, seats, cursor) {
+  pageHead = head;
+  pageCursor = cursor;
+  seatModel.clear();
+  const rows = [];
+  seats.forEach((s) => {
+    // 翻页期间座位在 pending / 非 pending 之间移动时可能重复
+    if (seatModel.has(s.seat_key)) return;
+    seatModel.set(s.seat_key, s);
+    dirtyKeys.add(s.seat_key);
+    rows.push(s);
+  });
+  serverOffset = head.server_time - Date.now() / 1000;
+  lastState = {
+    server_time: head.server_time,
+    seats: rows,
+    stats: { total: head.total_seats, pending: head.pending_total, scannedSeats: head.completed_seats },
+    paged: true,
+    more: !!cursor,
+  };
+  return lastState;
+}
+
+// 重拉已加载的范围（至少一页）：版本变了之后顺序 / 内容都可能变
+async function reloadSeatPages() {
+  const want = Math.max(SEAT_PAGE_SIZE, lastState && lastState.paged ? lastState.seats.length : 0);
+  let head = null;
+  let seats = [];
+  let cursor = null;
+  do {
+    const page = await fetchSeatPage(Math.min(SEAT_PAGE_MAX, want - seats.length), cursor);
+    // 版本以第一页为准：拉后面几页期间有变化的话，下一次检查会再重拉
+    if (!head) head = page;
+    seats = seats.concat(page.seats || []);
+    cursor = page.next_cursor || null;
+  } while (cursor && seats.length < want);
+  return applySeatPages(head, seats, cursor);
+}
+
+function loadMoreSeats() {
+  if (pageLoading || !pageCursor || !pagedMode) return;
+  const version = pageHead.version;
+  pageLoading = fetchSeatPage(SEAT_PAGE_SIZE, pageCursor)
+    .then((page) => {
+      // 期间有变化：丢掉这一页，下一次检查会整体重拉
+      if (!pagedMode || !lastState || !lastState.paged || page.version !== version) return;
+      applySeatPages(pageHead, lastState.seats.concat(page.seats || []), page.next_cursor || null);
+      if (!isAdvancing) render(lastState);
+    })
+    .catch(() => {})
+    .finally(() => {
+      pageLoading = null;
+    });
+}
+
+async function fetchPagedState() {
+  // 只拉一条看版本，没变化就复用已加载的范围
+  const head = await fetchSeatPage(1, null);
+  if (lastState && lastState.paged && head.version === pageHead.version && head.instance === pageHead.instance) {
+    lastState.server_time = Date.now() / 1000 + serverOffset;
+    return lastState;
+  }
+  return await reloadSeatPages();
+}
+
+function setPagedMode(on) {
+  if (pagedMode === on) return;
+  pagedMode = on;
+  seatModel.clear();
+  lastState = null;
+  stateEtag = null;
+  pageHead = null;
+  pageCursor = null;
+  if (on) {
+    if (eventSource) eventSource.close();
+    eventSource = null;
+    pushConnected = false;
+  } else {
+    startPush();
+  }
+}
+
+async function refreshState() {
+  if (pagedMode) {
+    const state = await fetchPagedState();
+    if (seatFiltered || state.stats.total >= VIRTUAL_MIN_SEATS / 2) return state;
+    setPagedMode(false);
+    return await fetchState();
+  }
+  const state = await fetchState();
+  if (state.seats.length < VIRTUAL_MIN_SEATS) return state;
+  setPagedMode(true);
+  return await fetchPagedState();
+}
+
+function startPush() {
+  if (!window.EventSource) return;
+  const es = new EventSource("/api/events");
+  eventSource = es;
+  es.onopen = () => {
+    pushConnected = true;
+  };
+  es.onmessage = (ev) => {
+    if (pagedMode) return;
+    try {
+      const state = applyStatePatch(JSON.parse(ev.data));
+      // 推送来的版本与轮询 ETag 无关，下次轮询（若断线）按 since 增量拉取
+      stateEtag = null;
+      if (!isAdvancing) render(state);
+    } catch (e) {
+      // ignore
+    }
+  };
+  es.onerror = () => {
+    // EventSource 会自动重连；重连后服务器先推一次全量
+    pushConnected = false;
+  };
+}
+
 async function doNext() {
   if (!selectedSeatKey) return;
-  const resp = await fetch("/api/scan_next", {
+  // 带上正在显示的 qr_url：按条目确认，重复点击 / 请求重试不会把下一个码也标成已扫
+  const cur = seatModel.get(selectedSeatKey);
+  const qrUrl = cur && cur.current ? cur.current.qr_url : "";
+  const resp = await fetch("/api/scan_batch", {
     method: "POST",
     headers: { "Content-Type": "application/json" },
-    body: JSON.stringify({ seat_key: selectedSeatKey })
+    body: JSON.stringify({ acks: [{ seat_key: selectedSeatKey, qr_url: qrUrl }], next: 0 })
   });
   if (!resp.ok) return;
   const data = await resp.json();
@@ -243,7 +560,15 @@ async function doNext() {
 
 async function loop() {
   try {
-    const state = await fetchState();
+    let state;
+    if (!pagedMode && pushConnected && lastState) {
+      lastState.server_time = Date.now() / 1000 + serverOffset;
+      state = lastState;
+      // 推送把座位数推过了阈值：改为分页
+      if (state.seats.length >= VIRTUAL_MIN_SEATS) state = await refreshState();
+    } else {
+      state = await refreshState();
+    }
     render(state);
   } catch (e) {
     // ignore
@@ -278,7 +603,7 @@ document.getElementById("btnNext").onclick = async () => {
 
   try {
     await doNext();
-    const state = await fetchState();
+    const state = await refreshState();
     render(state);
     showToast("已记录到 CSV", "ok");
   } catch (e) {
@@ -290,6 +615,29 @@ document.getElementById("btnNext").onclick = async () => {
   }
 };
 
-loop();
+// 虚拟滚动：滚动 / 窗口大小变化时按帧补渲染可视区域
+function onSeatListViewport() {
+  if (!virtualMode || scrollRaf) return;
+  scrollRaf = requestAnimationFrame(() => {
+    scrollRaf = 0;
+    if (lastState) renderSeatList(lastState);
+  });
+}
+document.getElementById("seatList").addEventListener("scroll", onSeatListViewport, { passive: true });
+window.addEventListener("resize", onSeatListViewport);
+
+// 先拉一条看座位总数：座位很多（或带筛选）时直接进入分页模式，不拉全量
+async function boot() {
+  try {
+    const head = await fetchSeatPage(1, null);
+    pagedMode = seatFiltered || head.total_seats >= VIRTUAL_MIN_SEATS;
+  } catch (e) {
+    pagedMode = seatFiltered;
+  }
+  if (!pagedMode) startPush();
+  loop();
+}
+
+boot();
 
 
@@ -1,29 +1,406 @@
 from __future__ import annotations
 
+import base64
+import bisect
 import csv
+import heapq
+import itertools
 import json
 import os
+import secrets
 import threading
 import time
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
-from .models import QrItem, SeatState, seat_state_to_dict
+from .dedupe import DedupeIndex
+from .journal import Journal
+from .models import (
+    SCANNED_KEEP,
+    SCAN_STATUS_EXPIRED,
+    SCAN_STATUS_SCANNED,
+    QrItem,
+    SeatFilter,
+    SeatState,
+    qr_item_from_record,
+    qr_item_to_record,
+    seat_state_from_record,
+    seat_state_to_dict,
+    seat_state_to_json,
+    seat_state_to_record,
+)
+from .scan_log import ScanLogFilter, ScanLogWriter, csv_chunks
+from .sqlite_backend import SqliteBackend
+
+
+SCAN_LOG_HEADER = ["时间", "位置", "discord消息链接", "状态", "来源"]
+# 旧版 scan_log.csv 只有前三列：迁移时状态按“已扫码”，来源为空
+SCAN_LOG_DEFAULTS = ["", "", "", SCAN_STATUS_SCANNED, ""]
+
+
+def _encode_seat_cursor(section: int, seat: SeatState) -> str:
+    # 分页游标：上一页最后一个座位的位置（0 = pending 段，1 = 其余座位段）+ 排序键
+    raw = json.dumps([section, seat.seat_label, seat.seat_key], ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_seat_cursor(cursor: str) -> Tuple[int, str, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        section, label, key = json.loads(raw.decode("utf-8"))
+    except Exception:
+        raise ValueError("bad cursor")
+    if section not in (0, 1) or not isinstance(label, str) or not isinstance(key, str):
+        raise ValueError("bad cursor")
+    return section, label, key
 
 
 class Store:
     """
     内存状态 + JSON/CSV 落盘。
+
+    落盘 = state.json 快照 + journal.jsonl 追加日志（见 journal.Journal）：
+    - 每次变更（新增条目 / 扫码 / 账号更新）记一条小的 journal 行
+    - journal 行采用 write-behind：由后台线程合并写入
+      （每 flush_interval 秒最多一次，或累计 flush_max_pending 次变更立即写）
+    - journal 超过 compact_every 行时压缩成新快照
+    - 启动时读快照 + 重放 journal，崩溃重启不丢 pending 队列
+    flush_interval <= 0 时退化为每次变更同步写盘。
+
+    已扫历史：内存里每个座位只保留最近 SCANNED_KEEP 个，更早的在下次写盘时归档
+    （json 后端写 history.jsonl；sqlite 后端 items 表本身就有），可通过 iter_history 读回。
+
+    过期：所有 pending 条目按 expires_at 进一个小顶堆，后台线程每 expire_interval 秒
+    把到期未扫的条目移到座位的 expired 桶，并在扫码记录里记一行“已过期”。
+
+    backend="sqlite" 时改用单个 SQLite 文件（见 sqlite_backend.SqliteBackend），
+    同一批变更一个事务提交，扫码记录也写进库里，不再生成 state.json / scan_log.csv。
     """
 
-    def __init__(self, data_dir: str):
+    def __init__(
+        self,
+        data_dir: str,
+        *,
+        flush_interval: float = 1.0,
+        flush_max_pending: int = 50,
+        compact_every: int = 1000,
+        backend: str = "json",
+        dedupe_window: float = 3600.0,
+        dedupe_capacity: int = 200000,
+    ):
         self.data_dir = data_dir
         os.makedirs(self.data_dir, exist_ok=True)
-        self.state_path = os.path.join(self.data_dir, "state.json")
         self.csv_path = os.path.join(self.data_dir, "scan_log.csv")
         self._lock = threading.Lock()
 
         self.seats: Dict[str, SeatState] = {}
-        self._seen_item_keys: set[str] = set()
+        # 去重：(seat_key, qr_url, message_link) 指纹，按过期时间 + 窗口淘汰，有容量上限
+        self._dedupe = DedupeIndex(window=dedupe_window, capacity=dedupe_capacity)
+        # 有序座位索引：[(seat_label, seat_key), ...] 始终按 label 排序，新增座位时二分插入；
+        # _pending_order 只含当前有 pending 的座位，由 _seat_changed_locked 维护。
+        # 找下一个待扫座位 / 生成列表都不必再整体排序。
+        self._order: List[Tuple[str, str]] = []
+        self._pending_order: List[Tuple[str, str]] = []
+        self._pending_keys: set[str] = set()
+        # 汇总计数（group_summary 用），随每次变更增量维护，读取 O(1)：
+        # 待扫条目总数 / 过期条目总数 / 已完成座位（无 pending 且扫过）集合
+        self._pending_total = 0
+        self._expired_total = 0
+        self._completed_keys: set[str] = set()
+        # 过期索引：(expires_at, 序号, seat_key, item) 小顶堆；条目被扫走后不从堆里删，到期弹出时跳过
+        self._expiry_heap: List[Tuple[float, int, str, QrItem]] = []
+        self._expiry_tie = itertools.count()
+        self.expire_interval = 1.0
+
+        # 状态版本：每次变更 +1，用作 state 接口的 ETag；
+        # instance_id 区分进程/实例，避免重启后版本号从头计数造成误判 304
+        self.version = 0
+        self.instance_id = secrets.token_hex(4)
+        # 增量接口用的变更日志：[(version, seat_key), ...]，version 递增；
+        # 超过 _change_log_limit 时丢弃旧的一半，since 早于 _change_floor 的请求回全量
+        self._change_log: List[Tuple[int, str]] = []
+        self._change_floor = 0
+        self._change_log_limit = 20000
+        # 变更回调（推送通道用）；在锁外调用，可能来自任意线程
+        self._listeners: List[Callable[[], None]] = []
+
+        self.backend = "sqlite" if backend == "sqlite" else "json"
+        self._backend = SqliteBackend(self.data_dir) if self.backend == "sqlite" else Journal(self.data_dir)
+        self.state_path = self._backend.state_path
+        self.compact_every = max(1, int(compact_every))
+        self._seq = 0
+        self._ops: List[Dict[str, Any]] = []  # 尚未写入 journal 的变更
+        self._archive_buf: List[Dict[str, Any]] = []  # 尚未写入归档的已扫条目
+        self._replaying = False
+        self._force_compact = False
+        self._restore()
+
+        # write-behind 状态
+        self.flush_interval = float(flush_interval)
+        self.flush_max_pending = max(1, int(flush_max_pending))
+        self._dirty_count = 0
+        self._first_dirty_at = 0.0
+        self._last_mutation_at = 0.0
+        self._last_flush_at = 0.0
+        self._flush_count = 0
+        self._write_lock = threading.Lock()  # 保证 journal / 快照写入串行
+        self._wake = threading.Event()
+        self._closed = False
+        # 后台线程：write-behind 写盘 + 过期清理（同步写盘模式下只做过期清理）
+        # 扫码记录（json 后端）：常驻句柄 + 缓冲，fsync 由后台线程批量做
+        self._scan_log: Optional[ScanLogWriter] = None
+        if self.backend == "json":
+            self._scan_log = ScanLogWriter(
+                self.csv_path,
+                SCAN_LOG_HEADER,
+                flush_rows=self.flush_max_pending,
+                flush_interval=self.flush_interval,
+                defaults=SCAN_LOG_DEFAULTS,
+            )
+            # 构造时就打开（Store 通常在 I/O 线程里创建），之后事件循环上的写入只碰缓冲
+            self._scan_log.ensure_exists()
+        self._flusher = threading.Thread(target=self._flusher_loop, name=f"store-bg:{data_dir}", daemon=True)
+        self._flusher.start()
+
+    def _restore(self) -> None:
+        snapshot, ops = self._backend.load()
+        now = time.time()
+        trimmed = 0
+        with self._lock:
+            for k, rec in ((snapshot or {}).get("seats") or {}).items():
+                if not isinstance(rec, dict):
+                    continue
+                seat = seat_state_from_record({"seat_key": k, **rec})
+                self.seats[seat.seat_key] = seat
+                self._index_seat_locked(seat)
+                for it in list(seat.pending) + list(seat.scanned) + list(seat.expired):
+                    self._dedupe.add(seat.seat_key, it.qr_url, it.message_link, it.expires_at, now)
+                for it in seat.scanned:
+                    self._dedupe.mark_terminal(seat.seat_key, it.qr_url, "scanned", it.expires_at, now)
+                for it in seat.expired:
+                    self._dedupe.mark_terminal(seat.seat_key, it.qr_url, "expired", it.expires_at, now)
+                for it in seat.pending:
+                    self._push_expiry_locked(seat.seat_key, it)
+                self._pending_total += len(seat.pending)
+                self._expired_total += seat.expired_count
+                # 旧快照里的已扫列表没有上限：多出的部分归档，并在下次写盘时压缩快照
+                while len(seat.scanned) > SCANNED_KEEP:
+                    self._archive_buf.append(self._history_record(seat, seat.scanned.popleft()))
+                    trimmed += 1
+            for seat_key, qr_url, link, expires_at, status in self._backend.load_seen_keys(now - self._dedupe.window):
+                self._dedupe.add(seat_key, qr_url, link, expires_at, now)
+                if status in ("scanned", "expired"):
+                    self._dedupe.mark_terminal(seat_key, qr_url, status, expires_at, now)
+            self._seq = self._backend.snapshot_seq
+            # 重放时溢出的已扫条目在原先写 journal 之前就已归档过，不再重复写
+            self._replaying = True
+            for op in ops:
+                try:
+                    self._apply_op_locked(op)
+                except Exception as e:
+                    print(f"[WARN] journal 重放失败 seq={op.get('seq')}: {e}")
+                self._seq = max(self._seq, int(op.get("seq") or 0))
+            self._replaying = False
+            if trimmed:
+                self._force_compact = True
+            # 快照里的座位不在变更日志里：恢复前的版本一律回全量
+            self._change_log.clear()
+            self._change_floor = self.version
+        if snapshot or ops:
+            print(f"[OK] Store restored {len(self.seats)} seats from {self.data_dir} (replayed {len(ops)} ops)")
+
+    def _apply_op_locked(self, op: Dict[str, Any]) -> None:
+        kind = op.get("op")
+        seat_key = str(op.get("seat_key") or "")
+        if kind == "add":
+            seat = self._ensure_seat_locked(seat_key, str(op.get("seat_label") or seat_key))
+            item = qr_item_from_record(op.get("item") or {})
+            if self._dedupe.add(seat_key, item.qr_url, item.message_link, item.expires_at):
+                seat.pending.append(item)
+                self._pending_total += 1
+                self._push_expiry_locked(seat_key, item)
+                self._seat_changed_locked(seat)
+        elif kind == "scan":
+            seat = self.seats.get(seat_key)
+            if seat:
+                self._apply_scan_locked(
+                    seat,
+                    str(op.get("qr_url") or ""),
+                    str(op.get("message_link") or ""),
+                    float(op.get("scanned_at") or 0.0),
+                )
+        elif kind == "expire":
+            seat = self.seats.get(seat_key)
+            if seat:
+                qr_url = str(op.get("qr_url") or "")
+                link = str(op.get("message_link") or "")
+                for it in seat.pending:
+                    if it.qr_url == qr_url and it.message_link == link:
+                        self._expire_item_locked(seat, it)
+                        break
+        elif kind == "account":
+            seat = self._ensure_seat_locked(seat_key, str(op.get("seat_label") or seat_key))
+            seat.account_info = str(op.get("account_info") or "")
+            self._seat_changed_locked(seat)
+
+    def _ensure_seat_locked(self, seat_key: str, seat_label: str) -> SeatState:
+        seat = self.seats.get(seat_key)
+        if seat is None:
+            seat = SeatState(seat_key=seat_key, seat_label=seat_label)
+            self.seats[seat_key] = seat
+            self._index_seat_locked(seat)
+            self._seat_changed_locked(seat)
+        return seat
+
+    def _index_seat_locked(self, seat: SeatState) -> None:
+        """
+        新座位加入有序索引（seat_label 创建后不再变化，所以只需插入一次）。
+        """
+        bisect.insort(self._order, (seat.seat_label, seat.seat_key))
+        self._sync_pending_index_locked(seat)
+
+    def _sync_pending_index_locked(self, seat: SeatState) -> None:
+        """
+        座位在“无 pending”与“有 pending”之间切换时，更新 _pending_order；同时维护已完成座位集合。
+        """
+        if not seat.pending and seat.scanned_count > 0:
+            self._completed_keys.add(seat.seat_key)
+        else:
+            self._completed_keys.discard(seat.seat_key)
+        has = bool(seat.pending)
+        if has == (seat.seat_key in self._pending_keys):
+            return
+        entry = (seat.seat_label, seat.seat_key)
+        if has:
+            self._pending_keys.add(seat.seat_key)
+            bisect.insort(self._pending_order, entry)
+        else:
+            self._pending_keys.discard(seat.seat_key)
+            i = bisect.bisect_left(self._pending_order, entry)
+            if i < len(self._pending_order) and self._pending_order[i] == entry:
+                del self._pending_order[i]
+
+    def _apply_scan_locked(self, seat: SeatState, qr_url: str, message_link: str, scanned_at: float) -> Optional[QrItem]:
+        """
+        把 seat.pending 中匹配的条目（通常就是队首）移到 scanned。
+        """
+        for i, it in enumerate(seat.pending):
+            if it.qr_url == qr_url and it.message_link == message_link:
+                if i == 0:
+                    seat.pending.popleft()
+                else:
+                    del seat.pending[i]
+                self._pending_total -= 1
+                it.scanned_at = scanned_at
+                seat.scanned.append(it)
+                self._dedupe.mark_terminal(seat.seat_key, it.qr_url, "scanned", it.expires_at)
+                seat.scanned_count += 1
+                while len(seat.scanned) > SCANNED_KEEP:
+                    old = seat.scanned.popleft()
+                    if not self._replaying:
+                        self._archive_buf.append(self._history_record(seat, old))
+                self._seat_changed_locked(seat)
+                return it
+        return None
+
+    @staticmethod
+    def _history_record(seat: SeatState, item: QrItem) -> Dict[str, Any]:
+        return {"seat_key": seat.seat_key, "seat_label": seat.seat_label, **qr_item_to_record(item)}
+
+    def _push_expiry_locked(self, seat_key: str, item: QrItem) -> None:
+        if item.expires_at > 0:
+            heapq.heappush(self._expiry_heap, (item.expires_at, next(self._expiry_tie), seat_key, item))
+
+    def _expire_item_locked(self, seat: SeatState, item: QrItem) -> bool:
+        """
+        把 pending 中的 item（按对象身份查找，通常就是队首）移到 expired 桶。
+        返回 False 表示它已经不在 pending（已扫码）。
+        """
+        if seat.pending and seat.pending[0] is item:
+            seat.pending.popleft()
+        else:
+            for i, it in enumerate(seat.pending):
+                if it is item:
+                    del seat.pending[i]
+                    break
+            else:
+                return False
+        self._pending_total -= 1
+        self._expired_total += 1
+        seat.expired.append(item)
+        seat.expired_count += 1
+        self._dedupe.mark_terminal(seat.seat_key, item.qr_url, "expired", item.expires_at)
+        self._seat_changed_locked(seat)
+        return True
+
+    def _expire_due_locked(self, now: float) -> Tuple[List[Tuple[str, str, str, str, str]], bool]:
+        """
+        弹出所有 expires_at <= now 的堆顶条目，仍未扫码的移入 expired 并记 journal。
+        返回：(要写入扫码记录的行, 是否需要立即唤醒写盘)。
+        """
+        rows: List[Tuple[str, str, str, str, str]] = []
+        wake = False
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now:
+            _, _, seat_key, item = heapq.heappop(heap)
+            seat = self.seats.get(seat_key)
+            if seat is None or item.scanned_at is not None or not self._expire_item_locked(seat, item):
+                continue
+            rows.append(
+                (
+                    time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now)),
+                    seat.seat_label,
+                    item.message_link or "",
+                    SCAN_STATUS_EXPIRED,
+                    str(item.meta.get("source") or ""),
+                )
+            )
+            wake = self._record_locked(
+                {
+                    "op": "expire",
+                    "seat_key": seat_key,
+                    "seat_label": seat.seat_label,
+                    "qr_url": item.qr_url,
+                    "message_link": item.message_link,
+                    "source": str(item.meta.get("source") or ""),
+                    "expired_at": now,
+                }
+            ) or wake
+        return rows, wake
+
+    def expire_due(self, now: Optional[float] = None) -> int:
+        """
+        清理已过期的 pending 条目（后台线程定期调用）。返回本次过期的条目数。
+        """
+        with self._lock:
+            rows, wake = self._expire_due_locked(time.time() if now is None else now)
+        if rows:
+            if self._scan_log is not None and self._scan_log.write_rows(rows):
+                wake = True
+            self._after_mutation(wake)
+        return len(rows)
+
+    def _seat_changed_locked(self, seat: SeatState) -> None:
+        """
+        座位发生任何变化都要走这里：作废 JSON 缓存、版本号 +1、记入变更日志、同步有序索引。
+        """
+        seat.touch()
+        self._sync_pending_index_locked(seat)
+        self.version += 1
+        self._change_log.append((self.version, seat.seat_key))
+        if len(self._change_log) > self._change_log_limit:
+            drop = len(self._change_log) // 2
+            self._change_floor = self._change_log[drop - 1][0]
+            del self._change_log[:drop]
+
+    def _record_locked(self, op: Dict[str, Any]) -> bool:
+        """
+        记录一条变更到 journal 缓冲（调用方需持有 _lock）。
+        返回：是否需要立即唤醒后台写盘。
+        """
+        self._seq += 1
+        op["seq"] = self._seq
+        self._ops.append(op)
+        return self._mark_dirty_locked()
 
     def preload_seats(self, seat_labels: List[str]) -> None:
         with self._lock:
@@ -32,10 +409,8 @@ class Store:
                 if not key:
                     continue
                 if key not in self.seats:
-                    self.seats[key] = SeatState(seat_key=key, seat_label=label.strip())
-
-    def _item_key(self, seat_key: str, qr_url: str, message_link: str) -> str:
-        return f"{seat_key}||{qr_url}||{message_link}"
+                    self._ensure_seat_locked(key, label.strip())
+        self._notify()
 
     def add_items(
         self,
@@ -44,139 +419,566 @@ class Store:
         account_info: str,
         items: List[Tuple[str, str, float, float, Dict[str, Any]]],
     ) -> None:
+        self.add_batch([(seat_key, seat_label, account_info, items)])
+
+    def add_batch(
+        self,
+        entries: List[Tuple[str, str, str, List[Tuple[str, str, float, float, Dict[str, Any]]]]],
+    ) -> None:
+        """
+        一次提交多条 (seat_key, seat_label, account_info, items)：只拿一次锁，
+        结束后只通知订阅者 / 触发写盘一次（入队批量消费用，见 ingest.IngestQueue）。
+        """
+        wake = False
         with self._lock:
-            if seat_key not in self.seats:
-                self.seats[seat_key] = SeatState(seat_key=seat_key, seat_label=seat_label)
-            seat = self.seats[seat_key]
+            version = self.version
+            now = time.time()
+            for seat_key, seat_label, account_info, items in entries:
+                wake = self._add_items_locked(seat_key, seat_label, account_info, items, now) or wake
+            changed = self.version != version
 
-            if account_info:
-                seat.account_info = account_info
+        if changed:
+            self._after_mutation(wake)
 
-            for qr_url, message_link, captured_at, expires_at, meta in items:
-                k = self._item_key(seat_key, qr_url, message_link)
-                if k in self._seen_item_keys:
-                    continue
-                self._seen_item_keys.add(k)
-                seat.pending.append(
-                    QrItem(
-                        qr_url=qr_url,
-                        message_link=message_link,
-                        captured_at=captured_at,
-                        expires_at=expires_at,
-                        meta=meta or {},
-                    )
-                )
+    def _add_items_locked(
+        self,
+        seat_key: str,
+        seat_label: str,
+        account_info: str,
+        items: List[Tuple[str, str, float, float, Dict[str, Any]]],
+        now: float,
+    ) -> bool:
+        wake = False
+        seat = self._ensure_seat_locked(seat_key, seat_label)
+
+        if account_info and account_info != seat.account_info:
+            seat.account_info = account_info
+            self._seat_changed_locked(seat)
+            wake = self._record_locked(
+                {"op": "account", "seat_key": seat_key, "seat_label": seat.seat_label, "account_info": account_info}
+            ) or wake
+
+        for qr_url, message_link, captured_at, expires_at, meta in items:
+            if not self._dedupe.add(seat_key, qr_url, message_link, expires_at, now):
+                continue
+            item = QrItem(
+                qr_url=qr_url,
+                message_link=message_link,
+                captured_at=captured_at,
+                expires_at=expires_at,
+                meta=meta,
+            )
+            seat.pending.append(item)
+            self._pending_total += 1
+            self._push_expiry_locked(seat_key, item)
+            self._seat_changed_locked(seat)
+            wake = self._record_locked(
+                {"op": "add", "seat_key": seat_key, "seat_label": seat.seat_label, "item": qr_item_to_record(item)}
+            ) or wake
+        return wake
+
+    def _mark_dirty_locked(self) -> bool:
+        """
+        记录一次变更（调用方需持有 _lock）。
+        返回：是否达到 flush_max_pending，需要立即唤醒后台写盘。
+        """
+        now = time.time()
+        if not self._dirty_count:
+            self._first_dirty_at = now
+        self._dirty_count += 1
+        self._last_mutation_at = now
+        return self._dirty_count >= self.flush_max_pending
+
+    def add_listener(self, fn: Callable[[], None]) -> None:
+        self._listeners.append(fn)
+
+    def remove_listener(self, fn: Callable[[], None]) -> None:
+        try:
+            self._listeners.remove(fn)
+        except ValueError:
+            pass
+
+    def _notify(self) -> None:
+        for fn in list(self._listeners):
+            try:
+                fn()
+            except Exception as e:
+                print(f"[ERR] store listener failed: {e}")
+
+    def _after_mutation(self, wake: bool) -> None:
+        """
+        变更之后（锁外）调用：通知订阅者，并按模式触发写盘。
+        """
+        self._notify()
+        if self.flush_interval <= 0:
+            # 同步模式（flush_interval <= 0）：保持旧行为，立即写盘
+            self.save_state()
+        elif wake:
+            self._wake.set()
 
-        self.save_state()
+    def _flusher_loop(self) -> None:
+        tick = self.expire_interval if self.flush_interval <= 0 else min(self.flush_interval, self.expire_interval)
+        while not self._closed:
+            woke = self._wake.wait(tick)
+            self._wake.clear()
+            if self._closed:
+                break
+            try:
+                self.expire_due()
+            except Exception as e:
+                print(f"[ERR] expire_due failed: {e}")
+            if self._scan_log is not None:
+                try:
+                    self._scan_log.maybe_flush()
+                except Exception as e:
+                    print(f"[ERR] scan log flush failed: {e}")
+            if self.flush_interval <= 0 or not (self._dirty_count or self._archive_buf):
+                continue
+            # 被唤醒（达到 flush_max_pending）或最早的未落盘变更已超过 flush_interval
+            if woke or self._force_compact or time.time() - self._first_dirty_at >= self.flush_interval:
+                try:
+                    self.save_state()
+                except Exception as e:
+                    print(f"[ERR] save_state failed: {e}")
 
-    def save_state(self) -> None:
+    def save_state(self, *, compact: bool = False) -> None:
+        """
+        把缓冲的变更追加到 journal；journal 过长（或 compact=True）时压缩成快照。
+        """
+        with self._write_lock:
+            seats: Optional[Dict[str, Dict[str, Any]]] = None
+            with self._lock:
+                ops = self._ops
+                self._ops = []
+                archived = self._archive_buf
+                self._archive_buf = []
+                self._dirty_count = 0
+                seq = self._seq
+                if compact or self._force_compact or self._backend.entries + len(ops) >= self.compact_every:
+                    # 只有 JSON 后端需要快照；SQLite 不在锁内做 O(座位数) 的序列化
+                    if self._backend.needs_snapshot:
+                        seats = {k: seat_state_to_record(v) for k, v in self.seats.items()}
+                    else:
+                        seats = {}
+                    self._force_compact = False
+            # 归档先于 journal：journal 里有的 scan 变更，其溢出条目一定已归档
+            self._backend.archive(archived)
+            # journal 先写到 seq，再写快照：快照替换后 journal 里不会有更新的变更
+            self._backend.append(ops)
+            if seats is not None:
+                self._backend.compact(seats, seq)
+            with self._lock:
+                self._last_flush_at = time.time()
+                self._flush_count += 1
+
+    def close(self, *, flush: bool = True) -> None:
+        """
+        停止后台写盘线程；flush=True 时强制最后一次落盘并压缩快照（用于进程退出）。
+        """
+        self._closed = True
+        self._wake.set()
+        if self._flusher is not threading.current_thread():
+            self._flusher.join(timeout=5.0)
+        if flush:
+            self.save_state(compact=bool(self._dirty_count or self._backend.entries or self._force_compact))
+        if self._scan_log is not None:
+            self._scan_log.close()
+        self._backend.close()
+
+    def persistence_stats(self) -> Dict[str, Any]:
+        """
+        写盘滞后情况：
+        - dirty_mutations: 尚未落盘的变更数
+        - lag_seconds: 最早一次未落盘变更距今的秒数（0 表示已全部落盘）
+        """
         with self._lock:
-            payload = {
-                "updated_at": time.time(),
-                "seats": {k: seat_state_to_dict(v) for k, v in self.seats.items()},
+            dirty = self._dirty_count
+            first_dirty_at = self._first_dirty_at
+            last_mutation_at = self._last_mutation_at
+            last_flush_at = self._last_flush_at
+            flush_count = self._flush_count
+        lag = max(0.0, time.time() - first_dirty_at) if dirty else 0.0
+        return {
+            "backend": self.backend,
+            "mode": "write_behind" if self.flush_interval > 0 else "sync",
+            "flush_interval": self.flush_interval,
+            "flush_max_pending": self.flush_max_pending,
+            "dirty_mutations": int(dirty),
+            "last_mutation_at": last_mutation_at,
+            "last_flush_at": last_flush_at,
+            "lag_seconds": lag,
+            "flush_count": int(flush_count),
+            "seq": int(self._seq),
+            "snapshot_seq": int(self._backend.snapshot_seq),
+            "journal_entries": int(self._backend.entries),
+            "compact_every": self.compact_every,
+        }
+
+    def expiry_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "expire_interval": self.expire_interval,
+                "heap_size": len(self._expiry_heap),
+                "next_expires_at": self._expiry_heap[0][0] if self._expiry_heap else None,
+                "expired_total": int(self._expired_total),
             }
-        tmp = self.state_path + ".tmp"
-        with open(tmp, "w", encoding="utf-8") as f:
-            json.dump(payload, f, ensure_ascii=False, indent=2)
-        os.replace(tmp, self.state_path)
+
+    def dedupe_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return self._dedupe.stats()
+
+    def stats(self) -> Dict[str, Any]:
+        out = {
+            "persistence": self.persistence_stats(),
+            "expiry": self.expiry_stats(),
+            "dedupe": self.dedupe_stats(),
+        }
+        if self._scan_log is not None:
+            out["scan_log"] = self._scan_log.stats()
+        return out
+
+    def _ordered_seats_locked(self) -> List[SeatState]:
+        """
+        列表顺序：pending 优先，其次按 label 排序。
+        直接按有序索引拼接，不再每次排序。
+        """
+        seats = [self.seats[k] for _, k in self._pending_order]
+        if len(seats) < len(self._order):
+            pending = self._pending_keys
+            seats.extend(self.seats[k] for _, k in self._order if k not in pending)
+        return seats
 
     def list_seats_for_ui(self) -> Dict:
         with self._lock:
-            seats = list(self.seats.values())
-        # 默认：pending 优先，其次按 label 排序
-        seats.sort(key=lambda s: (0 if s.pending else 1, s.seat_label))
+            seats = self._ordered_seats_locked()
         return {
             "server_time": time.time(),
             "seats": [seat_state_to_dict(s) for s in seats],
         }
 
+    def state_etag(self) -> str:
+        return f'"{self.instance_id}-{self.version}"'
+
+    def list_seats_for_ui_json(self) -> bytes:
+        """
+        与 list_seats_for_ui 相同的内容，但直接返回 JSON 字节：
+        未变化的座位复用缓存片段，只拼接不重新序列化。
+        """
+        with self._lock:
+            parts = [seat_state_to_json(s) for s in self._ordered_seats_locked()]
+            version = self.version
+        return self._state_body(version, True, parts)
+
+    def list_changes_since_json(self, since: int, instance_id: str = "") -> bytes:
+        """
+        增量 state：只返回版本号 > since 的座位（新增或更新）+ 当前版本号。
+        以下情况回全量（full=true），客户端必须丢掉本地全部座位、整体换成这次的 seats：
+        - instance_id 不一致（服务重启 / 分组重建）
+        - since 早于变更日志保留范围，或大于当前版本
+        同一个 instance 内座位只增不删（只会整个分组删除），所以增量里没有“删除了哪些座位”，
+        座位消失一定伴随 instance 变化 -> 全量。
+        """
+        with self._lock:
+            version = self.version
+            if instance_id != self.instance_id or since < self._change_floor or since > version:
+                parts = [seat_state_to_json(s) for s in self._ordered_seats_locked()]
+                return self._state_body(version, True, parts)
+            i = bisect.bisect_left(self._change_log, (since + 1,))
+            keys: List[str] = []
+            seen: set[str] = set()
+            for _, k in self._change_log[i:]:
+                if k not in seen:
+                    seen.add(k)
+                    keys.append(k)
+            parts = [seat_state_to_json(self.seats[k]) for k in keys if k in self.seats]
+        return self._state_body(version, False, parts)
+
+    def _iter_seats_after_locked(
+        self, section: int, after: Optional[Tuple[str, str]], status: str
+    ) -> Iterator[Tuple[int, SeatState]]:
+        """
+        按列表顺序从游标之后遍历座位，产出 (段, 座位)。
+        只要 pending 或只要非 pending 时跳过另一段；段内用二分定位起点。
+        """
+        if section == 0 and status not in ("scanned", "empty"):
+            order = self._pending_order
+            i = bisect.bisect_right(order, after) if after else 0
+            for j in range(i, len(order)):
+                yield 0, self.seats[order[j][1]]
+        if status == "pending":
+            return
+        pending = self._pending_keys
+        order = self._order
+        i = bisect.bisect_right(order, after) if after and section == 1 else 0
+        for j in range(i, len(order)):
+            k = order[j][1]
+            if k not in pending:
+                yield 1, self.seats[k]
+
+    def list_seats_page_json(self, flt: Optional[SeatFilter] = None, cursor: str = "", limit: int = 100) -> bytes:
+        """
+        分页 + 筛选的座位列表，顺序同 list_seats_for_ui（pending 优先，其次按 label）。
+        cursor 为上一页返回的 next_cursor（空 = 第一页），没有下一页时 next_cursor 为 null；游标格式不对抛 ValueError。
+        每页只从游标处二分定位后往下走，不生成整个列表；按 status=pending 等筛选时直接跳过不相干的段。
+        翻页期间座位在 pending / 非 pending 之间移动时可能重复或漏掉，客户端按 seat_key 去重即可。
+        """
+        flt = flt or SeatFilter()
+        limit = max(1, int(limit))
+        section, after = 0, None
+        if cursor:
+            section, label, key = _decode_seat_cursor(cursor)
+            after = (label, key)
+        parts: List[bytes] = []
+        next_cursor: Optional[str] = None
+        with self._lock:
+            last: Optional[Tuple[int, SeatState]] = None
+            for sec, seat in self._iter_seats_after_locked(section, after, flt.status):
+                if not flt.match(seat):
+                    continue
+                if len(parts) >= limit:
+                    next_cursor = _encode_seat_cursor(last[0], last[1]) if last else None
+                    break
+                parts.append(seat_state_to_json(seat))
+                last = (sec, seat)
+            head = {
+                "server_time": time.time(),
+                "version": self.version,
+                "instance": self.instance_id,
+                "total_seats": len(self.seats),
+                "pending_seats": len(self._pending_order),
+                # 与 group_summary 相同的增量计数（页面统计栏用，不随筛选变化）
+                "pending_total": int(self._pending_total),
+                "completed_seats": len(self._completed_keys),
+                "next_cursor": next_cursor,
+            }
+        return b"".join(
+            [json.dumps(head, ensure_ascii=False)[:-1].encode("utf-8"), b',"seats":[', b",".join(parts), b"]}"]
+        )
+
+    def _state_body(self, version: int, full: bool, parts: List[bytes]) -> bytes:
+        head = {"server_time": time.time(), "version": version, "instance": self.instance_id, "full": full}
+        return b"".join([json.dumps(head)[:-1].encode(), b',"seats":[', b",".join(parts), b"]}"])
+
+    def iter_history(self, seat_key: str, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        某座位的已扫历史（新 → 旧，最多 limit 条）：内存里的最近条目 + 尚未写盘的 + 归档。
+        """
+        limit = max(0, int(limit))
+        with self._lock:
+            seat = self.seats.get(seat_key)
+            if seat is None:
+                return []
+            recent = [self._history_record(seat, it) for it in seat.scanned]
+            buffered = [r for r in self._archive_buf if r.get("seat_key") == seat_key]
+        out = list(reversed(recent)) + list(reversed(buffered))
+        need = limit - len(out)
+        if need > 0:
+            if self.backend == "sqlite":
+                # items 表里可能也有内存里这些条目（已落盘的）：多取一些再按条目去重
+                shown = {(r["qr_url"], r["message_link"]) for r in out}
+                older = [
+                    r
+                    for r in self._backend.iter_history(seat_key, need + len(out))
+                    if (r["qr_url"], r["message_link"]) not in shown
+                ][-need:]
+            else:
+                older = list(self._backend.iter_history(seat_key, need))
+            out.extend(reversed(older))
+        return out[:limit]
+
     def group_summary(self) -> Dict[str, int]:
         """
-        给 server 首页用：返回该分组的简要统计信息。
+        给 server 首页用：返回该分组的简要统计信息（增量维护的计数，O(1)，与座位数无关）。
         - pending_total: 待扫码二维码总数
         - completed_seats: 已完成(至少扫过一次且当前无 pending)的座位数
         - total_seats: 座位总数
+        - expired_total: 未扫码就过期的二维码总数
         """
         with self._lock:
-            seats = list(self.seats.values())
-        pending_total = sum(len(s.pending) for s in seats)
-        completed_seats = sum(1 for s in seats if (not s.pending) and bool(s.scanned))
-        total_seats = len(seats)
-        return {
-            "pending_total": int(pending_total),
-            "completed_seats": int(completed_seats),
-            "total_seats": int(total_seats),
-        }
+            return {
+                "pending_total": int(self._pending_total),
+                "completed_seats": len(self._completed_keys),
+                "total_seats": len(self.seats),
+                "expired_total": int(self._expired_total),
+            }
+
+    def _scan_item_locked(self, seat: SeatState, item: QrItem, now: float) -> Tuple[Tuple[str, str, str, str, str], bool]:
+        """
+        把 seat 的 pending 条目 item 标记为已扫并记 journal。返回 (扫码记录行, 是否需要唤醒写盘)。
+        """
+        self._apply_scan_locked(seat, item.qr_url, item.message_link, now)
+        source = str(item.meta.get("source") or "")
+        row = (
+            time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now)),
+            seat.seat_label,
+            item.message_link or "",
+            SCAN_STATUS_SCANNED,
+            source,
+        )
+        wake = self._record_locked(
+            {
+                "op": "scan",
+                "seat_key": seat.seat_key,
+                "seat_label": seat.seat_label,
+                "qr_url": item.qr_url,
+                "message_link": item.message_link,
+                "source": source,
+                "scanned_at": item.scanned_at,
+            }
+        )
+        return row, wake
+
+    def _finish_scan(self, rows: List[Tuple[str, str, str, str, str]], wake: bool) -> None:
+        # 锁外：扫码记录写缓冲（sqlite 后端随 scan / expire 变更在同一事务写入），再通知 + 触发写盘
+        if not rows:
+            return
+        if self._scan_log is not None and self._scan_log.write_rows(rows):
+            wake = True
+        self._after_mutation(wake)
 
     def scan_next(self, seat_key: str) -> Optional[str]:
         """
         将 seat 的当前二维码标记为 scanned，并写 CSV。
         返回：建议前端选中的下一个 seat_key（优先当前 seat 还有 pending，否则找下一个 pending seat）。
+        扫码前先清理已到期的条目，保证标记的和建议的都是仍然有效的二维码。
         """
-        scanned_row: Optional[Tuple[str, str, str]] = None
         next_key: Optional[str] = None
 
         with self._lock:
+            now = time.time()
+            rows, wake = self._expire_due_locked(now)
             seat = self.seats.get(seat_key)
             if not seat or not seat.pending:
                 # 找一个 pending seat
                 next_key = self._find_next_pending_locked(None)
-                return next_key
-
-            item = seat.pending.pop(0)
-            item.scanned_at = time.time()
-            seat.scanned.append(item)
-            scanned_row = (
-                time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(item.scanned_at)),
-                seat.seat_label,
-                item.message_link or "",
-            )
-
-            # 决定下一个
-            if seat.pending:
-                next_key = seat.seat_key
             else:
-                next_key = self._find_next_pending_locked(seat.seat_key)
+                row, w = self._scan_item_locked(seat, seat.pending[0], now)
+                rows.append(row)
+                wake = w or wake
+                # 决定下一个
+                if seat.pending:
+                    next_key = seat.seat_key
+                else:
+                    next_key = self._find_next_pending_locked(seat.seat_key)
 
-        if scanned_row:
-            self._append_csv(scanned_row)
-        self.save_state()
+        self._finish_scan(rows, wake)
         return next_key
 
+    def scan_batch(self, acks: List[Tuple[str, str]], next_count: int = 5) -> Dict[str, Any]:
+        """
+        批量确认扫码：acks 为 [(seat_key, qr_url), ...]，按顺序在一次加锁里处理，
+        扫码记录一次写入、journal 一次写盘。
+        按 qr_url 匹配条目，所以重试是幂等的：去重窗口内已扫过的返回 duplicate，不会再扫下一个。
+        qr_url 为空表示扫该座位的当前二维码（同 scan_next，不幂等）。
+        每条结果的 status：scanned / duplicate / expired / not_found / unknown_seat。
+        返回 results + next_seat_key（同 scan_next，以最后一条确认的座位为准）
+        + next_seat_keys（之后最多 next_count 个有 pending 的座位，供扫码枪客户端预取）。
+        """
+        results: List[Dict[str, str]] = []
+        with self._lock:
+            now = time.time()
+            rows, wake = self._expire_due_locked(now)
+            last_key: Optional[str] = None
+            for seat_key, qr_url in acks:
+                seat = self.seats.get(seat_key)
+                if seat is None:
+                    results.append({"seat_key": seat_key, "qr_url": qr_url, "status": "unknown_seat"})
+                    continue
+                last_key = seat_key
+                item: Optional[QrItem] = None
+                if not qr_url:
+                    item = seat.current()
+                else:
+                    item = next((it for it in seat.pending if it.qr_url == qr_url), None)
+                if item is not None:
+                    row, w = self._scan_item_locked(seat, item, now)
+                    rows.append(row)
+                    wake = w or wake
+                    status = "scanned"
+                else:
+                    # 终态查去重索引（保留整个去重窗口），而不是只留最近几个的已扫 / 过期列表
+                    term = self._dedupe.terminal_status(seat_key, qr_url, now) if qr_url else None
+                    status = {"scanned": "duplicate", "expired": "expired"}.get(term or "", "not_found")
+                results.append({"seat_key": seat_key, "qr_url": qr_url or (item.qr_url if item else ""), "status": status})
+
+            last = self.seats.get(last_key) if last_key else None
+            if last is not None and last.pending:
+                next_key: Optional[str] = last.seat_key
+            else:
+                next_key = self._find_next_pending_locked(last_key)
+            next_keys = self._next_pending_keys_locked(next_key, max(0, int(next_count)))
+
+        self._finish_scan(rows, wake)
+        return {"results": results, "next_seat_key": next_key, "next_seat_keys": next_keys}
+
+    def _next_pending_keys_locked(self, first_key: Optional[str], n: int) -> List[str]:
+        """
+        从 first_key（含）开始按 seat_label 顺序取最多 n 个有 pending 的座位（回绕，不重复）。
+        """
+        order = self._pending_order
+        if not order or not first_key or n <= 0:
+            return []
+        seat = self.seats[first_key]
+        i = bisect.bisect_left(order, (seat.seat_label, seat.seat_key))
+        return [order[(i + j) % len(order)][1] for j in range(min(n, len(order)))]
+
     def _find_next_pending_locked(self, after_key: Optional[str]) -> Optional[str]:
-        keys = list(self.seats.keys())
-        # 尽量按 seat_label 排序稳定
-        keys.sort(key=lambda k: self.seats[k].seat_label)
-        if not keys:
+        """
+        按 seat_label 顺序找 after_key 之后第一个有 pending 的座位（到末尾后回绕）。
+        在 _pending_order 上二分，O(log n)。
+        """
+        order = self._pending_order
+        if not order:
             return None
-        start_idx = 0
-        if after_key and after_key in keys:
-            start_idx = (keys.index(after_key) + 1) % len(keys)
-        for i in range(len(keys)):
-            k = keys[(start_idx + i) % len(keys)]
-            if self.seats[k].pending:
-                return k
-        return None
-
-    def _append_csv(self, row: Tuple[str, str, str]) -> None:
-        file_exists = os.path.exists(self.csv_path)
-        with open(self.csv_path, "a", newline="", encoding="utf-8-sig") as f:
-            w = csv.writer(f)
-            if not file_exists:
-                w.writerow(["时间", "位置", "discord消息链接"])
-            w.writerow(list(row))
+        seat = self.seats.get(after_key) if after_key else None
+        if seat is None:
+            return order[0][1]
+        i = bisect.bisect_right(order, (seat.seat_label, seat.seat_key))
+        return order[i % len(order)][1]
 
     def ensure_csv_exists(self) -> None:
         """
         让“下载CSV”在未点击 Next 的情况下也能正常下载（至少包含表头）。
         """
-        with self._lock:
-            file_exists = os.path.exists(self.csv_path)
-        if file_exists:
-            return
-        # 写一个只有表头的文件
-        with open(self.csv_path, "w", newline="", encoding="utf-8-sig") as f:
-            w = csv.writer(f)
-            w.writerow(["时间", "位置", "discord消息链接"])
+        if self._scan_log is not None:
+            self._scan_log.ensure_exists()
+
+    def iter_scan_log(self, flt: Optional[ScanLogFilter] = None) -> Iterator[Tuple[str, str, str, str, str]]:
+        """
+        逐行读取扫码记录（不含表头，按时间顺序）：json 后端读 CSV 文件，sqlite 后端走流式查询。
+        旧文件缺少的列补齐：状态按“已扫码”，来源为空。flt 给出时只产出匹配的行。
+        """
+        if self._scan_log is None:
+            rows: Iterator[Tuple[str, str, str, str, str]] = self._backend.iter_scan_log(
+                since=flt.start_ts() if flt else None,
+                until=flt.end_ts() if flt else None,
+            )
+        else:
+            rows = self._iter_csv_rows()
+        for row in rows:
+            if flt is None or flt.match(row):
+                yield row
 
+    def _iter_csv_rows(self) -> Iterator[Tuple[str, str, str, str, str]]:
+        # 缓冲里的行先写到文件，保证导出包含最新记录
+        self._scan_log.flush()
+        if not os.path.exists(self.csv_path):
+            return
+        with open(self.csv_path, "r", newline="", encoding="utf-8-sig") as f:
+            r = csv.reader(f)
+            next(r, None)  # 表头
+            for row in r:
+                if len(row) >= 3:
+                    yield (
+                        row[0],
+                        row[1],
+                        row[2],
+                        row[3] if len(row) >= 4 else SCAN_STATUS_SCANNED,
+                        row[4] if len(row) >= 5 else "",
+                    )
 
+    def iter_csv_chunks(self, flt: Optional[ScanLogFilter] = None, rows_per_chunk: int = 500) -> Iterator[bytes]:
+        """
+        导出 CSV 用：按块产出 utf-8-sig 编码的字节（第一块含 BOM + 表头）。
+        """
+        return csv_chunks(SCAN_LOG_HEADER, self.iter_scan_log(flt), rows_per_chunk)
@@ -2,15 +2,149 @@ from __future__ import annotations
 
 import json
 import os
-from typing import Any, Dict
+from typing import Any, Dict, Iterable, Optional
 
 from aiohttp import web
 
+from .events import EventHub, sse_stream, store_state_stream
+from .ingest import IngestQueue
+from .io_executor import IoExecutor
+from .models import SeatFilter
+from .scan_log import ScanLogFilter
 from .store import Store
 
 
-def create_app(store: Store) -> web.Application:
+def etag_matches(request: web.Request, etag: str) -> bool:
+    inm = request.headers.get("If-None-Match", "")
+    return bool(inm) and etag in [t.strip() for t in inm.split(",")]
+
+
+def state_response(request: web.Request, store: Store) -> web.Response:
+    """
+    state 接口：带 ETag（Store 版本号），客户端 If-None-Match 命中时直接 304。
+    先取 ETag 再生成内容：期间若有新变更，ETag 只会偏旧，下次轮询会重新拉取。
+    带 ?since=<version>&instance=<id> 时只返回变化的座位（见 Store.list_changes_since_json）。
+    """
+    etag = store.state_etag()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, etag):
+        return web.Response(status=304, headers=headers)
+    since = request.query.get("since")
+    if since is not None:
+        try:
+            since_v = int(since)
+        except ValueError:
+            raise web.HTTPBadRequest(text="bad since")
+        body = store.list_changes_since_json(since_v, request.query.get("instance", ""))
+    else:
+        body = store.list_seats_for_ui_json()
+    return web.Response(body=body, content_type="application/json", headers=headers)
+
+
+def seats_page_response(request: web.Request, store: Store) -> web.Response:
+    """
+    座位分页：?status=&source=&date=&q=&cursor=&limit=（limit 默认 100，最多 500），见 Store.list_seats_page_json。
+    """
+    try:
+        flt = SeatFilter.from_query(request.query)
+        limit = min(500, max(1, int(request.query.get("limit") or 100)))
+        body = store.list_seats_page_json(flt, request.query.get("cursor", "").strip(), limit)
+    except ValueError as e:
+        raise web.HTTPBadRequest(text=str(e))
+    return web.Response(body=body, content_type="application/json", headers={"Cache-Control": "no-cache"})
+
+
+MAX_SCAN_BATCH = 500
+
+
+async def scan_batch_response(request: web.Request, store: Store) -> web.Response:
+    """
+    批量确认扫码：{"acks": [{"seat_key": ..., "qr_url": ...}, ...], "next": 5}，见 Store.scan_batch。
+    一次最多 MAX_SCAN_BATCH 条。
+    """
+    try:
+        body: Dict[str, Any] = await request.json()
+    except ValueError:
+        raise web.HTTPBadRequest(text="bad json")
+    raw = body.get("acks") if isinstance(body, dict) else None
+    if not isinstance(raw, list):
+        raise web.HTTPBadRequest(text="missing acks")
+    if len(raw) > MAX_SCAN_BATCH:
+        raise web.HTTPBadRequest(text=f"too many acks (max {MAX_SCAN_BATCH})")
+    acks = []
+    for a in raw:
+        if not isinstance(a, dict):
+            raise web.HTTPBadRequest(text="bad ack")
+        acks.append((str(a.get("seat_key") or "").strip(), str(a.get("qr_url") or "").strip()))
+    try:
+        next_count = min(50, max(0, int(body.get("next", 5))))
+    except (TypeError, ValueError):
+        raise web.HTTPBadRequest(text="bad next")
+    out = store.scan_batch(acks, next_count)
+    return web.json_response({"ok": True, **out})
+
+
+async def history_response(request: web.Request, store: Store, io: IoExecutor) -> web.Response:
+    """
+    已扫历史：?seat=<seat_key>&limit=<n>（默认 100，最多 1000），新 → 旧。
+    归档文件在 I/O 线程里读。
+    """
+    seat_key = request.query.get("seat", "").strip()
+    if not seat_key:
+        raise web.HTTPBadRequest(text="missing seat")
+    try:
+        limit = min(1000, max(1, int(request.query.get("limit") or 100)))
+    except ValueError:
+        raise web.HTTPBadRequest(text="bad limit")
+    items = await io.run(None, store.iter_history, seat_key, limit)
+    return web.json_response({"seat_key": seat_key, "items": items})
+
+
+def export_filter(request: web.Request) -> ScanLogFilter:
+    """
+    导出筛选参数：from / to（epoch 秒或 YYYY-MM-DD[ HH:MM[:SS]]）、seat、source。
+    """
+    try:
+        return ScanLogFilter.from_query(request.query)
+    except ValueError as e:
+        raise web.HTTPBadRequest(text=str(e))
+
+
+async def stream_csv(
+    request: web.Request,
+    filename: str,
+    chunks: Iterable[bytes],
+    io: Optional[IoExecutor] = None,
+) -> web.StreamResponse:
+    """
+    流式下载 CSV：边读边写，不在内存里拼完整文件；客户端接受 gzip 时压缩传输。
+    给了 io 时每一块都在 I/O 线程里读，事件循环只负责发送。
+    """
+    resp = web.StreamResponse()
+    resp.content_type = "text/csv"
+    resp.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    if "gzip" in request.headers.get("Accept-Encoding", "").lower():
+        resp.enable_compression(web.ContentCoding.gzip)
+    await resp.prepare(request)
+    if io is None:
+        for chunk in chunks:
+            await resp.write(chunk)
+    else:
+        it = iter(chunks)
+        while True:
+            chunk = await io.run(None, next, it, None)
+            if chunk is None:
+                break
+            await resp.write(chunk)
+    await resp.write_eof()
+    return resp
+
+
+def create_app(store: Store, io: Optional[IoExecutor] = None, ingest: Optional[IngestQueue] = None) -> web.Application:
     app = web.Application()
+    hub = EventHub()
+    io = io or IoExecutor(max_workers=2, name="board-io")
+    store.add_listener(lambda: hub.publish("state"))
 
     async def handle_index(_: web.Request) -> web.StreamResponse:
         here = os.path.dirname(__file__)
@@ -25,8 +159,24 @@ def create_app(store: Store) -> web.Application:
             raise web.HTTPNotFound()
         return web.FileResponse(p)
 
-    async def api_state(_: web.Request) -> web.Response:
-        return web.json_response(store.list_seats_for_ui())
+    async def api_state(request: web.Request) -> web.Response:
+        return state_response(request, store)
+
+    async def api_seats(request: web.Request) -> web.Response:
+        return seats_page_response(request, store)
+
+    async def api_events(request: web.Request) -> web.StreamResponse:
+        # SSE 推送：连上先推全量，之后每次变更推增量（格式同 /api/state?since=）
+        return await sse_stream(request, hub, "state", store_state_stream(store))
+
+    async def api_stats(_: web.Request) -> web.Response:
+        out = store.stats()
+        if ingest is not None:
+            out["ingest"] = ingest.stats()
+        return web.json_response(out)
+
+    async def api_history(request: web.Request) -> web.Response:
+        return await history_response(request, store, io)
 
     async def api_scan_next(request: web.Request) -> web.Response:
         body: Dict[str, Any] = await request.json()
@@ -34,18 +184,29 @@ def create_app(store: Store) -> web.Application:
         next_key = store.scan_next(seat_key)
         return web.json_response({"ok": True, "next_seat_key": next_key})
 
+    async def api_scan_batch(request: web.Request) -> web.Response:
+        return await scan_batch_response(request, store)
+
     app.router.add_get("/", handle_index)
     app.router.add_get("/static/{name}", handle_static)
     app.router.add_get("/api/state", api_state)
+    app.router.add_get("/api/seats", api_seats)
+    app.router.add_get("/api/stats", api_stats)
+    app.router.add_get("/api/events", api_events)
+    app.router.add_get("/api/history", api_history)
     app.router.add_post("/api/scan_next", api_scan_next)
-    async def api_csv(_: web.Request) -> web.StreamResponse:
-        store.ensure_csv_exists()
-        resp = web.FileResponse(store.csv_path)
-        resp.content_type = "text/csv"
-        resp.headers["Content-Disposition"] = 'attachment; filename="scan_log.csv"'
-        return resp
+    app.router.add_post("/api/scan_batch", api_scan_batch)
+    async def api_csv(request: web.Request) -> web.StreamResponse:
+        await io.run(None, store.ensure_csv_exists)
+        return await stream_csv(request, "scan_log.csv", store.iter_csv_chunks(), io)
+
+    async def api_export(request: web.Request) -> web.StreamResponse:
+        # 带筛选的导出：/api/export?from=2026-10-17&to=2026-10-17&seat=...&source=xbot
+        flt = export_filter(request)
+        return await stream_csv(request, "scan_log_export.csv", store.iter_csv_chunks(flt), io)
 
     app.router.add_get("/api/csv", api_csv)
+    app.router.add_get("/api/export", api_export)
     return app
 
 
@@ -2,7 +2,8 @@
 // 这里不直接 import（为了零构建），而是动态拉取原来的静态资源并“包一层” API 前缀。
 
 async function loadText(url) {
-  const resp = await fetch(url, { cache: "no-store" });
+  // no-cache：每次都向服务器校验（带 If-None-Match），未变化时服务器回 304，直接用本地缓存
+  const resp = await fetch(url, { cache: "no-cache" });
   return await resp.text();
 }
 
@@ -162,6 +163,9 @@ async function main() {
   let js = await loadText("/board_static/app.js");
   js = js.replaceAll('"/api/state"', `"/api/groups/${gid}/state"`);
   js = js.replaceAll('"/api/scan_next"', `"/api/groups/${gid}/scan_next"`);
+  js = js.replaceAll('"/api/scan_batch"', `"/api/groups/${gid}/scan_batch"`);
+  js = js.replaceAll('"/api/events"', `"/api/groups/${gid}/events"`);
+  js = js.replaceAll('"/api/seats"', `"/api/groups/${gid}/seats"`);
   const run = new Function(js);
   run();
 
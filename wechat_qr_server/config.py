@@ -5,6 +5,9 @@ import os
 from dataclasses import dataclass, field
 from typing import List, Optional
 
+from wechat_qr_board.extract import ExtractConfig
+from wechat_qr_board.ingest import OVERFLOW_POLICIES
+
 
 @dataclass
 class WebConfig:
@@ -13,6 +16,32 @@ class WebConfig:
     public_base_url: str = ""  # 可选：用于生成分享链接
 
 
+@dataclass
+class StorageConfig:
+    # json: state.json + journal.jsonl + scan_log.csv；sqlite: 单个 store.sqlite3（WAL）
+    backend: str = "json"
+    # journal write-behind：最多每 flush_interval_seconds 秒写一次；
+    # 累计 flush_max_pending 次变更时立即写。<=0 表示每次变更同步写盘。
+    flush_interval_seconds: float = 1.0
+    flush_max_pending: int = 50
+    # journal 超过多少行压缩成 state.json 快照
+    compact_every: int = 1000
+    # 去重指纹保留到二维码过期后 dedupe_window_seconds 秒；最多 dedupe_capacity 个
+    dedupe_window_seconds: float = 3600.0
+    dedupe_capacity: int = 200000
+
+
+@dataclass
+class IngestConfig:
+    # on_message 只入队，后台按批解析 + 提交；队列最多 max_queue 条
+    max_queue: int = 5000
+    batch_size: int = 100
+    # 队列满时：drop_oldest / drop_newest / block（见 ingest.OVERFLOW_POLICIES）
+    overflow: str = "drop_oldest"
+    # >0：消息解析放到这么多个子进程里并行（ProcessPoolExecutor）；0：在主进程里解析
+    parse_workers: int = 0
+
+
 @dataclass
 class DiscordConfig:
     token: str = ""
@@ -32,8 +61,14 @@ class AppConfig:
     seat_field_name_patterns: List[str] = None  # type: ignore[assignment]
     account_field_name_patterns: List[str] = None  # type: ignore[assignment]
     web: WebConfig = field(default_factory=WebConfig)
+    storage: StorageConfig = field(default_factory=StorageConfig)
+    ingest: IngestConfig = field(default_factory=IngestConfig)
+    # 由上面的 keywords / *_patterns 预编译出的提取配置（load_config 里构造）
+    extract: ExtractConfig = field(default_factory=ExtractConfig)
     reset_password: str = ""
     data_dir: str = "wechat_qr_server/data"
+    # true：启动时按 groups.json 恢复分组（保留各分组的待扫队列）；false：启动时清空所有分组
+    warm_restart: bool = False
 
 
 def load_config(config_path: str) -> AppConfig:
@@ -59,7 +94,27 @@ def load_config(config_path: str) -> AppConfig:
         public_base_url=str(web_raw.get("public_base_url") or "").strip(),
     )
 
-    return AppConfig(
+    storage_raw = raw.get("storage") or {}
+    backend = str(storage_raw.get("backend") or "json").strip().lower()
+    storage_cfg = StorageConfig(
+        backend=backend if backend in ("json", "sqlite") else "json",
+        flush_interval_seconds=float(storage_raw.get("flush_interval_seconds", 1.0)),
+        flush_max_pending=int(storage_raw.get("flush_max_pending") or 50),
+        compact_every=int(storage_raw.get("compact_every") or 1000),
+        dedupe_window_seconds=float(storage_raw.get("dedupe_window_seconds", 3600.0)),
+        dedupe_capacity=int(storage_raw.get("dedupe_capacity") or 200000),
+    )
+
+    ingest_raw = raw.get("ingest") or {}
+    overflow = str(ingest_raw.get("overflow") or "drop_oldest").strip().lower()
+    ingest_cfg = IngestConfig(
+        max_queue=int(ingest_raw.get("max_queue") or 5000),
+        batch_size=int(ingest_raw.get("batch_size") or 100),
+        overflow=overflow if overflow in OVERFLOW_POLICIES else "drop_oldest",
+        parse_workers=max(0, int(ingest_raw.get("parse_workers") or 0)),
+    )
+
+    cfg = AppConfig(
         discord=discord_cfg,
         keywords=[str(x) for x in (raw.get("keywords") or [])],
         kakao_group_enabled=bool(raw.get("kakao_group_enabled", True)),
@@ -70,9 +125,19 @@ def load_config(config_path: str) -> AppConfig:
         seat_field_name_patterns=[str(x).lower() for x in (raw.get("seat_field_name_patterns") or ["seat info", "seat", "位置", "座位"])],
         account_field_name_patterns=[str(x).lower() for x in (raw.get("account_field_name_patterns") or ["account", "账号", "login", "id", "password", "pass"])],
         web=web_cfg,
+        storage=storage_cfg,
+        ingest=ingest_cfg,
         reset_password=str(raw.get("reset_password") or "").strip(),
         data_dir=str(raw.get("data_dir") or "wechat_qr_server/data"),
+        warm_restart=bool(raw.get("warm_restart", False)),
+    )
+    cfg.extract = ExtractConfig(
+        keywords=cfg.keywords,
+        seat_field_name_patterns=cfg.seat_field_name_patterns,
+        account_field_name_patterns=cfg.account_field_name_patterns,
+        countdown_seconds=cfg.countdown_seconds,
     )
+    return cfg
 
 
 def default_config_path() -> Optional[str]:
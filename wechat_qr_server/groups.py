@@ -1,13 +1,61 @@
 from __future__ import annotations
 
+import asyncio
+import functools
+import hashlib
+import heapq
+import hmac
+import json
 import os
 import secrets
 import shutil
+import threading
 import time
+from concurrent.futures import Future, wait as wait_futures
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
-from wechat_qr_board.store import Store
+from wechat_qr_board.io_executor import IoExecutor
+from wechat_qr_board.scan_log import ScanLogFilter
+from wechat_qr_board.store import SCAN_LOG_HEADER, Store
+
+
+# 全部分组合并导出时的表头：第一列为分组名
+MERGED_SCAN_LOG_HEADER = ["分组"] + SCAN_LOG_HEADER
+
+# 分组表快照（warm restart 用），放在 data_dir/groups/ 下
+REGISTRY_FILE = "groups.json"
+REGISTRY_VERSION = 1
+# 分组表快照最多每隔这么多秒写一次（期间的变化合并成一次快照）
+REGISTRY_SAVE_DELAY = 1.0
+# 每种类型最多暂存的 backlog 条目数（没有分组时），超出时丢掉最早的
+MAX_BACKLOG = 5000
+
+PASSWORD_ITERATIONS = 100000
+
+BacklogEntry = Tuple[str, str, str, List[Tuple[str, str, float, float, Dict[str, Any]]]]
+
+
+def hash_password(password: str) -> str:
+    """
+    分组密码只保存哈希（pbkdf2_sha256$<迭代次数>$<salt>$<hex>）；空密码 = 不加锁。
+    """
+    if not password:
+        return ""
+    salt = secrets.token_hex(8)
+    dk = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt.encode("ascii"), PASSWORD_ITERATIONS)
+    return f"pbkdf2_sha256${PASSWORD_ITERATIONS}${salt}${dk.hex()}"
+
+
+def verify_password(password: str, password_hash: str) -> bool:
+    try:
+        algo, iterations, salt, expected = password_hash.split("$")
+        if algo != "pbkdf2_sha256":
+            return False
+        dk = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt.encode("ascii"), int(iterations))
+    except ValueError:
+        return False
+    return hmac.compare_digest(dk.hex(), expected)
 
 
 @dataclass
@@ -17,25 +65,37 @@ class Group:
     created_at: float
     store: Store
     kind: str = "wechat"  # wechat | kakao
-    password: str = ""  # non-empty => locked
+    password_hash: str = ""  # non-empty => locked
 
     @property
     def locked(self) -> bool:
-        return bool(self.password)
+        return bool(self.password_hash)
+
+    def check_password(self, password: str) -> bool:
+        # pbkdf2 较慢（几十毫秒），事件循环里请放到 I/O 线程调用
+        return bool(self.password_hash) and verify_password(password, self.password_hash)
 
 
 class GroupManager:
     """
-    - 分组完全在内存；启动时清空
+    - 分组表在内存；默认启动时清空（reset_all_groups），
+      或从 data_dir/groups/groups.json 快照恢复（restore_groups，warm restart）
     - 每个 group 有独立 Store（独立 CSV/状态）
     - 新入库的二维码条目按 group 轮询分发，保证“一个二维码只分配给一个分组”
+    - 阻塞的磁盘操作（建 / 删分组目录、打开 / 关闭 Store）交给 self.io（按 group_id 保序），
+      内存里的分组表始终在事件循环线程里修改
     """
 
     def __init__(
         self,
         data_dir: str,
+        store_options: Optional[Dict[str, Any]] = None,
+        io: Optional[IoExecutor] = None,
     ):
         self.data_dir = data_dir
+        self.io = io or IoExecutor(name="groups-io")
+        # 透传给每个分组 Store 的参数（flush_interval / flush_max_pending 等）
+        self.store_options: Dict[str, Any] = dict(store_options or {})
         self.groups_dir = os.path.join(self.data_dir, "groups")
         self.groups: Dict[str, Group] = {}
         # 两套轮询：微信 / Kakao 互不影响
@@ -44,10 +104,46 @@ class GroupManager:
         self._rr_i_wechat = 0
         self._rr_i_kakao = 0
         # 无对应分组时先暂存，分组创建后再轮询分发（保持 seat/account 信息）
-        self._backlog_wechat: List[Tuple[str, str, str, List[Tuple[str, str, float, float, Dict[str, Any]]]]] = []
-        self._backlog_kakao: List[Tuple[str, str, str, List[Tuple[str, str, float, float, Dict[str, Any]]]]] = []
+        self._backlog_wechat: List[BacklogEntry] = []
+        self._backlog_kakao: List[BacklogEntry] = []
+        self.backlog_dropped = 0
+        # 变更回调（推送通道用）：参数为 group_id；分组列表本身变化（创建/删除/重置）时为 ""
+        self._listeners: List[Callable[[str], None]] = []
+        # 分组表快照：变化时只置脏标记，延迟 REGISTRY_SAVE_DELAY 秒在事件循环线程里取一次快照，
+        # I/O 线程写盘；排队中的旧快照直接被新的替换
+        self._registry_lock = threading.Lock()
+        self._registry_pending: Optional[Dict[str, Any]] = None
+        self._registry_dirty = False
+        self._registry_timer: Optional[asyncio.TimerHandle] = None
+        self._defer_save = False
+
+    def add_listener(self, fn: Callable[[str], None]) -> None:
+        self._listeners.append(fn)
+
+    def _notify(self, group_id: str) -> None:
+        for fn in list(self._listeners):
+            try:
+                fn(group_id)
+            except Exception as e:
+                print(f"[ERR] group listener failed: {e}")
 
     def reset_all_groups(self) -> None:
+        """
+        清空所有分组（每次启动删除所有群组）。同步版本：等各分组 Store 关闭后再删目录；
+        事件循环里请用 reset_all_groups_async。
+        """
+        wait_futures(self._detach_all_groups())
+        self._clear_groups_dir()
+
+    async def reset_all_groups_async(self) -> None:
+        closing = self._detach_all_groups()
+        if closing:
+            await asyncio.gather(*(asyncio.wrap_future(f) for f in closing), return_exceptions=True)
+        self._clear_groups_dir()
+
+    def _detach_all_groups(self) -> List[Future]:
+        # 关闭 Store 排在该分组之前提交的 I/O 之后（同一个 key）；返回关闭任务，目录要等它们完成后才能删
+        closing = [self.io.submit(g.group_id, functools.partial(g.store.close, flush=False)) for g in self.groups.values()]
         self.groups.clear()
         self._rr_keys_wechat = []
         self._rr_keys_kakao = []
@@ -55,40 +151,263 @@ class GroupManager:
         self._rr_i_kakao = 0
         self._backlog_wechat = []
         self._backlog_kakao = []
-        # 清空落盘目录（每次启动删除所有群组）
-        if os.path.exists(self.groups_dir):
-            shutil.rmtree(self.groups_dir, ignore_errors=True)
+        self._notify("")
+        return closing
+
+    def _clear_groups_dir(self) -> None:
+        # groups_dir 本身保留（分组表快照写在里面），只把不属于现有分组的子目录改名后在后台删除
         os.makedirs(self.groups_dir, exist_ok=True)
+        self._purge_trash()
+        for name in os.listdir(self.groups_dir):
+            path = os.path.join(self.groups_dir, name)
+            if name not in self.groups and os.path.isdir(path):
+                self._trash_dir(path)
+        # 覆盖旧的 groups.json
+        self._save_registry()
 
-    def create_group(self, name: str, *, kind: str = "wechat", password: str = "") -> Group:
+    def _purge_trash(self) -> None:
+        # 上次没删完的（例如进程在后台删除时退出）
+        prefix = os.path.basename(self.groups_dir) + ".trash-"
+        for name in os.listdir(self.data_dir):
+            if name.startswith(prefix):
+                self.io.submit(name, shutil.rmtree, os.path.join(self.data_dir, name), True)
+
+    def restore_groups(self) -> bool:
+        """
+        warm restart：按 groups.json 重新挂上每个分组已有的 Store 目录（快照 + journal 重放），
+        并恢复轮询列表 / 指针和 backlog。启动时调用（同步，会做磁盘操作）。
+        没有快照（首次启动 / 上次是清空模式）时退回 reset_all_groups，返回 False。
+        快照里没有的分组目录（例如刚建好还没来得及写快照就崩溃）不会被挂上，只打印警告。
+        """
+        path = os.path.join(self.groups_dir, REGISTRY_FILE)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                snap = json.load(f)
+        except FileNotFoundError:
+            print("[WARN] no group registry found, starting with empty groups")
+            self.reset_all_groups()
+            return False
+        except (OSError, ValueError) as e:
+            print(f"[ERR] read group registry failed, starting with empty groups: {e}")
+            self.reset_all_groups()
+            return False
+
+        self._purge_trash()
+        restored: List[str] = []
+        for rec in snap.get("groups") or []:
+            gid = str(rec.get("group_id") or "")
+            if not gid or not os.path.isdir(os.path.join(self.groups_dir, gid)):
+                print(f"[WARN] group {gid or '?'} in registry has no data dir, skipped")
+                continue
+            try:
+                store = self._open_store(gid)
+            except Exception as e:
+                print(f"[ERR] reopen group {gid} failed: {e}")
+                continue
+            store.add_listener(lambda gid=gid: self._notify(gid))
+            self.groups[gid] = Group(
+                group_id=gid,
+                name=str(rec.get("name") or gid),
+                created_at=float(rec.get("created_at") or time.time()),
+                store=store,
+                kind="kakao" if rec.get("kind") == "kakao" else "wechat",
+                password_hash=str(rec.get("password_hash") or ""),
+            )
+            restored.append(gid)
+
+        for name in os.listdir(self.groups_dir):
+            if os.path.isdir(os.path.join(self.groups_dir, name)) and name not in self.groups:
+                print(f"[WARN] unregistered group dir ignored: {name}")
+
+        rr = snap.get("rr") or {}
+        self._rr_keys_wechat, self._rr_i_wechat = self._restore_rr(rr.get("wechat"), "wechat")
+        self._rr_keys_kakao, self._rr_i_kakao = self._restore_rr(rr.get("kakao"), "kakao")
+        backlog = snap.get("backlog") or {}
+        self._backlog_wechat = [self._backlog_from_json(e) for e in backlog.get("wechat") or []]
+        self._backlog_kakao = [self._backlog_from_json(e) for e in backlog.get("kakao") or []]
+        self._trim_backlog(self._backlog_wechat, "wechat")
+        self._trim_backlog(self._backlog_kakao, "kakao")
+        print(
+            f"[OK] restored {len(restored)} groups "
+            f"(backlog wechat={len(self._backlog_wechat)} kakao={len(self._backlog_kakao)})"
+        )
+        self._notify("")
+        # 快照里有 backlog 但分组已经在了（上次分发前崩溃）：立即补分发
+        self._flush_backlog_wechat()
+        self._flush_backlog_kakao()
+        self._save_registry()
+        return True
+
+    def _restore_rr(self, raw: Any, kind: str) -> Tuple[List[str], int]:
+        raw = raw if isinstance(raw, dict) else {}
+        keys = [k for k in (raw.get("keys") or []) if k in self.groups and self.groups[k].kind == kind]
+        # 快照里漏掉的同类分组（理论上不会）补到末尾，保证都能参与轮询
+        keys += [g.group_id for g in sorted(self.groups.values(), key=lambda x: x.created_at) if g.kind == kind and g.group_id not in keys]
+        try:
+            i = int(raw.get("i") or 0)
+        except (TypeError, ValueError):
+            i = 0
+        return keys, (i % len(keys) if keys else 0)
+
+    @staticmethod
+    def _backlog_to_json(entry: BacklogEntry) -> List[Any]:
+        seat_key, seat_label, account_info, items = entry
+        return [seat_key, seat_label, account_info, [list(it) for it in items]]
+
+    @staticmethod
+    def _backlog_from_json(raw: List[Any]) -> BacklogEntry:
+        seat_key, seat_label, account_info, items = raw
+        return (
+            str(seat_key),
+            str(seat_label),
+            str(account_info),
+            [(str(u), str(l), float(c), float(e), dict(m or {})) for u, l, c, e, m in items],
+        )
+
+    def _registry_snapshot(self) -> Dict[str, Any]:
+        return {
+            "version": REGISTRY_VERSION,
+            "saved_at": time.time(),
+            "groups": [
+                {
+                    "group_id": g.group_id,
+                    "name": g.name,
+                    "created_at": g.created_at,
+                    "kind": g.kind,
+                    "password_hash": g.password_hash,
+                }
+                for g in sorted(self.groups.values(), key=lambda x: x.created_at)
+            ],
+            "rr": {
+                "wechat": {"keys": list(self._rr_keys_wechat), "i": self._rr_i_wechat},
+                "kakao": {"keys": list(self._rr_keys_kakao), "i": self._rr_i_kakao},
+            },
+            "backlog": {
+                "wechat": [self._backlog_to_json(e) for e in self._backlog_wechat],
+                "kakao": [self._backlog_to_json(e) for e in self._backlog_kakao],
+            },
+        }
+
+    def _save_registry(self) -> None:
+        """
+        分组表 / 轮询指针 / backlog 有变化时调用：只置脏标记。
+        在事件循环里时延迟 REGISTRY_SAVE_DELAY 秒再取快照（一批批分发只序列化一次 backlog），
+        不在事件循环里（启动 / 退出）时立即取快照。
+        """
+        if self._defer_save:
+            return
+        self._registry_dirty = True
+        if self._registry_timer is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._flush_registry()
+            return
+        self._registry_timer = loop.call_later(REGISTRY_SAVE_DELAY, self._flush_registry)
+
+    def _flush_registry(self) -> None:
+        # 在当前（事件循环）线程取快照，交给 I/O 线程写 groups.json
+        if self._registry_timer is not None:
+            self._registry_timer.cancel()
+            self._registry_timer = None
+        if not self._registry_dirty:
+            return
+        self._registry_dirty = False
+        snap = self._registry_snapshot()
+        with self._registry_lock:
+            scheduled = self._registry_pending is not None
+            self._registry_pending = snap
+        if not scheduled:
+            self.io.submit("__registry__", self._write_registry)
+
+    def _write_registry(self) -> None:
+        with self._registry_lock:
+            snap, self._registry_pending = self._registry_pending, None
+        if snap is None:
+            return
+        path = os.path.join(self.groups_dir, REGISTRY_FILE)
+        tmp = path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(snap, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"[ERR] save group registry failed: {e}")
+
+    def _trash_dir(self, path: str) -> None:
+        """
+        分组目录改名为 data_dir/groups.trash-<随机>，再交给 I/O 线程删除：大目录删除不卡事件循环。
+        调用前目录里的 Store 必须已经关闭。改名失败时不删除，目录留在原处，下次清空时再试。
+        """
+        trash = os.path.join(self.data_dir, f"{os.path.basename(self.groups_dir)}.trash-{secrets.token_hex(4)}")
+        try:
+            os.rename(path, trash)
+        except OSError as e:
+            print(f"[WARN] rename {path} failed, left in place: {e}")
+            return
+        self.io.submit(os.path.basename(trash), shutil.rmtree, trash, True)
+
+    @staticmethod
+    def _normalize_group_args(kind: str, password: str) -> Tuple[str, str]:
         kind = (kind or "wechat").strip().lower()
         if kind not in ("wechat", "kakao"):
             kind = "wechat"
         password = (password or "").strip()
         if kind == "kakao" and not password:
             raise ValueError("kakao group requires password")
+        return kind, password
 
+    @staticmethod
+    def _new_group_id() -> str:
         gid = secrets.token_urlsafe(8)
         gid = gid.replace("-", "").replace("_", "")
-        gid = gid[:10]
+        return gid[:10]
+
+    def _open_store(self, gid: str) -> Store:
+        # 阻塞：建目录 + 打开 journal / sqlite
         gdir = os.path.join(self.groups_dir, gid)
         os.makedirs(gdir, exist_ok=True)
-        store = Store(data_dir=gdir)
+        return Store(data_dir=gdir, **self.store_options)
+
+    def create_group(self, name: str, *, kind: str = "wechat", password: str = "") -> Group:
+        """
+        同步版本（会在调用线程里做磁盘操作）；事件循环里请用 create_group_async。
+        """
+        kind, password = self._normalize_group_args(kind, password)
+        gid = self._new_group_id()
+        return self._register_group(gid, name, kind, hash_password(password), self._open_store(gid))
+
+    async def create_group_async(self, name: str, *, kind: str = "wechat", password: str = "") -> Group:
+        kind, password = self._normalize_group_args(kind, password)
+        gid = self._new_group_id()
+        # 建目录 / 打开 Store / 算密码哈希都在 I/O 线程里做
+        store = await self.io.run(gid, self._open_store, gid)
+        password_hash = await self.io.run(None, hash_password, password)
+        return self._register_group(gid, name, kind, password_hash, store)
+
+    def _register_group(self, gid: str, name: str, kind: str, password_hash: str, store: Store) -> Group:
+        # 分组内任何座位变化（distribute_* 入库 / scan_next）都推给该分组的订阅者
+        store.add_listener(lambda: self._notify(gid))
         group = Group(
             group_id=gid,
             name=name.strip() or gid,
             created_at=time.time(),
             store=store,
             kind=kind,
-            password=password,
+            password_hash=password_hash,
         )
         self.groups[gid] = group
+        self._notify("")
         if kind == "kakao":
             self._rr_keys_kakao.append(gid)
             self._flush_backlog_kakao()
         else:
             self._rr_keys_wechat.append(gid)
             self._flush_backlog_wechat()
+        self._save_registry()
         return group
 
     def get_group(self, group_id: str) -> Optional[Group]:
@@ -143,14 +462,45 @@ class GroupManager:
             self._rr_keys_wechat = keys
             self._rr_i_wechat = i
 
-        # 从 groups 移除
+        # 从 groups 移除；目录马上要删，不再落盘
         self.groups.pop(gid, None)
+        self._notify(gid)
+        self._notify("")
 
-        # 删除落盘目录
-        gdir = os.path.join(self.groups_dir, gid)
+        self._save_registry()
+        # 关闭 Store（等后台线程退出）+ 删除落盘目录都在 I/O 线程里按顺序做
+        self.io.submit(gid, self._dispose_group, g.store, os.path.join(self.groups_dir, gid))
+        return True
+
+    @staticmethod
+    def _dispose_group(store: Store, gdir: str) -> None:
+        store.close(flush=False)
         if os.path.exists(gdir):
             shutil.rmtree(gdir, ignore_errors=True)
-        return True
+
+    def close(self) -> None:
+        """
+        进程退出时调用：让每个分组 Store 做最后一次落盘，写最后一次分组表快照，并等后台 I/O（删除目录等）做完。
+        """
+        self._flush_registry()
+        for g in self.groups.values():
+            try:
+                g.store.close()
+            except Exception as e:
+                print(f"[ERR] close store {g.group_id} failed: {e}")
+        self.io.shutdown(wait=True)
+
+    def iter_merged_scan_log(self, flt: Optional[ScanLogFilter] = None) -> Iterator[Tuple[str, ...]]:
+        """
+        所有分组（data_dir/groups/*）的扫码记录按时间归并：
+        每个分组的记录本身按时间追加，heapq.merge 每组只持有一行，内存与记录总数无关。
+        """
+        def rows(g: Group) -> Iterator[Tuple[str, ...]]:
+            for row in g.store.iter_scan_log(flt):
+                yield (g.name,) + tuple(row)
+
+        groups = sorted(self.groups.values(), key=lambda x: x.created_at)
+        return heapq.merge(*[rows(g) for g in groups], key=lambda r: r[1])
 
     def list_groups(self) -> List[Dict]:
         out = []
@@ -196,21 +546,7 @@ class GroupManager:
         将 items 轮询分配给现有分组。
         返回：成功分配的条目数
         """
-        n = 0
-        if not self._rr_keys_wechat:
-            # 暂存整批（保持原始 seat/account 信息）
-            self._backlog_wechat.append((seat_key, seat_label, account_info, items))
-            return 0
-
-        for it in items:
-            g = self._pick_group_rr_wechat()
-            if not g:
-                # 理论不会发生（有 rr_keys）
-                self._backlog_wechat.append((seat_key, seat_label, account_info, [it]))
-                continue
-            g.store.add_items(seat_key=seat_key, seat_label=seat_label, account_info=account_info, items=[it])
-            n += 1
-        return n
+        return self.distribute_batch([("wechat", (seat_key, seat_label, account_info, items))])
 
     def distribute_kakao_items(
         self,
@@ -223,44 +559,95 @@ class GroupManager:
         """
         Kakao 专用：只在 kakao 分组中轮询分发；没有 kakao 分组则暂存 backlog。
         """
+        return self.distribute_batch([("kakao", (seat_key, seat_label, account_info, items))])
+
+    def distribute_batch(self, entries: List[Tuple[str, BacklogEntry]]) -> int:
+        """
+        批量分发 [(kind, (seat_key, seat_label, account_info, items)), ...]（kind: wechat / kakao）：
+        逐条按轮询选分组（顺序与逐条调用 distribute_items 相同），先按分组归并，
+        最后每个分组只调用一次 Store.add_batch，分组表快照也只写一次。
+        没有对应类型的分组时整条暂存 backlog。
+        返回：成功分配的条目数
+        """
+        per_group: Dict[str, List[BacklogEntry]] = {}
         n = 0
-        if not self._rr_keys_kakao:
-            self._backlog_kakao.append((seat_key, seat_label, account_info, items))
-            return 0
-        for it in items:
-            g = self._pick_group_rr_kakao()
-            if not g:
-                self._backlog_kakao.append((seat_key, seat_label, account_info, [it]))
+        for kind, (seat_key, seat_label, account_info, items) in entries:
+            kakao = kind == "kakao"
+            rr_keys = self._rr_keys_kakao if kakao else self._rr_keys_wechat
+            backlog = self._backlog_kakao if kakao else self._backlog_wechat
+            if not rr_keys:
+                # 暂存整批（保持原始 seat/account 信息）
+                backlog.append((seat_key, seat_label, account_info, items))
                 continue
-            g.store.add_items(seat_key=seat_key, seat_label=seat_label, account_info=account_info, items=[it])
-            n += 1
+            for it in items:
+                g = self._pick_group_rr_kakao() if kakao else self._pick_group_rr_wechat()
+                if not g:
+                    # 理论不会发生（有 rr_keys）
+                    backlog.append((seat_key, seat_label, account_info, [it]))
+                    continue
+                out = per_group.setdefault(g.group_id, [])
+                if out and out[-1][:3] == (seat_key, seat_label, account_info):
+                    out[-1][3].append(it)
+                else:
+                    out.append((seat_key, seat_label, account_info, [it]))
+                n += 1
+        self._trim_backlog(self._backlog_wechat, "wechat")
+        self._trim_backlog(self._backlog_kakao, "kakao")
+        for gid, batch in per_group.items():
+            g = self.groups.get(gid)
+            if g is not None:
+                g.store.add_batch(batch)
+        # 轮询指针 / backlog 变了
+        if entries:
+            self._save_registry()
         return n
 
+    def _trim_backlog(self, backlog: List[BacklogEntry], kind: str) -> None:
+        # 长时间没有对应分组时 backlog 不能无限增长：丢掉最早的（二维码有时效，旧的多半已过期）
+        excess = len(backlog) - MAX_BACKLOG
+        if excess <= 0:
+            return
+        del backlog[:excess]
+        # 第一次丢弃和之后每 1000 条打印一次，避免刷屏
+        before = self.backlog_dropped
+        self.backlog_dropped += excess
+        if before == 0 or before // 1000 != self.backlog_dropped // 1000:
+            print(f"[WARN] {kind} backlog full, dropped {self.backlog_dropped} oldest entries so far (max={MAX_BACKLOG})")
+
     def _flush_backlog_wechat(self) -> None:
         if not self._rr_keys_wechat or not self._backlog_wechat:
             return
         # 简单策略：按追加顺序把 backlog 逐条轮询分发
         pending = self._backlog_wechat
         self._backlog_wechat = []
-        for seat_key, seat_label, account_info, items in pending:
-            self.distribute_items(
-                seat_key=seat_key,
-                seat_label=seat_label,
-                account_info=account_info,
-                items=items,
-            )
+        # 逐条分发期间不写快照，由调用方最后统一写一次
+        self._defer_save = True
+        try:
+            for seat_key, seat_label, account_info, items in pending:
+                self.distribute_items(
+                    seat_key=seat_key,
+                    seat_label=seat_label,
+                    account_info=account_info,
+                    items=items,
+                )
+        finally:
+            self._defer_save = False
 
     def _flush_backlog_kakao(self) -> None:
         if not self._rr_keys_kakao or not self._backlog_kakao:
             return
         pending = self._backlog_kakao
         self._backlog_kakao = []
-        for seat_key, seat_label, account_info, items in pending:
-            self.distribute_kakao_items(
-                seat_key=seat_key,
-                seat_label=seat_label,
-                account_info=account_info,
-                items=items,
-            )
+        self._defer_save = True
+        try:
+            for seat_key, seat_label, account_info, items in pending:
+                self.distribute_kakao_items(
+                    seat_key=seat_key,
+                    seat_label=seat_label,
+                    account_info=account_info,
+                    items=items,
+                )
+        finally:
+            self._defer_save = False
 
 
@@ -8,7 +8,7 @@ from typing import Optional
 import discord
 from aiohttp import web
 
-from wechat_qr_board.extract import extract_kakao_pay_entries, extract_wechat_qr_entries
+from wechat_qr_board.ingest import ExtractWorkers, IngestQueue
 
 from .config import default_config_path, load_config
 from .groups import GroupManager
@@ -62,10 +62,41 @@ async def main_async() -> None:
 
     groups = GroupManager(
         data_dir=data_dir,
+        store_options={
+            "flush_interval": cfg.storage.flush_interval_seconds,
+            "flush_max_pending": cfg.storage.flush_max_pending,
+            "compact_every": cfg.storage.compact_every,
+            "backend": cfg.storage.backend,
+            "dedupe_window": cfg.storage.dedupe_window_seconds,
+            "dedupe_capacity": cfg.storage.dedupe_capacity,
+        },
     )
-    groups.reset_all_groups()
+    if cfg.warm_restart:
+        groups.restore_groups()
+    else:
+        groups.reset_all_groups()
+
+    # 关闭 Kakao 时完全不识别 Kakao 消息；开启时 Kakao 优先（与旧版先调 extract_kakao_pay_entries 一致）
+    kinds = ("kakao", "wechat") if getattr(cfg, "kakao_group_enabled", True) else ("wechat",)
+
+    extractor = ExtractWorkers(cfg.extract, kinds, cfg.ingest.parse_workers)
+
+    async def ingest_batch(messages) -> None:
+        # 一批消息逐条解析（只解析一次，识别来源后只交给对应的解析器；parse_workers > 0 时在子进程里），
+        # 结果按原顺序再按分组归并，每个分组只提交一次（见 GroupManager.distribute_batch）
+        entries = await extractor.extract_batch(messages)
+        if entries:
+            groups.distribute_batch(entries)
+
+    ingest = IngestQueue(
+        ingest_batch,
+        max_size=cfg.ingest.max_queue,
+        batch_size=cfg.ingest.batch_size,
+        overflow=cfg.ingest.overflow,
+    )
+    ingest.start()
 
-    app = create_app(groups, cfg.web.public_base_url, cfg.reset_password)
+    app = create_app(groups, cfg.web.public_base_url, cfg.reset_password, ingest=ingest)
     runner = await _start_web(app, cfg.web.host, cfg.web.port)
 
     intents = _build_intents()
@@ -76,7 +107,10 @@ async def main_async() -> None:
         print(f"[OK] Discord logged in as {client.user}")
         print(f"[OK] Listening channel_ids={cfg.discord.source_channel_ids}")
         print(f"[OK] Server: http://{cfg.web.host}:{cfg.web.port}/")
-        print("[OK] Groups reset on startup; create groups at /")
+        if cfg.warm_restart:
+            print(f"[OK] Groups restored on startup: {len(groups.groups)}")
+        else:
+            print("[OK] Groups reset on startup; create groups at /")
 
     @client.event
     async def on_message(message):
@@ -84,41 +118,16 @@ async def main_async() -> None:
         ch_id = getattr(ch, "id", None)
         if ch_id not in cfg.discord.source_channel_ids:
             return
-
-        if getattr(cfg, "kakao_group_enabled", True):
-            kakao_result = extract_kakao_pay_entries(
-                message,
-                seat_field_name_patterns=cfg.seat_field_name_patterns,
-                account_field_name_patterns=cfg.account_field_name_patterns,
-                countdown_seconds=cfg.countdown_seconds,
-            )
-            if kakao_result:
-                seat_key, seat_label, account_info, items = kakao_result
-                groups.distribute_kakao_items(
-                    seat_key=seat_key,
-                    seat_label=seat_label,
-                    account_info=account_info,
-                    items=items,
-                )
-                return
-
-        result = extract_wechat_qr_entries(
-            message,
-            keywords=cfg.keywords,
-            seat_field_name_patterns=cfg.seat_field_name_patterns,
-            account_field_name_patterns=cfg.account_field_name_patterns,
-            countdown_seconds=cfg.countdown_seconds,
-        )
-        if not result:
-            return
-
-        seat_key, seat_label, account_info, items = result
-        groups.distribute_items(seat_key=seat_key, seat_label=seat_label, account_info=account_info, items=items)
+        # 网关回调里只入队，解析和分发由 ingest 消费协程按批完成
+        await ingest.put(message)
 
     try:
         await _call_discord_start(client, cfg.discord.token, cfg.discord.use_user_token)
     finally:
+        await ingest.close()
+        extractor.close()
         await runner.cleanup()
+        groups.close()
 
 
 def main() -> None:
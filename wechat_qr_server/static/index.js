@@ -65,7 +65,9 @@ function renderGroups(data) {
     const pendingTotal = Number(st.pending_total || 0);
     const completedSeats = Number(st.completed_seats || 0);
     const totalSeats = Number(st.total_seats || 0);
-    const statsLine = `待扫码 ${pendingTotal} | 已完成座位 ${completedSeats}/${totalSeats}`;
+    const expiredTotal = Number(st.expired_total || 0);
+    let statsLine = `待扫码 ${pendingTotal} | 已完成座位 ${completedSeats}/${totalSeats}`;
+    if (expiredTotal > 0) statsLine += ` | 已过期 ${expiredTotal}`;
     left.innerHTML = `<div class="gname">${g.name}${tagHtml}</div><div class="gid">ID: ${g.group_id}</div><div class="gstats">${statsLine}</div>`;
 
     const icon = document.createElement("div");
@@ -139,6 +141,7 @@ function signatureForGroups(data) {
           pending_total: (g.stats && g.stats.pending_total) || 0,
           completed_seats: (g.stats && g.stats.completed_seats) || 0,
           total_seats: (g.stats && g.stats.total_seats) || 0,
+          expired_total: (g.stats && g.stats.expired_total) || 0,
         },
       }))
     );
@@ -172,18 +175,43 @@ document.getElementById("createForm").addEventListener("submit", async (e) => {
   openKindModal();
 });
 
+function applyGroups(data) {
+  const sig = signatureForGroups(data);
+  if (sig !== lastGroupsSig) {
+    lastGroupsSig = sig;
+    renderGroups(data);
+  }
+}
+
+// 分组列表走推送（SSE /api/events）；不支持或断线时退回 2 秒轮询
+let pushConnected = false;
+
+function startPush() {
+  if (!window.EventSource) return;
+  const es = new EventSource("/api/events");
+  es.onopen = () => {
+    pushConnected = true;
+  };
+  es.onmessage = (ev) => {
+    try {
+      applyGroups(JSON.parse(ev.data));
+    } catch (e) {}
+  };
+  es.onerror = () => {
+    pushConnected = false;
+  };
+}
+
 async function loop() {
-  try {
-    const data = await fetchGroups();
-    const sig = signatureForGroups(data);
-    if (sig !== lastGroupsSig) {
-      lastGroupsSig = sig;
-      renderGroups(data);
-    }
-  } catch (e) {}
+  if (!pushConnected) {
+    try {
+      applyGroups(await fetchGroups());
+    } catch (e) {}
+  }
   setTimeout(loop, 2000);
 }
 
+startPush();
 loop();
 
 document.getElementById("btnReset").addEventListener("click", async () => {
@@ -1,20 +1,48 @@
 from __future__ import annotations
 
+import json
 import os
 import secrets
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 from aiohttp import web
 
-from .groups import GroupManager
-
-
-def create_app(groups: GroupManager, public_base_url: str, reset_password: str) -> web.Application:
+from wechat_qr_board.events import EventHub, sse_stream, store_state_stream
+from wechat_qr_board.ingest import IngestQueue
+from wechat_qr_board.scan_log import csv_chunks
+from wechat_qr_board.web import (
+    export_filter,
+    history_response,
+    scan_batch_response,
+    seats_page_response,
+    state_response,
+    stream_csv,
+)
+
+from .groups import MERGED_SCAN_LOG_HEADER, GroupManager
+
+
+def create_app(
+    groups: GroupManager,
+    public_base_url: str,
+    reset_password: str,
+    ingest: Optional[IngestQueue] = None,
+) -> web.Application:
     app = web.Application()
     # group password sessions: sid -> group_id
     group_sessions: Dict[str, str] = {}
     group_cookie_name = "g_sid"
 
+    # 推送通道：topic "groups" = 分组列表（含统计），"group:<gid>" = 单个分组面板
+    hub = EventHub()
+
+    def _on_group_change(gid: str) -> None:
+        if gid:
+            hub.publish(f"group:{gid}")
+        hub.publish("groups")
+
+    groups.add_listener(_on_group_change)
+
     here = os.path.dirname(__file__)
     static_dir = os.path.join(here, "static")
     board_static_dir = os.path.join(here, "board_static")
@@ -149,7 +177,8 @@ def create_app(groups: GroupManager, public_base_url: str, reset_password: str)
         if not os.path.exists(p):
             raise web.HTTPNotFound()
         resp = web.FileResponse(p)
-        resp.headers["Cache-Control"] = "no-store"
+        # no-cache：允许浏览器缓存但每次用 If-None-Match 校验（boot.js 拉取时命中 304）
+        resp.headers["Cache-Control"] = "no-cache"
         return resp
 
     async def handle_static(request: web.Request) -> web.StreamResponse:
@@ -161,27 +190,14 @@ def create_app(groups: GroupManager, public_base_url: str, reset_password: str)
         resp.headers["Cache-Control"] = "no-store"
         return resp
 
-    async def api_groups(_: web.Request) -> web.Response:
+    def _groups_payload() -> Dict[str, Any]:
         out = []
         for g in sorted(groups.groups.values(), key=lambda x: x.created_at):
-            # 不依赖 Store 的新增方法：直接从 list_seats_for_ui() 计算，避免 server 端 wechat_qr_board 版本不一致导致 stats 恒为 0
+            # Store 增量维护的计数，O(1)：分组列表的开销与座位数无关
             try:
-                state = g.store.list_seats_for_ui()
-                seats = state.get("seats") or []
-                pending_total = sum(int(s.get("pending_count") or 0) for s in seats if isinstance(s, dict))
-                total_seats = len(seats)
-                completed_seats = sum(
-                    1
-                    for s in seats
-                    if isinstance(s, dict) and (s.get("status") == "scanned") and int(s.get("pending_count") or 0) == 0
-                )
-                stats = {
-                    "pending_total": int(pending_total),
-                    "completed_seats": int(completed_seats),
-                    "total_seats": int(total_seats),
-                }
+                stats = g.store.group_summary()
             except Exception:
-                stats = {"pending_total": 0, "completed_seats": 0, "total_seats": 0}
+                stats = {"pending_total": 0, "completed_seats": 0, "total_seats": 0, "expired_total": 0}
 
             out.append(
                 {
@@ -193,7 +209,25 @@ def create_app(groups: GroupManager, public_base_url: str, reset_password: str)
                     "stats": stats,
                 }
             )
-        return web.json_response({"groups": out})
+        return {"groups": out}
+
+    async def api_groups(_: web.Request) -> web.Response:
+        return web.json_response(_groups_payload())
+
+    async def api_groups_events(request: web.Request) -> web.StreamResponse:
+        """
+        分组列表推送（首页用）：内容与 /api/groups 相同，没变化不推；最多每秒一次。
+        """
+        last: Dict[str, Optional[bytes]] = {"body": None}
+
+        def next_payload() -> Optional[bytes]:
+            body = json.dumps(_groups_payload(), ensure_ascii=False).encode("utf-8")
+            if body == last["body"]:
+                return None
+            last["body"] = body
+            return body
+
+        return await sse_stream(request, hub, "groups", next_payload, min_interval=1.0)
 
     async def api_create_group(request: web.Request) -> web.Response:
         body: Dict[str, Any] = await request.json()
@@ -210,7 +244,7 @@ def create_app(groups: GroupManager, public_base_url: str, reset_password: str)
                 raise web.HTTPForbidden(text="重置密码错误")
             password = reset_password
         try:
-            g = groups.create_group(name, kind=kind, password=password)
+            g = await groups.create_group_async(name, kind=kind, password=password)
         except ValueError as e:
             raise web.HTTPBadRequest(text=str(e))
         share = ""
@@ -239,7 +273,49 @@ def create_app(groups: GroupManager, public_base_url: str, reset_password: str)
         if not g:
             raise web.HTTPNotFound()
         _require_group_auth(request, gid)
-        return web.json_response(g.store.list_seats_for_ui())
+        return state_response(request, g.store)
+
+    async def api_group_seats(request: web.Request) -> web.Response:
+        gid = request.match_info["group_id"]
+        g = groups.get_group(gid)
+        if not g:
+            raise web.HTTPNotFound()
+        _require_group_auth(request, gid)
+        return seats_page_response(request, g.store)
+
+    async def api_group_events(request: web.Request) -> web.StreamResponse:
+        gid = request.match_info["group_id"]
+        g = groups.get_group(gid)
+        if not g:
+            raise web.HTTPNotFound()
+        _require_group_auth(request, gid)
+        return await sse_stream(
+            request,
+            hub,
+            f"group:{gid}",
+            store_state_stream(g.store),
+            alive=lambda: groups.get_group(gid) is g,
+        )
+
+    async def api_group_stats(request: web.Request) -> web.Response:
+        gid = request.match_info["group_id"]
+        g = groups.get_group(gid)
+        if not g:
+            raise web.HTTPNotFound()
+        _require_group_auth(request, gid)
+        return web.json_response(g.store.stats())
+
+    async def api_ingest_stats(_: web.Request) -> web.Response:
+        # 入队队列的深度 / 丢弃 / 批次统计（只是计数，不含消息内容）
+        return web.json_response(ingest.stats() if ingest is not None else {})
+
+    async def api_group_history(request: web.Request) -> web.Response:
+        gid = request.match_info["group_id"]
+        g = groups.get_group(gid)
+        if not g:
+            raise web.HTTPNotFound()
+        _require_group_auth(request, gid)
+        return await history_response(request, g.store, groups.io)
 
     async def api_group_scan_next(request: web.Request) -> web.Response:
         gid = request.match_info["group_id"]
@@ -252,17 +328,50 @@ def create_app(groups: GroupManager, public_base_url: str, reset_password: str)
         next_key = g.store.scan_next(seat_key)
         return web.json_response({"ok": True, "next_seat_key": next_key})
 
+    async def api_group_scan_batch(request: web.Request) -> web.Response:
+        gid = request.match_info["group_id"]
+        g = groups.get_group(gid)
+        if not g:
+            raise web.HTTPNotFound()
+        _require_group_auth(request, gid)
+        return await scan_batch_response(request, g.store)
+
     async def api_group_csv(request: web.Request) -> web.StreamResponse:
         gid = request.match_info["group_id"]
         g = groups.get_group(gid)
         if not g:
             raise web.HTTPNotFound()
         _require_group_auth(request, gid)
-        g.store.ensure_csv_exists()
-        resp = web.FileResponse(g.store.csv_path)
-        resp.content_type = "text/csv"
-        resp.headers["Content-Disposition"] = f'attachment; filename="scan_log_{gid}.csv"'
-        return resp
+        await groups.io.run(gid, g.store.ensure_csv_exists)
+        return await stream_csv(request, f"scan_log_{gid}.csv", g.store.iter_csv_chunks(), groups.io)
+
+    async def api_group_export(request: web.Request) -> web.StreamResponse:
+        # 带筛选的导出：?from=&to=&seat=&source=（见 wechat_qr_board.web.export_filter）
+        gid = request.match_info["group_id"]
+        g = groups.get_group(gid)
+        if not g:
+            raise web.HTTPNotFound()
+        _require_group_auth(request, gid)
+        flt = export_filter(request)
+        return await stream_csv(request, f"scan_log_{gid}_export.csv", g.store.iter_csv_chunks(flt), groups.io)
+
+    async def api_export_all(request: web.Request) -> web.StreamResponse:
+        """
+        全部分组合并导出（按时间归并，第一列为分组名），需要 reset_password：
+        GET /api/export?password=...&from=&to=&seat=&source=（也可用 X-Admin-Password 头）
+        """
+        if not reset_password:
+            raise web.HTTPBadRequest(text="reset_password not configured")
+        pw = request.headers.get("X-Admin-Password") or request.query.get("password") or ""
+        if pw != reset_password:
+            raise web.HTTPForbidden(text="bad password")
+        flt = export_filter(request)
+        return await stream_csv(
+            request,
+            "scan_log_all_groups.csv",
+            csv_chunks(MERGED_SCAN_LOG_HEADER, groups.iter_merged_scan_log(flt)),
+            groups.io,
+        )
 
     async def api_group_login(request: web.Request) -> web.Response:
         gid = request.match_info["group_id"]
@@ -271,7 +380,8 @@ def create_app(groups: GroupManager, public_base_url: str, reset_password: str)
             raise web.HTTPNotFound()
         body: Dict[str, Any] = await request.json()
         pw = str(body.get("password") or "")
-        if pw != getattr(g, "password", ""):
+        # 只存了密码哈希；pbkdf2 校验放到 I/O 线程
+        if not await groups.io.run(None, g.check_password, pw):
             raise web.HTTPForbidden(text="bad password")
         sid = secrets.token_urlsafe(18)
         group_sessions[sid] = gid
@@ -294,7 +404,7 @@ def create_app(groups: GroupManager, public_base_url: str, reset_password: str)
         pw = str(body.get("password") or "")
         if pw != reset_password:
             raise web.HTTPForbidden(text="bad password")
-        groups.reset_all_groups()
+        await groups.reset_all_groups_async()
         return web.json_response({"ok": True})
 
     async def api_delete_group(request: web.Request) -> web.Response:
@@ -342,14 +452,23 @@ def create_app(groups: GroupManager, public_base_url: str, reset_password: str)
 
     # group apis
     app.router.add_get("/api/groups", api_groups)
+    app.router.add_get("/api/events", api_groups_events)
     app.router.add_post("/api/groups", api_create_group)
     app.router.add_get("/api/groups/{group_id}", api_group_info)
     app.router.add_get("/api/groups/{group_id}/state", api_group_state)
+    app.router.add_get("/api/groups/{group_id}/seats", api_group_seats)
+    app.router.add_get("/api/groups/{group_id}/stats", api_group_stats)
+    app.router.add_get("/api/groups/{group_id}/history", api_group_history)
+    app.router.add_get("/api/groups/{group_id}/events", api_group_events)
     app.router.add_post("/api/groups/{group_id}/scan_next", api_group_scan_next)
+    app.router.add_post("/api/groups/{group_id}/scan_batch", api_group_scan_batch)
     app.router.add_get("/api/groups/{group_id}/csv", api_group_csv)
+    app.router.add_get("/api/groups/{group_id}/export", api_group_export)
+    app.router.add_get("/api/export", api_export_all)
     app.router.add_post("/api/groups/{group_id}/login", api_group_login)
     app.router.add_post("/api/groups/{group_id}/delete", api_delete_group)
     app.router.add_post("/api/reset", api_reset)
+    app.router.add_get("/api/ingest_stats", api_ingest_stats)
 
     return app
 